@@ -2,7 +2,14 @@ import json
 import os
 import time
 import math
-from datetime import datetime, timedelta
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, column
+from signal_table import build_signal_table, take, flat_stake, martingale_stake, settle_pnl, equity_stats
+from monte_carlo import streak_lengths
 
 class AsianSniperStrategy:
     def __init__(self, data_file='ETHUSDT_1m_klines.json'):
@@ -91,72 +98,28 @@ class AsianSniperStrategy:
         wins = 0
         trade_results = [] # 记录每一笔的输赢 (True/False)
         
-        # 从第100根开始模拟
-        # 为了演示效果，我们只打印交易发生的时刻，或者每隔一定时间打印心跳
-        for i in range(100, len(self.klines) - 10):
-            curr_k = self.klines[i]
-            prev_k = self.klines[i-1]
-            
-            # --- 1. 时间检查 (UTC 0-8) ---
-            dt = datetime.strptime(curr_k['datetime'], '%Y-%m-%d %H:%M:%S')
-            if not (0 <= dt.hour < 8):
-                # 如果不是亚盘时间，跳过 (为了模拟效果，可以不打印，或者快速跳过)
-                continue
-                
-            # --- 2. 数据完整性检查 ---
-            if prev_k.get('bb_lower') is None or prev_k.get('rsi') is None:
-                continue
-                
-            # --- 3. 巨型K线过滤 (新闻/瀑布) ---
-            # 如果前一根K线振幅 > 3倍平均振幅，暂停交易
-            prev_amp = prev_k['high'] - prev_k['low']
-            avg_amp = prev_k.get('avg_amp', 0)
-            is_giant_candle = avg_amp > 0 and prev_amp > 3 * avg_amp
-            
-            if is_giant_candle:
-                # print(f"[{curr_k['datetime']}] ⚠️ 警告：检测到剧烈波动，暂停交易")
-                continue
+        # 候选信号表只扫描一次K线：UTC 0-8点，RSI<25/>75，巨型K线过滤，布林带触碰价入场，i+10 开盘价结算
+        arr = KlineArrays.from_klines(self.klines)
+        table = build_signal_table(arr, column(self.klines, 'rsi'), column(self.klines, 'avg_amp'),
+                                   column(self.klines, 'bb_lower'), column(self.klines, 'bb_upper'),
+                                   hours=(0, 8), long_below=25, short_above=75, giant_floor=0.0,
+                                   entry='band', settle='open')
+        # 必须触碰布林带才下单
+        table = take(table, table['touch'])
+        pnl_rows = settle_pnl(table, flat_stake(table, bet_size), win_payout)
 
-            # --- 4. 信号检测 ---
-            signal = None
-            entry_price = 0
-            
-            # 做多信号: RSI < 25 + 触碰下轨
-            if prev_k['rsi'] < 25:
-                if curr_k['low'] <= prev_k['bb_lower']:
-                    signal = 'LONG'
-                    entry_price = min(curr_k['open'], prev_k['bb_lower'])
-            
-            # 做空信号: RSI > 75 + 触碰上轨
-            elif prev_k['rsi'] > 75:
-                if curr_k['high'] >= prev_k['bb_upper']:
-                    signal = 'SHORT'
-                    entry_price = max(curr_k['open'], prev_k['bb_upper'])
-            
-            # --- 5. 执行交易 ---
-            if signal:
-                # 结算 (10分钟后)
-                settle_k = self.klines[i+10]
-                settle_price = settle_k['open']
-                
-                is_win = False
-                if signal == 'LONG':
-                    is_win = settle_price > entry_price
-                else:
-                    is_win = settle_price < entry_price
-                
-                pnl = bet_size * win_payout if is_win else bet_size * loss_payout
-                balance += pnl
-                
-                total_trades += 1
-                if is_win: wins += 1
-                trade_results.append(is_win)
-                
-                icon = "🟢 赢" if is_win else "🔴 输"
-                print(f"[{curr_k['datetime']}] ⚡ 触发 {signal} | RSI:{prev_k['rsi']:.1f} | 入场:{entry_price:.2f} -> 结算:{settle_price:.2f} | {icon} ({pnl:+.1f}U)")
-                
-                # 模拟一点延迟，让人看清 (如果不想等待可以注释掉)
-                # time.sleep(0.05) 
+        for row, is_win in enumerate(table['is_win'].tolist()):
+            i = int(table['index'][row])
+            pnl = pnl_rows[row].item()
+            balance += pnl
+
+            total_trades += 1
+            if is_win: wins += 1
+            trade_results.append(is_win)
+
+            signal = 'LONG' if table['long'][row] else 'SHORT'
+            icon = "🟢 赢" if is_win else "🔴 输"
+            print(f"[{self.klines[i]['datetime']}] ⚡ 触发 {signal} | RSI:{table['rsi'][row]:.1f} | 入场:{table['entry_price'][row]:.2f} -> 结算:{table['settle_price'][row]:.2f} | {icon} ({pnl:+.1f}U)")
 
         print("="*80)
         print(f"🏁 模拟结束")
@@ -167,84 +130,26 @@ class AsianSniperStrategy:
             
             # --- 统计连败概率 ---
             print("\n📊 连败统计分析:")
-            loss_streaks = []
-            current_streak = 0
-            for res in trade_results:
-                if not res:
-                    current_streak += 1
-                else:
-                    if current_streak > 0:
-                        loss_streaks.append(current_streak)
-                    current_streak = 0
-            if current_streak > 0: loss_streaks.append(current_streak)
+            loss_streaks = streak_lengths(trade_results)
             
             total_loss_sequences = len(loss_streaks)
             if total_loss_sequences > 0:
                 for n in range(1, 8):
-                    count = sum(1 for x in loss_streaks if x >= n)
+                    count = int((loss_streaks >= n).sum())
                     prob = count / total_loss_sequences * 100
                     print(f"连败 >= {n} 笔: {count} 次 ({prob:.2f}%)")
-                print(f"最大连败: {max(loss_streaks) if loss_streaks else 0} 笔")
+                print(f"最大连败: {loss_streaks.max()} 笔")
 
             # --- 马丁策略模拟 ---
             print("\n🎲 马丁策略模拟 (自定义: 5U起步, 目标赚4U, 5连败止损):")
-            martingale_balance = 1000.0
-            base_bet = 5.0
-            target_profit = 4.0
-            max_steps = 5
-            bet_cap = 250.0
-            
-            current_step = 0
-            cumulative_loss_in_round = 0.0
-            
-            max_drawdown = 0
-            peak_balance = 1000.0
-            
-            for res in trade_results:
-                # 1. 计算注码
-                if current_step == 0:
-                    current_bet = base_bet
-                else:
-                    # 目标: 赢回之前的亏损 + 目标利润
-                    # 0.8 * bet = cumulative_loss_in_round + target_profit
-                    required_profit = cumulative_loss_in_round + target_profit
-                    current_bet = required_profit / 0.8
-                    current_bet = round(current_bet, 2)
-                    if current_bet > bet_cap:
-                        current_bet = bet_cap
+            martingale = equity_stats(settle_pnl(table, martingale_stake(table, np.ones(len(table['index'])),
+                                                                         base_bet=5.0, target_profit=4.0,
+                                                                         max_steps=5, bet_cap=250.0)))
+            martingale_balance = martingale['final']
+            max_drawdown = martingale['max_drawdown']
+            if martingale['bust']:
+                print("💀 账户爆仓！")
 
-                # 2. 执行交易
-                if res: # 赢
-                    pnl = current_bet * 0.8
-                    martingale_balance += pnl
-                    
-                    # 赢了重置
-                    current_step = 0
-                    cumulative_loss_in_round = 0.0
-                else: # 输
-                    pnl = -current_bet
-                    martingale_balance += pnl
-                    
-                    cumulative_loss_in_round += current_bet
-                    current_step += 1
-                    
-                    # 检查止损
-                    if current_step >= max_steps:
-                        # 达到5连败，接受亏损，重置
-                        current_step = 0
-                        cumulative_loss_in_round = 0.0
-                
-                # 3. 统计回撤
-                if martingale_balance > peak_balance:
-                    peak_balance = martingale_balance
-                drawdown = peak_balance - martingale_balance
-                if drawdown > max_drawdown:
-                    max_drawdown = drawdown
-                    
-                if martingale_balance <= 0:
-                    print("💀 账户爆仓！")
-                    break
-            
             print(f"马丁最终余额: {martingale_balance:.2f} U")
             print(f"马丁最大回撤: {max_drawdown:.2f} U")
             print(f"马丁净利润: {martingale_balance - 1000:.2f} U")
@@ -0,0 +1,364 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_rsi, calc_bollinger, calc_avg_amp
+
+# 行情状态: (名称, 每根K线的漂移, 每根K线的波动率)
+REGIMES = (
+    ('quiet', 0.0, 0.0003),
+    ('normal', 0.0, 0.0007),
+    ('trend_up', 0.00004, 0.0008),
+    ('trend_down', -0.00004, 0.0008),
+    ('volatile', 0.0, 0.0020),
+)
+
+# 比基准慢超过这个比例记为退化
+DEFAULT_TOLERANCE = 0.15
+
+
+def synthetic_klines(n, seed=0, start='2025-01-01 00:00:00', interval=60, price=3000.0, regimes=REGIMES,
+                     mean_regime_bars=720):
+    """
+    确定性的合成 OHLCV (同样的参数得到逐位相同的数据)：对数价格随机游走，
+    行情状态按平均 mean_regime_bars 根的几何分布时长随机切换 (震荡/趋势/高波动)
+    :return: (KlineArrays, 每根K线的状态编号)
+    """
+    rng = np.random.default_rng(seed)
+    # 状态分段：时长 ~ 几何分布，下一段状态在其余状态中均匀抽取
+    lengths = []
+    states = []
+    total = 0
+    state = int(rng.integers(len(regimes)))
+    while total < n:
+        length = int(rng.geometric(1 / mean_regime_bars))
+        lengths.append(length)
+        states.append(state)
+        total += length
+        state = (state + 1 + int(rng.integers(len(regimes) - 1))) % len(regimes)
+    regime = np.repeat(np.array(states, dtype=np.int8), lengths)[:n]
+
+    drift = np.array([r[1] for r in regimes])[regime]
+    vol = np.array([r[2] for r in regimes])[regime]
+    log_close = np.log(price) + np.cumsum(drift + vol * rng.standard_normal(n))
+    close = np.exp(log_close)
+    open_ = np.r_[price, close[:-1]]
+    wick = vol * np.abs(rng.standard_normal((2, n))) * 0.5
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.lognormal(3.0, 0.5, n) * (vol / regimes[1][2])
+
+    t0 = np.datetime64(start, 's').astype(np.int64)
+    ts = t0 + np.arange(n, dtype=np.int64) * interval
+    return KlineArrays(ts, open_, high, low, close, volume), regime
+
+
+def to_klines(arrays):
+    """KlineArrays -> load_data() 格式的 list[dict]"""
+    datetimes = np.char.replace(arrays.ts.astype('datetime64[s]').astype(str), 'T', ' ').tolist()
+    return [
+        {'datetime': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for d, o, h, l, c, v in zip(datetimes, arrays.open.tolist(), arrays.high.tolist(), arrays.low.tolist(),
+                                    arrays.close.tolist(), arrays.volume.tolist())
+    ]
+
+
+# ===== 测试项 =====
+# 每项: (名称, 最多K线数, prepare)。prepare(data) 做准备工作 (不计时)，返回要计时的无参函数
+# 纯 Python 的逐根实现很慢，用 max_bars 限制规模，结果统一换算成 bars/秒
+
+def _json_file(data):
+    """同一规模的数据只写一次临时 JSON 文件"""
+    if data.json_path is None:
+        fd, data.json_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data.klines(), f)
+    return data.json_path
+
+
+def _load_json(data):
+    path = _json_file(data)
+
+    def run():
+        with open(path, 'r', encoding='utf-8') as f:
+            KlineArrays.from_klines(json.load(f))
+    return run
+
+
+def _load_stream(data):
+    from kline_stream import iter_kline_arrays
+    path = _json_file(data)
+    return lambda: sum(len(chunk) for chunk in iter_kline_arrays(path))
+
+
+def _strategy(data):
+    from wick_sniper_pro import WickSniperStrategyPro
+    strategy = WickSniperStrategyPro()
+    strategy.klines_1m = data.klines()
+    return strategy
+
+
+def _calculate_rsi(data):
+    return _strategy(data).calculate_rsi
+
+
+def _calculate_bollinger(data):
+    return _strategy(data).calculate_bollinger_bands
+
+
+def _resample_pro(data):
+    return _strategy(data).resample_to_10m
+
+
+def _resample_wick_sniper(data):
+    from wick_sniper import WickSniperStrategy
+    strategy = WickSniperStrategy()
+    strategy.klines_1m = data.klines()
+    return strategy.resample_to_10m
+
+
+def _resample_timeframes(data):
+    from kline_resample import resample_timeframes
+    a = data.arrays
+    # 每次用新的视图对象，避开按对象的内存缓存
+    return lambda: resample_timeframes(a.slice(0, len(a)))
+
+
+def _zones(data):
+    from zone_detector import ConsolidationDetector
+    a = data.arrays
+    return lambda: ConsolidationDetector(a.high, a.low).find_zones(0.1, 2, 50, 20, 0.5)
+
+
+def _zone_backtest(data):
+    from zone_detector import ConsolidationDetector
+    from zone_backtest import ZoneTradeEngine, zones_to_arrays
+    a = data.arrays
+    zones = zones_to_arrays(ConsolidationDetector(a.high, a.low).find_zones(0.1, 2, 50, 20, 0.5))
+    engine = ZoneTradeEngine(a.high, a.low, a.close)
+    return lambda: engine.run(*zones, hold_periods=10, max_positions=5, touch_threshold=0.0005)
+
+
+def _rsi_columns(data):
+    a = data.arrays
+    return {'ts': a.ts, 'open': a.open, 'high': a.high, 'low': a.low, 'rsi': calc_rsi(a.close, 14)}
+
+
+def _daily_backtest(data):
+    from incremental_backtest import IncrementalBacktest, StreamingSimulator, rsi_tier_candidates
+    a = data.arrays
+    return lambda: IncrementalBacktest(rsi_tier_candidates, StreamingSimulator(10, None, -45)).append(a)
+
+
+def _rsi_backtest(data):
+    from optimize_rsi import evaluate_rsi_params
+    columns = _rsi_columns(data)
+    return lambda: evaluate_rsi_params(columns, (25, 20, 75, 80))
+
+
+def _rsi_optimizer(data):
+    from optimize_rsi import evaluate_rsi_params
+    columns = _rsi_columns(data)
+    grid = [(25, 20, 75, 80), (30, 25, 70, 75), (20, 15, 80, 85), (22, 18, 78, 82), (28, 22, 72, 78), (15, 10, 85, 90)]
+    return lambda: [evaluate_rsi_params(columns, params) for params in grid]
+
+
+def _signal_table(data):
+    from signal_table import build_signal_table, tiered_stake, summarize
+    a = data.arrays
+    rsi = calc_rsi(a.close, 14)
+    avg_amp = calc_avg_amp(a.high, a.low, 20)
+    _, upper, lower = calc_bollinger(a.close, 20, 2)
+
+    def run():
+        table = build_signal_table(a, rsi, avg_amp, lower, upper)
+        return summarize(table, tiered_stake(table))
+    return run
+
+
+def _fused_backtest(data):
+    from fused_backtest import run_fused
+    a = data.arrays
+    # 每次新建 MarketData，指标和信号表都重新计算
+    return lambda: run_fused(a)
+
+
+CASES = (
+    ('load.json', 2_000_000, _load_json),
+    ('load.stream', 2_000_000, _load_stream),
+    ('indicator.calc_rsi', None, lambda data: lambda: calc_rsi(data.arrays.close, 14)),
+    ('indicator.calc_bollinger', None, lambda data: lambda: calc_bollinger(data.arrays.close, 20, 2)),
+    ('indicator.calc_avg_amp', None, lambda data: lambda: calc_avg_amp(data.arrays.high, data.arrays.low, 20)),
+    ('indicator.calculate_rsi', 1_000_000, _calculate_rsi),
+    ('indicator.calculate_bollinger_bands', 200_000, _calculate_bollinger),
+    ('resample.resample_to_10m', 1_000_000, _resample_pro),
+    ('resample.wick_sniper_resample_to_10m', 1_000_000, _resample_wick_sniper),
+    ('resample.all_timeframes', None, _resample_timeframes),
+    ('zones.find_zones', 2_000_000, _zones),
+    ('backtest.zone_engine', 2_000_000, _zone_backtest),
+    ('backtest.daily_rsi_tiers', None, _daily_backtest),
+    ('backtest.evaluate_rsi_params', None, _rsi_backtest),
+    ('backtest.signal_table', None, _signal_table),
+    ('backtest.fused_strategies', 2_000_000, _fused_backtest),
+    ('optimizer.rsi_grid_6', None, _rsi_optimizer),
+)
+
+
+class BenchData:
+    """某个规模的数据：列式数组常驻，list[dict] 每次按需新建 (有的测试项会往字典里写指标)"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.json_path = None
+
+    def klines(self):
+        return to_klines(self.arrays)
+
+    def close(self):
+        if self.json_path is not None:
+            os.remove(self.json_path)
+            self.json_path = None
+
+
+def run_case(name, max_bars, prepare, arrays, repeat=3, budget=2.0):
+    """
+    计时一个测试项：取 repeat 次中最快的一次 (单次超过 budget 秒就不再重复)
+    :return: dict bars, seconds, bars_per_sec
+    """
+    bars = len(arrays) if max_bars is None else min(len(arrays), max_bars)
+    data = BenchData(arrays.slice(0, bars))
+    best = None
+    try:
+        for _ in range(repeat):
+            run = prepare(data)
+            gc.collect()
+            # 被测函数自己的进度输出不计入结果
+            with contextlib.redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+            if elapsed > budget:
+                break
+    finally:
+        data.close()
+    return {'bars': bars, 'seconds': best, 'bars_per_sec': bars / best if best > 0 else float('inf')}
+
+
+def run_benchmarks(n=1_000_000, seed=0, only=None, repeat=3, quiet=False):
+    """
+    在 n 根合成K线上跑全部 (或名称以 only 中任一前缀开头的) 测试项
+    :return: dict meta, results {名称: {bars, seconds, bars_per_sec}}
+    """
+    arrays, _ = synthetic_klines(n, seed)
+    results = {}
+    for name, max_bars, prepare in CASES:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        res = run_case(name, max_bars, prepare, arrays, repeat)
+        results[name] = res
+        if not quiet:
+            print(f"{name:<40} | {res['bars']:>10} bars | {res['seconds']:>9.4f}s | {res['bars_per_sec']:>14,.0f} bars/s")
+    return {
+        'meta': {
+            'bars': n,
+            'seed': seed,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    比较两次结果的 bars/秒：慢了超过 tolerance 记为 REGRESSION，快了超过 tolerance 记为 FASTER
+    :return: [(名称, 基准 bars/s, 当前 bars/s, 比值, 状态)]
+    """
+    rows = []
+    for name, cur in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            rows.append((name, None, cur['bars_per_sec'], None, 'NEW'))
+            continue
+        ratio = cur['bars_per_sec'] / base['bars_per_sec']
+        if ratio < 1 - tolerance:
+            status = 'REGRESSION'
+        elif ratio > 1 + tolerance:
+            status = 'FASTER'
+        else:
+            status = 'ok'
+        if cur['bars'] != base['bars']:
+            status += ' (规模不同)'
+        rows.append((name, base['bars_per_sec'], cur['bars_per_sec'], ratio, status))
+    for name in baseline['results']:
+        if name not in current['results']:
+            rows.append((name, baseline['results'][name]['bars_per_sec'], None, None, 'MISSING'))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'测试项':<40} | {'基准 bars/s':>14} | {'当前 bars/s':>14} | {'比值':>6} | 状态")
+    print("-" * 100)
+    for name, base, cur, ratio, status in rows:
+        base_str = f"{base:,.0f}" if base is not None else '-'
+        cur_str = f"{cur:,.0f}" if cur is not None else '-'
+        ratio_str = f"{ratio:.2f}" if ratio is not None else '-'
+        print(f"{name:<40} | {base_str:>14} | {cur_str:>14} | {ratio_str:>6} | {status}")
+
+
+if __name__ == "__main__":
+    # 用法:
+    #   python benchmark.py run [K线数=1000000] [输出文件=bench_<时间>.json] [测试项前缀,...]
+    #   python benchmark.py compare 基准.json 当前.json [容差=0.15]
+    #   python benchmark.py generate K线数 输出文件.json [seed=0]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        n = int(float(sys.argv[2])) if len(sys.argv) > 2 else 1_000_000
+        out = sys.argv[3] if len(sys.argv) > 3 else f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        only = sys.argv[4].split(',') if len(sys.argv) > 4 else None
+        print(f"合成数据 {n} 根K线 (seed=0)")
+        report = run_benchmarks(n, only=only)
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已保存到 {out}")
+    elif command == 'compare':
+        if len(sys.argv) < 4:
+            print("用法: python benchmark.py compare 基准.json 当前.json [容差]")
+            sys.exit(2)
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_TOLERANCE
+        rows = compare(baseline, current, tolerance)
+        print_comparison(rows)
+        regressions = [row[0] for row in rows if row[4].startswith('REGRESSION')]
+        if regressions:
+            print(f"\n❌ {len(regressions)} 项变慢超过 {tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✅ 没有超过 {tolerance:.0%} 的退化")
+    elif command == 'generate':
+        n = int(float(sys.argv[2]))
+        seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        arrays, _ = synthetic_klines(n, seed)
+        with open(sys.argv[3], 'w', encoding='utf-8') as f:
+            json.dump(to_klines(arrays), f)
+        print(f"✅ 已生成 {n} 根合成K线: {sys.argv[3]}")
+    else:
+        print(f"未知命令: {command} (run / compare / generate)")
+        sys.exit(2)
@@ -1,7 +1,7 @@
 import json
 import os
-from datetime import datetime, timedelta
 import sys
+import numpy as np
 
 # Add current directory to path to import wick_sniper_pro
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -13,215 +13,116 @@ except ImportError:
     sys.path.append(os.path.join(os.getcwd(), '事件合约'))
     from wick_sniper_pro import WickSniperStrategyPro
 
+from kline_arrays import KlineArrays, column, calc_avg_amp, data_fingerprint
+from trading_day import trading_day_ids, apply_daily_stop, daily_stats, to_daily_dict, stop_loss_frontier, day_labels
+from result_store import ResultStore, DEFAULT_DB
+from incremental_backtest import StreamingSimulator, rsi_tier_candidates, resume_or_start, checkpoint_path
+from stage_profiler import stage, timed, run_profiled
+
 class DailyAnalysis(WickSniperStrategyPro):
-    def run_analysis(self, stop_loss_limit=None, start_hour=9):
+    @timed('signals')
+    def build_trades(self, start_hour=9):
         """
-        Run backtest with daily analysis and optional stop-loss.
-        
-        :param stop_loss_limit: Daily loss limit (negative number, e.g., -50). If None, no limit.
-        :param start_hour: Hour to start the "trading day" (0-23). Default 9.
+        Vectorized signals, tiered amounts and settlement for every bar (before the daily stop).
+        Indicators must already be on self.klines_1m.
         """
-        print(f"\n{'='*50}")
-        print(f"Running Analysis with Stop Loss: {stop_loss_limit if stop_loss_limit else 'None'}")
-        print(f"{'='*50}")
+        klines = self.klines_1m
+        arr = KlineArrays.from_klines(klines)
+        rsi = column(klines, 'rsi')
+        n = len(arr)
 
-        # Create a log file for detailed trade history
-        log_filename = "backtest_details.csv"
-        log_file = open(log_filename, 'w', encoding='utf-8')
-        log_file.write("Time,Type,Price,Amount,RSI,ActiveTrades,Result,Profit,DayPnL\n")
-        print(f"📝 Detailed log will be saved to: {log_filename}")
+        # Trading day ids are assigned once for every bar.
+        # A trading day starts at start_hour:00:00 and ends at start_hour:00:00 next day.
+        day_id = trading_day_ids(arr.ts, start_hour)
+        hour = arr.hour
 
-        # Ensure indicators are calculated
-        if not self.klines_1m:
-            if not self.load_data():
-                print("Failed to load data.")
-                return
+        # Bars the loop used to visit: [100, n-10), trading window 09:00 - 20:00
+        bar = np.arange(n)
+        in_range = (bar >= 100) & (bar < n - 10)
+        in_window = in_range & (hour >= 9) & (hour < 20)
 
-        # Check if indicators exist, if not calculate them
+        # Giant Candle Check (previous candle vs. average amplitude of the 20 before it)
+        avg_amp = calc_avg_amp(arr.high, arr.low, 20)
+        prev_amp = np.r_[np.nan, (arr.high - arr.low)[:-1]]
+        is_giant = (avg_amp > 0) & (prev_amp > 3 * avg_amp) & (prev_amp > 15.0)
+
+        # Strategy Logic (Mean Reversion) with tiered betting
+        prev_rsi = np.r_[np.nan, rsi[:-1]]
+        candidate = in_window & ~np.isnan(rsi) & ~is_giant
+        is_long = candidate & (prev_rsi < 25)
+        is_short = candidate & ~is_long & (prev_rsi > 75)
+
+        entry_idx = np.flatnonzero(is_long | is_short)
+        side_long = is_long[entry_idx]
+        r = prev_rsi[entry_idx]
+        amount = np.where(side_long, np.where(r < 20, 15, 10), np.where(r > 80, 15, 10))
+
+        # Settlement at the open of i+10
+        entry_price = arr.open[entry_idx]
+        settlement_price = arr.open[entry_idx + 10]
+        is_win = np.where(side_long, settlement_price > entry_price, settlement_price < entry_price)
+        profit = np.where(is_win, 0.8 * amount, -1.0 * amount)
+
+        return {
+            'n': n, 'day_id': day_id, 'bar': bar, 'in_range': in_range, 'in_window': in_window,
+            'entry_idx': entry_idx, 'side_long': side_long, 'rsi': r, 'amount': amount,
+            'entry_price': entry_price, 'is_win': is_win, 'profit': profit,
+            'arrays': arr, 'avg_amp': avg_amp,
+        }
+
+    @timed()
+    def run_stop_frontier(self, stop_levels=None, start_hour=9):
+        """
+        Total profit, stopped days and max drawdown for a whole grid of daily stop levels.
+        One set of trades is reused for every level (see trading_day.stop_loss_frontier).
+        """
+        if stop_levels is None:
+            stop_levels = np.r_[np.arange(-150, -14, 5), -np.inf]
         if 'rsi' not in self.klines_1m[-1] or 'bb_upper' not in self.klines_1m[-1]:
-            print("Calculating indicators...")
             self.calculate_rsi(14)
             self.calculate_bollinger_bands(20, 2)
+        t = self.build_trades(start_hour)
+        frontier = stop_loss_frontier(t['day_id'][t['entry_idx']], t['profit'], stop_levels, t['is_win'])
 
-        trades = []
-        daily_stats = {} # { 'YYYY-MM-DD': {'profit': 0, 'trades': 0, 'wins': 0, 'losses': 0, 'stopped': False} }
-        
-        current_day_pnl = 0
-        is_stopped_today = False
-        
-        # We need to track the "trading day". 
-        # A trading day starts at start_hour:00:00 and ends at start_hour:00:00 next day.
-        # We'll use the date of the start of the trading day as the key.
-        
-        rsi_low = 20
-        rsi_high = 80
-        
-        # Concurrent Trades Analysis
-        active_trade_indices = [] # List of expiry indices of active trades
-        concurrent_counts = {} # { count: frequency }
-        max_concurrent = 0
-        
-        # Iterate through klines
-        # Start from 100 to have enough history for indicators
-        for i in range(100, len(self.klines_1m) - 10):
-            k1m = self.klines_1m[i]
-            prev_k1m = self.klines_1m[i-1]
-            
-            # Update active trades (remove expired ones)
-            # A trade expires at index 'expiry_index'. If current index 'i' >= expiry_index, it's closed.
-            # Actually, if expiry is i+10, it is closed AT i+10. So at i+10 it is NOT active?
-            # Let's say trade at i=100 expires at 110.
-            # At i=101, it is active. At i=109, active. At i=110, it closes.
-            # So we keep indices > i.
-            active_trade_indices = [idx for idx in active_trade_indices if idx > i]
-            
-            current_concurrent = len(active_trade_indices)
-            if current_concurrent > max_concurrent:
-                max_concurrent = current_concurrent
-            
-            concurrent_counts[current_concurrent] = concurrent_counts.get(current_concurrent, 0) + 1
-            
-            dt = datetime.strptime(k1m['datetime'], '%Y-%m-%d %H:%M:%S')
-            
-            # Determine current trading day
-            # If hour < start_hour, it belongs to the previous calendar day's trading session
-            if dt.hour < start_hour:
-                trading_day_date = (dt - timedelta(days=1)).strftime('%Y-%m-%d')
-            else:
-                trading_day_date = dt.strftime('%Y-%m-%d')
-            
-            # Time Filter: Only trade between 09:00 and 20:00
-            # Note: start_hour is used for "Trading Day" definition, but we also need to filter trades
-            if not (9 <= dt.hour < 20):
-                continue
+        print(f"\n{'Stop':<8} | {'Profit':<10} | {'Trades':<8} | {'Win Rate':<10} | {'Stopped Days':<12} | {'Max DD'}")
+        print("-" * 70)
+        for n in range(len(frontier['stop'])):
+            stop = frontier['stop'][n]
+            trades = frontier['trades'][n]
+            win_rate = frontier['wins'][n] / trades * 100 if trades > 0 else 0
+            stop_str = 'None' if np.isinf(stop) else f"{stop:.0f}"
+            print(f"{stop_str:<8} | {frontier['profit'][n]:<10.2f} | {trades:<8} | {win_rate:<9.2f}% | {frontier['stopped_days'][n]:<12} | {frontier['max_drawdown'][n]:.2f}")
+        return frontier
 
-            if trading_day_date not in daily_stats:
-                daily_stats[trading_day_date] = {
-                    'profit': 0, 'trades': 0, 'wins': 0, 'losses': 0, 
-                    'stopped': False,
-                    'capped_profit': 0, 'capped_trades': 0, 'capped_wins': 0,
-                    'unlimited_pnl': 0, 'capped_pnl': 0
-                }
-                # New day, reset PnL and stop flag
-                current_day_pnl = 0
-                is_stopped_today = False
-            
-            # Strategy Logic (Mean Reversion)
-            if k1m.get('rsi') is None: continue
-            
-            prev_rsi = prev_k1m['rsi']
-            trade = None
-            bet_amount = 0
-            
-            # Giant Candle Check
-            avg_amp = 0
-            if i > 20:
-                sum_amp = 0
-                for j in range(i-20, i):
-                    sum_amp += (self.klines_1m[j]['high'] - self.klines_1m[j]['low'])
-                avg_amp = sum_amp / 20
-            
-            prev_amp = prev_k1m['high'] - prev_k1m['low']
-            is_giant_candle = False
-            if avg_amp > 0 and prev_amp > 3 * avg_amp and prev_amp > 15.0:
-                is_giant_candle = True
-
-            if is_giant_candle:
-                continue 
-
-            # Tiered Betting Logic
-            if prev_rsi < 25:
-                if prev_rsi < 20: bet_amount = 15
-                else: bet_amount = 10
-                trade = {'type': 'LONG', 'entry_price': k1m['open'], 'time': k1m['datetime'], 'amount': bet_amount}
-                
-            elif prev_rsi > 75:
-                if prev_rsi > 80: bet_amount = 15
-                else: bet_amount = 10
-                trade = {'type': 'SHORT', 'entry_price': k1m['open'], 'time': k1m['datetime'], 'amount': bet_amount}
-                
-            if trade:
-                # Record this trade as active
-                active_trade_indices.append(i + 10)
-                
-                # Settlement
-                settlement_kline = self.klines_1m[i+10]
-                settlement_price = settlement_kline['open']
-                
-                is_win = False
-                profit = 0
-                
-                if trade['type'] == 'LONG':
-                    is_win = settlement_price > trade['entry_price']
-                else:
-                    is_win = settlement_price < trade['entry_price']
-                
-                if is_win:
-                    profit = 0.8 * trade['amount']
-                else:
-                    profit = -1.0 * trade['amount']
-                    
-                # Update Unlimited Stats
-                daily_stats[trading_day_date]['profit'] += profit
-                daily_stats[trading_day_date]['unlimited_pnl'] = daily_stats[trading_day_date]['profit']
-                daily_stats[trading_day_date]['trades'] += 1
-                if is_win: daily_stats[trading_day_date]['wins'] += 1
-                else: daily_stats[trading_day_date]['losses'] += 1
-                
-                # Update Capped Stats
-                if not is_stopped_today:
-                    daily_stats[trading_day_date]['capped_profit'] += profit
-                    daily_stats[trading_day_date]['capped_pnl'] = daily_stats[trading_day_date]['capped_profit']
-                    daily_stats[trading_day_date]['capped_trades'] += 1
-                    if is_win: daily_stats[trading_day_date]['capped_wins'] += 1
-                    
-                    current_day_pnl += profit
-                    
-                    # Log to CSV (Only if not stopped)
-                    # Time,Type,Price,Amount,RSI,ActiveTrades,Result,Profit,DayPnL
-                    log_result = "WIN" if is_win else "LOSS"
-                    log_line = f"{trade['time']},{trade['type']},{trade['entry_price']},{trade['amount']},{prev_rsi:.2f},{len(active_trade_indices)},{log_result},{profit:.2f},{current_day_pnl:.2f}\n"
-                    log_file.write(log_line)
-                    
-                    if stop_loss_limit is not None and current_day_pnl <= stop_loss_limit:
-                        is_stopped_today = True
-                        daily_stats[trading_day_date]['stopped'] = True
-                        # Log STOP event
-                        log_file.write(f"{trade['time']},STOP,0,0,0,0,STOPPED,0,{current_day_pnl:.2f}\n")
-                else:
-                    # If stopped, capped_pnl stays same
-                    pass
-                
-                trades.append(trade)
-                
-                # Log to CSV (MOVED INSIDE CAPPED LOGIC)
-
-
-        # Summarize Results
-        log_file.close()
-        
-        total_profit_unlimited = sum(d['profit'] for d in daily_stats.values())
-        total_profit_capped = sum(d['capped_profit'] for d in daily_stats.values())
-        
-        total_trades_unlimited = sum(d['trades'] for d in daily_stats.values())
-        total_wins_unlimited = sum(d['wins'] for d in daily_stats.values())
+    @timed('report')
+    def print_summary(self, unlimited, capped, stop_loss_limit):
+        """
+        Print the day/profit summary.
+
+        :param unlimited: daily_stats() of every trade (no stop)
+        :param capped: daily_stats() of the trades taken before the daily stop
+        """
+        total_profit_unlimited = unlimited['profit'].sum()
+        total_profit_capped = capped['profit'].sum()
+
+        total_trades_unlimited = int(unlimited['trades'].sum())
+        total_wins_unlimited = int(unlimited['wins'].sum())
         win_rate_unlimited = (total_wins_unlimited / total_trades_unlimited * 100) if total_trades_unlimited > 0 else 0
-        
-        total_trades_capped = sum(d['capped_trades'] for d in daily_stats.values())
-        total_wins_capped = sum(d['capped_wins'] for d in daily_stats.values())
+
+        total_trades_capped = int(capped['trades'].sum())
+        total_wins_capped = int(capped['wins'].sum())
         win_rate_capped = (total_wins_capped / total_trades_capped * 100) if total_trades_capped > 0 else 0
-        
+
         # Trade Frequency Stats
-        trades_per_day = [d['trades'] for d in daily_stats.values()]
-        min_trades = min(trades_per_day) if trades_per_day else 0
-        max_trades = max(trades_per_day) if trades_per_day else 0
-        avg_trades = sum(trades_per_day) / len(trades_per_day) if trades_per_day else 0
-        days_with_zero_trades = trades_per_day.count(0)
-
-        total_days = len(daily_stats)
-        stopped_days = [d for d in daily_stats.values() if d['stopped']]
-        count_stopped = len(stopped_days)
-        
+        trades_per_day = unlimited['trades']
+        min_trades = trades_per_day.min() if len(trades_per_day) else 0
+        max_trades = trades_per_day.max() if len(trades_per_day) else 0
+        avg_trades = trades_per_day.mean() if len(trades_per_day) else 0
+        days_with_zero_trades = int((trades_per_day == 0).sum())
+
+        total_days = len(unlimited['day'])
+        count_stopped = int(capped['stopped'].sum())
+
         print(f"\n{'='*30}")
         print(f"RESULTS (Stop Loss: {stop_loss_limit} U)")
         print(f"{'='*30}")
@@ -232,39 +133,173 @@ class DailyAnalysis(WickSniperStrategyPro):
         print(f"\n--- UNLIMITED (No Stop Loss) ---")
         print(f"Total Profit: {total_profit_unlimited:.2f} U")
         print(f"Win Rate: {win_rate_unlimited:.2f}% ({total_wins_unlimited}/{total_trades_unlimited})")
-        
+
         print(f"\n--- CAPPED (With Stop Loss) ---")
         print(f"Total Profit: {total_profit_capped:.2f} U")
         print(f"Win Rate: {win_rate_capped:.2f}% ({total_wins_capped}/{total_trades_capped})")
+
+    @timed()
+    def run_analysis(self, stop_loss_limit=None, start_hour=9, store_path=DEFAULT_DB):
+        """
+        Run backtest with daily analysis and optional stop-loss.
         
+        :param stop_loss_limit: Daily loss limit (negative number, e.g., -50). If None, no limit.
+        :param start_hour: Hour to start the "trading day" (0-23). Default 9.
+        :param store_path: SQLite result store the run is recorded in (see result_store.py).
+        """
+        print(f"\n{'='*50}")
+        print(f"Running Analysis with Stop Loss: {stop_loss_limit if stop_loss_limit else 'None'}")
+        print(f"{'='*50}")
+
+        # Detailed trade history is rendered from the result store once the run is recorded
+        log_filename = "backtest_details.csv"
+        print(f"📝 Detailed log will be saved to: {log_filename}")
+
+        # Ensure indicators are calculated
+        if not self.klines_1m:
+            if not self.load_data():
+                print("Failed to load data.")
+                return
+
+        # Check if indicators exist, if not calculate them
+        if 'rsi' not in self.klines_1m[-1] or 'bb_upper' not in self.klines_1m[-1]:
+            print("Calculating indicators...")
+            self.calculate_rsi(14)
+            self.calculate_bollinger_bands(20, 2)
+
+        klines = self.klines_1m
+        t = self.build_trades(start_hour)
+        n, day_id, bar, in_range, in_window = t['n'], t['day_id'], t['bar'], t['in_range'], t['in_window']
+        entry_idx, side_long, r, amount = t['entry_idx'], t['side_long'], t['rsi'], t['amount']
+        entry_price, is_win, profit = t['entry_price'], t['is_win'], t['profit']
+
+        # Daily stop: grouped cumulative sum per trading day, trades after the stop are masked
+        with stage('daily stop'):
+            trade_day = day_id[entry_idx]
+            keep, day_pnl, stop_hit = apply_daily_stop(trade_day, profit, stop_loss_limit)
+
+            days = day_id[in_window]
+            unlimited = daily_stats(days, trade_day, profit, is_win)
+            capped = daily_stats(days, trade_day[keep], profit[keep], is_win[keep], stop_hit[keep])
+
+        # Concurrent Trades Analysis
+        # A trade opened at j is active on bars j+1 .. j+9 (it closes AT j+10).
+        with stage('concurrency'):
+            opened = np.zeros(n + 1, dtype=np.int64)
+            opened[entry_idx + 1] = 1
+            opened = np.cumsum(opened)
+            active_count = opened[bar] - opened[np.maximum(bar - 9, 0)]
+            concurrent_counts = np.bincount(active_count[in_range])
+
+        # Record the run (only trades taken before the stop), then render the CSV from it
+        # Time,Type,Price,Amount,RSI,ActiveTrades,Result,Profit,DayPnL
+        taken = np.flatnonzero(keep)
+        idx = entry_idx[taken]
+        avg_amp = t['avg_amp']
+        quiet_threshold = np.percentile(avg_amp[20:], 25)
+        with stage('result store'), ResultStore(store_path) as store:
+            run_id = store.add_run(
+                'daily_analysis',
+                {'stop_loss_limit': stop_loss_limit, 'start_hour': start_hour, 'rsi_long': (25, 20),
+                 'rsi_short': (75, 80), 'window': (9, 20), 'settle_bars': 10},
+                data_fingerprint(t['arrays']),
+                trades={
+                    'time': [klines[i]['datetime'] for i in idx.tolist()],
+                    'ts': t['arrays'].ts[idx],
+                    'side': np.where(side_long[taken], 'LONG', 'SHORT'),
+                    'price': entry_price[taken],
+                    'amount': amount[taken],
+                    'rsi': r[taken],
+                    'avg_amp': avg_amp[idx],
+                    'regime': np.where(avg_amp[idx] < quiet_threshold, 'quiet', 'normal'),
+                    'result': np.where(is_win[taken], 'WIN', 'LOSS'),
+                    'profit': profit[taken],
+                    'day': day_labels(trade_day[taken]),
+                    'day_pnl': day_pnl[taken],
+                    'active': active_count[idx] + 1,
+                    'stop_hit': stop_hit[taken],
+                    'exit_time': [klines[i + 10]['datetime'] for i in idx.tolist()],
+                    'exit_price': t['arrays'].open[idx + 10],
+                },
+                daily={
+                    'day': day_labels(capped['day']),
+                    'trades': capped['trades'],
+                    'wins': capped['wins'],
+                    'profit': capped['profit'],
+                    'stopped': capped['stopped'],
+                },
+                metrics={'profit': capped['profit'].sum(), 'trades': int(capped['trades'].sum()),
+                         'wins': int(capped['wins'].sum()), 'stopped_days': int(capped['stopped'].sum())},
+            )
+            store.export_csv(run_id, log_filename)
+
+        self.print_summary(unlimited, capped, stop_loss_limit)
+
         print(f"\n{'='*30}")
         print(f"CONCURRENT TRADES ANALYSIS")
         print(f"{'='*30}")
-        print(f"Max Concurrent Trades: {max_concurrent}")
+        print(f"Max Concurrent Trades: {len(concurrent_counts) - 1}")
         print("Distribution (Number of Active Trades -> Frequency):")
-        # Sort by number of concurrent trades
-        total_minutes = sum(concurrent_counts.values())
-        for count in sorted(concurrent_counts.keys()):
-            freq = concurrent_counts[count]
+        total_minutes = concurrent_counts.sum()
+        for count, freq in enumerate(concurrent_counts.tolist()):
+            if freq == 0:
+                continue
             pct = (freq / total_minutes) * 100
             print(f"  {count} trades: {freq} minutes ({pct:.2f}%)")
-            
-        return daily_stats
-        print(f"Total Trading Days: {total_days}")
-        if stop_loss_limit:
-            print(f"Days Stopped Out: {stopped_days} ({(stopped_days/total_days)*100:.1f}%)")
-            
-        print("\n--- Top 3 Best Days ---")
-        for day, stats in sorted_days[:3]:
-            print(f"{day}: Profit {stats['profit']:.2f} U | Wins: {stats['wins']}/{stats['trades']}")
 
-        print("\n--- Top 3 Worst Days ---")
-        for day, stats in sorted_days[-3:]:
-            print(f"{day}: Profit {stats['profit']:.2f} U | Wins: {stats['wins']}/{stats['trades']} | Stopped: {stats['stopped']}")
+        return to_daily_dict(
+            unlimited,
+            stopped=capped['stopped'],
+            capped_profit=capped['profit'],
+            capped_trades=capped['trades'],
+            capped_wins=capped['wins'],
+            unlimited_pnl=unlimited['profit'],
+            capped_pnl=capped['profit'],
+        )
 
-        return daily_stats
+    @timed()
+    def run_incremental(self, stop_loss_limit=-45, start_hour=9, checkpoint=None):
+        """
+        Same summary as run_analysis, but resumed from a checkpoint: only bars appended since the last
+        run are processed (see incremental_backtest.py), so a daily refresh costs time proportional to
+        the new data. The concurrency histogram and the CSV/result store are only produced by run_analysis.
 
-if __name__ == "__main__":
+        :param checkpoint: checkpoint file, default daily_analysis.ckpt next to this script
+        """
+        checkpoint = checkpoint or checkpoint_path('daily_analysis')
+        if not self.klines_1m:
+            if not self.load_data():
+                print("Failed to load data.")
+                return
+
+        bt = resume_or_start(checkpoint, rsi_tier_candidates, StreamingSimulator(10, None, stop_loss_limit),
+                             day_start_hour=start_hour)
+        resumed_from = bt.n
+        added = bt.update(self.klines_1m)
+        bt.save(checkpoint)
+        print(f"\n{'='*50}")
+        print(f"Incremental Analysis with Stop Loss: {stop_loss_limit if stop_loss_limit else 'None'}")
+        print(f"Bars: {resumed_from} checkpointed + {bt.n - resumed_from} new | New signals: {len(added.get('index', []))}")
+        print(f"{'='*50}")
+
+        unlimited = bt.daily('accepted')
+        capped = bt.daily('keep')
+        if not len(unlimited['day']):
+            print("Not enough bars for a trading day yet.")
+            return {}
+        self.print_summary(unlimited, capped, stop_loss_limit)
+        return to_daily_dict(
+            unlimited,
+            stopped=capped['stopped'],
+            capped_profit=capped['profit'],
+            capped_trades=capped['trades'],
+            capped_wins=capped['wins'],
+            unlimited_pnl=unlimited['profit'],
+            capped_pnl=capped['profit'],
+        )
+
+
+def main():
     print("Starting analysis script...")
     try:
         # Construct path to data file relative to this script
@@ -276,6 +311,9 @@ if __name__ == "__main__":
         if analyzer.load_data():
             print("\n>>> RUNNING ANALYSIS FOR ASIAN SESSION (09:00 - 20:00) WITH STOP LOSS -45U...")
             analyzer.run_analysis(stop_loss_limit=-45)
+
+            print("\n>>> DAILY STOP FRONTIER (same trades, every stop level)...")
+            analyzer.run_stop_frontier()
             
         else:
             print("Data load failed.")
@@ -283,3 +321,8 @@ if __name__ == "__main__":
         print(f"An error occurred: {e}")
         import traceback
         traceback.print_exc()
+
+
+if __name__ == "__main__":
+    # python daily_analysis.py [--profile[=stacks.folded]]
+    run_profiled(main)
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_rsi, calc_bollinger, calc_avg_amp
+from trading_day import trading_day_ids, daily_stats
+from signal_table import build_signal_table, take, flat_stake, tiered_stake, settle_pnl
+from zone_detector import ConsolidationDetector
+from zone_backtest import ZoneTradeEngine, zones_to_arrays, SHORT
+from incremental_backtest import StreamingSimulator
+from result_store import canonical_params
+from stage_profiler import stage, run_profiled
+
+# test.py analyze() 的横盘识别参数
+ZONE_PARAMS = {'touch_threshold': 0.1, 'min_touches': 2, 'max_klines_between': 50, 'min_duration': 20,
+               'min_amplitude_percent': 0.5}
+
+
+def _bollinger(arrays):
+    middle, upper, lower = calc_bollinger(arrays.close, 20, 2)
+    return {'bb_middle': middle, 'bb_upper': upper, 'bb_lower': lower}
+
+
+def _zones(arrays):
+    return zones_to_arrays(ConsolidationDetector(arrays.high, arrays.low).find_zones(**ZONE_PARAMS))
+
+
+# 指标名 -> 计算函数 (参数与各脚本一致)；每份数据每个指标只算一次，所有策略共用
+INDICATORS = {
+    'rsi': lambda arrays: calc_rsi(arrays.close, 14),
+    'avg_amp': lambda arrays: calc_avg_amp(arrays.high, arrays.low, 20),
+    'bollinger': _bollinger,
+    'day': lambda arrays: trading_day_ids(arrays.ts, 9),
+    'zones': _zones,
+}
+
+
+class MarketData:
+    """
+    一份K线数据和它的共享指标：指标按名字惰性计算并缓存，
+    候选信号表 (signal_table.build_signal_table) 按参数缓存，参数相同的策略共用一次扫描
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.values = {}
+        self.tables = {}
+
+    def get(self, name):
+        if name not in self.values:
+            if name not in INDICATORS:
+                raise ValueError(f"未知指标 {name!r}，可选: {', '.join(INDICATORS)}")
+            with stage(f'indicator {name}'):
+                self.values[name] = INDICATORS[name](self.arrays)
+        return self.values[name]
+
+    def prepare(self, names):
+        """一次算好一组指标 (各策略 requires 的并集)"""
+        for name in sorted(set(names)):
+            self.get(name)
+
+    def signal_table(self, **params):
+        key = canonical_params(params)
+        if key not in self.tables:
+            bands = self.get('bollinger')
+            with stage('signal table'):
+                self.tables[key] = build_signal_table(self.arrays, self.get('rsi'), self.get('avg_amp'),
+                                                      bands['bb_lower'], bands['bb_upper'], **params)
+        return self.tables[key]
+
+
+class Strategy:
+    """
+    注册到联合回测里的一个策略
+    :param signals: signals(data) -> 按时间排序的候选信号 dict of arrays，至少有 index / day / pnl / is_win，
+                    需要同区域交替方向时另给 zone / side
+    :param requires: 用到的指标名 (INDICATORS 的键)
+    其余参数是该策略自己的 StreamingSimulator 设置
+    """
+
+    def __init__(self, name, signals, requires=(), hold_bars=10, max_active=None, stop_loss_limit=None,
+                 alternate=False):
+        self.name = name
+        self.signals = signals
+        self.requires = tuple(requires)
+        self.hold_bars = hold_bars
+        self.max_active = max_active
+        self.stop_loss_limit = stop_loss_limit
+        self.alternate = alternate
+
+    def simulator(self):
+        return StreamingSimulator(self.hold_bars, self.max_active, self.stop_loss_limit, self.alternate)
+
+
+# ---------------- 各脚本的默认配置 ----------------
+
+def wick_sniper_pro_signals(data):
+    """WickSniperStrategyPro.backtest_complex 场景 A：UTC 0-8，RSI<25/>75，触碰布林带，避开巨型K线，1U 赔率 0.8"""
+    table = data.signal_table(hours=(0, 8), long_below=25, short_above=75, giant_floor=0.0, entry='band',
+                              settle='open')
+    table = take(table, table['touch'] & (table['index'] >= 101))
+    return dict(table, pnl=settle_pnl(table, np.ones(len(table['index'])), 0.8))
+
+
+def asian_sniper_signals(data):
+    """AsianSniperStrategy.run_simulation：与上面同一张信号表，固定 10U"""
+    table = data.signal_table(hours=(0, 8), long_below=25, short_above=75, giant_floor=0.0, entry='band',
+                              settle='open')
+    table = take(table, table['touch'])
+    return dict(table, pnl=settle_pnl(table, flat_stake(table, 10.0), 0.8))
+
+
+def tiered_signals(data):
+    """TieredBacktest.run_backtest：UTC 1-12，巨型K线需同时 >15U，i+10 中间价结算，RSI 分级 15U/10U"""
+    table = data.signal_table(hours=(1, 12), long_below=25, short_above=75, giant_floor=15.0, entry='band',
+                              settle='mid')
+    stake = tiered_stake(table)
+    table = take(table, stake > 0)
+    return dict(table, pnl=settle_pnl(table, stake[stake > 0], 0.8))
+
+
+def zone_signals(data, hold_periods=10, touch_threshold=0.0005):
+    """
+    test.py 横盘区域触碰 (ZoneTradeEngine)：持仓 10 根，收盘价平仓，盈亏为价差
+    与 test.py backtest_strategy 一样每笔盈亏先 round(, 2) 再累计 (输赢仍按未取整的价差判断)
+    """
+    a = data.arrays
+    engine = ZoneTradeEngine(a.high, a.low, a.close)
+    entries = engine.touch_entries(*data.get('zones'), hold_periods=hold_periods, touch_threshold=touch_threshold)
+    index = entries['entry_index']
+    exit_price = a.close[index + hold_periods]
+    profit = np.where(entries['side'] == SHORT, entries['entry_price'] - exit_price, exit_price - entries['entry_price'])
+    pnl = np.array([round(p, 2) for p in profit.tolist()], dtype=np.float64)
+    return dict(entries, index=index, day=data.get('day')[index], pnl=pnl, is_win=profit > 0)
+
+
+STRATEGIES = [
+    Strategy('wick_sniper_pro', wick_sniper_pro_signals, ('rsi', 'avg_amp', 'bollinger')),
+    Strategy('asian_sniper', asian_sniper_signals, ('rsi', 'avg_amp', 'bollinger')),
+    Strategy('tiered', tiered_signals, ('rsi', 'avg_amp', 'bollinger')),
+    Strategy('zones', zone_signals, ('zones', 'day'), max_active=5, alternate=True),
+]
+
+
+def register(strategy):
+    """加入默认策略列表 (同名替换)"""
+    STRATEGIES[:] = [s for s in STRATEGIES if s.name != strategy.name] + [strategy]
+    return strategy
+
+
+def run_fused(arrays, strategies=None):
+    """
+    联合回测：数据只加载/准备一次，先算好所有策略所需指标的并集，
+    各策略的候选信号都是在共享指标上的向量化扫描 (参数相同的扫描只做一次)，
+    再交给各自的 StreamingSimulator 顺序过风控；各模拟器互不影响
+
+    :param arrays: KlineArrays 或 MarketData
+    :return: {策略名: {'trades': 信号 + accepted/keep/day_pnl/stop_hit, 'daily': daily_stats, 'summary': dict}}
+    """
+    strategies = STRATEGIES if strategies is None else strategies
+    data = arrays if isinstance(arrays, MarketData) else MarketData(arrays)
+    data.prepare(name for s in strategies for name in s.requires)
+    days = np.unique(data.get('day')) if len(data.arrays) else np.zeros(0, dtype=np.int64)
+
+    results = {}
+    for s in strategies:
+        with stage(s.name):
+            cand = s.signals(data)
+            trades = dict(cand, **s.simulator().feed(cand['index'], cand['day'], cand['pnl'],
+                                                     cand.get('zone') if s.alternate else None,
+                                                     cand.get('side') if s.alternate else None))
+            keep = trades['keep']
+            daily = daily_stats(days, trades['day'][keep], trades['pnl'][keep], trades['is_win'][keep],
+                                trades['stop_hit'][keep])
+            n = int(keep.sum())
+            wins = int(trades['is_win'][keep].sum())
+            results[s.name] = {
+                'trades': trades,
+                'daily': daily,
+                'summary': {'signals': len(cand['index']), 'trades': n, 'wins': wins,
+                            'win_rate': wins / n * 100 if n else 0.0, 'profit': float(trades['pnl'][keep].sum()),
+                            'stopped_days': int(daily['stopped'].sum())},
+            }
+    return results
+
+
+def print_results(results, elapsed=None):
+    print(f"\n{'='*88}")
+    print(f"联合回测 ({len(results)} 个策略" + (f", 耗时 {elapsed:.2f}s)" if elapsed is not None else ")"))
+    print(f"{'策略':<18} | {'候选':<7} | {'成交':<7} | {'胜率':<8} | {'净利润':<12} | {'止损天数'}")
+    print(f"{'-'*88}")
+    for name, r in results.items():
+        s = r['summary']
+        print(f"{name:<18} | {s['signals']:<7} | {s['trades']:<7} | {s['win_rate']:<7.2f}% | {s['profit']:<+12.2f} | {s['stopped_days']}")
+    print(f"{'='*88}")
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(script_dir, 'ETHUSDT_1m_klines.json')
+    t0 = time.perf_counter()
+    with stage('load'):
+        arr = KlineArrays.load(data_file)
+    if arr is None:
+        print(f"❌ 找不到数据文件 {data_file}")
+        sys.exit(1)
+    results = run_fused(arr)
+    print_results(results, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    # 用法: python fused_backtest.py [K线文件] [--profile[=stacks.folded]]
+    run_profiled(main)
@@ -0,0 +1,406 @@
+import os
+import pickle
+import sys
+import tempfile
+from collections import deque
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, parse_datetimes, calc_rsi, resume_rsi
+from trading_day import trading_day_ids, daily_stats
+from zone_backtest import ZoneTradeEngine, SHORT
+
+CHECKPOINT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 检查点里保留的末尾K线数：上一根取值、20 根振幅窗口和 RSI 状态都在这之内
+TAIL_BARS = 64
+
+
+class StreamingSimulator:
+    """
+    可以断点续跑的顺序风控状态，逐笔处理按时间排序的候选信号：
+    - 同区域交替方向 (alternate=True 时，同一区域不能连续两次同方向)
+    - 最大同时持仓 max_active (None 不限)，持仓 hold_bars 根K线
+    - 每日止损 stop_loss_limit (None 不止损)，当日累计盈亏 <= 阈值的那笔仍成交，其后当天不再开单
+
+    先后顺序与原脚本一致：交替方向 -> 持仓上限 (limit_concurrent) -> 日止损 (apply_daily_stop)，
+    被止损屏蔽的信号仍占用持仓名额 (与 limit_concurrent 在止损之前执行的口径相同)
+    状态只有持仓到期队列、当日累计盈亏/止损标记、各区域上一笔方向，可以直接 pickle
+    """
+
+    def __init__(self, hold_bars=10, max_active=None, stop_loss_limit=None, alternate=False):
+        self.hold_bars = hold_bars
+        self.max_active = max_active
+        self.stop_loss_limit = stop_loss_limit
+        self.alternate = alternate
+        self.exits = deque()
+        self.day = None
+        self.day_pnl = 0.0
+        self.stopped = False
+        self.last_side = {}
+
+    def feed(self, entry_index, day, pnl, zone=None, side=None):
+        """
+        :return: dict of arrays (与输入等长)
+            accepted: 通过交替方向和持仓上限
+            keep: accepted 且在止损之前 (含触发止损那笔)
+            day_pnl: 当日截至该笔的累计盈亏 (只累计 accepted 的交易)
+            stop_hit: 该笔是否触发当日止损
+        """
+        n = len(entry_index)
+        accepted = np.zeros(n, dtype=bool)
+        keep = np.zeros(n, dtype=bool)
+        day_pnl = np.zeros(n)
+        stop_hit = np.zeros(n, dtype=bool)
+        zone = [None] * n if zone is None else zone.tolist()
+        side = [None] * n if side is None else side.tolist()
+        rows = zip(entry_index.tolist(), day.tolist(), np.asarray(pnl, dtype=np.float64).tolist(), zone, side)
+        for k, (i, d, p, z, s) in enumerate(rows):
+            while self.exits and self.exits[0] <= i:
+                self.exits.popleft()
+            if d != self.day:
+                self.day = d
+                self.day_pnl = 0.0
+                self.stopped = False
+            if self.alternate and self.last_side.get(z) == s:
+                continue
+            if self.max_active is not None and len(self.exits) >= self.max_active:
+                continue
+            accepted[k] = True
+            self.exits.append(i + self.hold_bars)
+            if self.alternate:
+                self.last_side[z] = s
+            # 与 apply_daily_stop 一样对累计盈亏取 1e-9 精度
+            self.day_pnl = round(self.day_pnl + p, 9)
+            day_pnl[k] = self.day_pnl
+            if self.stopped:
+                continue
+            keep[k] = True
+            if self.stop_loss_limit is not None and self.day_pnl <= self.stop_loss_limit:
+                self.stopped = True
+                stop_hit[k] = True
+        return {'accepted': accepted, 'keep': keep, 'day_pnl': day_pnl, 'stop_hit': stop_hit}
+
+
+def extend_window(tail, rsi_state, arrays, offset, day_start_hour=9):
+    """
+    把检查点的末尾K线 (tail) 和新追加的K线拼成一个窗口，并接着算指标：
+    - rsi: 从 RSI 末尾状态递推
+    - amp_csum: 振幅的前缀和，从上次的末尾值继续累加 (与整段 np.cumsum 逐值一致)
+    :param offset: arrays 第一根K线的全局下标
+    :return: (window 列字典, 新的 RSI 状态)
+    """
+    amp = arrays.high - arrays.low
+    last_csum = tail['amp_csum'][-1] if len(tail['bar']) else 0.0
+    new = {
+        'bar': np.arange(offset, offset + len(arrays)),
+        'ts': arrays.ts,
+        'open': arrays.open,
+        'high': arrays.high,
+        'low': arrays.low,
+        'close': arrays.close,
+        'amp_csum': np.cumsum(np.r_[last_csum, amp])[1:],
+    }
+    if rsi_state is None:
+        # 之前的K线还不够算出第一个 RSI，末尾K线就是全部历史，整段重算
+        rsi, rsi_state = calc_rsi(np.r_[tail['close'], arrays.close], return_state=True)
+        new['rsi'] = rsi[len(tail['bar']):]
+    else:
+        new['rsi'], rsi_state = resume_rsi(arrays.close, rsi_state)
+    window = {key: np.r_[tail[key], values] for key, values in new.items()}
+    window['day'] = trading_day_ids(window['ts'], day_start_hour)
+    window['hour'] = (window['ts'] // 3600) % 24
+    return window, rsi_state
+
+
+def window_avg_amp(window, period=20):
+    """
+    calc_avg_amp 的窗口版本：过去 period 根K线 (不含当前) 的平均振幅，全局前 period 根为 0，
+    窗口开头前缀和不够的K线为 NaN (出信号的K线离窗口开头足够远，用不到)
+    用全局前缀和相减，与整段计算逐值一致
+    """
+    bar = window['bar']
+    csum = np.r_[0.0, window['amp_csum']]
+    pos = np.arange(len(bar))
+    out = np.where(bar < period, 0.0, np.nan)
+    # 全局下标正好是 period 时减去的前缀和为 0
+    ok = np.flatnonzero((bar == period) | ((bar > period) & (pos > period)))
+    lo = np.where(bar[ok] == period, 0.0, csum[np.maximum(ok - period, 0)])
+    out[ok] = (csum[ok] - lo) / period
+    return out
+
+
+def rsi_tier_candidates(window, lo, hi, hours=(9, 20), long_below=25, short_above=75, long_strong=20,
+                        short_strong=80, giant_floor=15.0, payout=0.8, horizon=10):
+    """
+    DailyAnalysis.build_trades 的窗口版本：[lo, hi) 内 (全局下标) 的候选信号和结算
+    上一根 RSI < 25 做多 (< 20 下 15U，否则 10U)，> 75 做空 (> 80 下 15U)，i+horizon 开盘价结算
+    """
+    bar = window['bar']
+    rsi = window['rsi']
+    avg_amp = window_avg_amp(window)
+    prev_rsi = np.r_[np.nan, rsi[:-1]]
+    prev_amp = np.r_[np.nan, (window['high'] - window['low'])[:-1]]
+    is_giant = (avg_amp > 0) & (prev_amp > 3 * avg_amp) & (prev_amp > giant_floor)
+
+    in_range = (bar >= lo) & (bar < hi)
+    in_window = in_range & (window['hour'] >= hours[0]) & (window['hour'] < hours[1])
+    candidate = in_window & ~np.isnan(rsi) & ~is_giant
+    is_long = candidate & (prev_rsi < long_below)
+    is_short = candidate & ~is_long & (prev_rsi > short_above)
+
+    pos = np.flatnonzero(is_long | is_short)
+    side_long = is_long[pos]
+    r = prev_rsi[pos]
+    amount = np.where(side_long, np.where(r < long_strong, 15, 10), np.where(r > short_strong, 15, 10))
+    entry_price = window['open'][pos]
+    settle_price = window['open'][pos + horizon]
+    is_win = np.where(side_long, settle_price > entry_price, settle_price < entry_price)
+    return {
+        'days': window['day'][in_window],
+        'index': bar[pos],
+        'day': window['day'][pos],
+        'ts': window['ts'][pos],
+        'long': side_long,
+        'rsi': r,
+        'avg_amp': avg_amp[pos],
+        'amount': amount,
+        'entry_price': entry_price,
+        'settle_price': settle_price,
+        'is_win': is_win,
+        'pnl': np.where(is_win, payout * amount, -1.0 * amount),
+    }
+
+
+def inclusive_avg_amp(amp, bar=None, period=20):
+    """
+    含当前K线在内的 period 根振幅均值 (StandardBacktest 的口径)，全局下标 < period 或窗口开头不足的K线为 NaN
+    逐项顺序相加，与原脚本 sum_amp += ... 的逐根求和逐值一致，结果与所在位置无关
+    """
+    bar = np.arange(len(amp)) if bar is None else bar
+    out = np.full(len(amp), np.nan)
+    ok = np.flatnonzero((bar >= period) & (np.arange(len(amp)) >= period - 1))
+    s = 0
+    for j in range(period):
+        s = s + amp[ok - (period - 1) + j]
+    out[ok] = s / period
+    return out
+
+
+def dynamic_c_candidates(window, lo, hi, quiet_threshold, hours=(9, 20), giant_floor=15.0, payout=0.8, horizon=10):
+    """
+    StandardBacktest (Dynamic C) 的窗口版本，quiet_threshold 为平均振幅的 P25 (检查点里固定下来)
+    平均振幅为含当前K线在内的 20 根振幅均值，逐项顺序相加，与原脚本的逐根求和逐值一致
+    """
+    bar = window['bar']
+    amp = window['high'] - window['low']
+    amp_col = inclusive_avg_amp(amp, bar)
+
+    rsi = np.r_[np.nan, window['rsi'][:-1]]
+    avg_amp = np.r_[np.nan, amp_col[:-1]]
+    prev_amp = np.r_[np.nan, amp[:-1]]
+    is_giant = (avg_amp > 0) & (prev_amp > 3 * avg_amp) & (prev_amp > giant_floor)
+    is_quiet = avg_amp < quiet_threshold
+
+    long_th = np.where(is_quiet, 30, 25); long_strong = np.where(is_quiet, 25, 20)
+    short_th = np.where(is_quiet, 70, 75); short_strong = np.where(is_quiet, 75, 80)
+
+    in_range = (bar >= lo) & (bar < hi)
+    in_window = in_range & (window['hour'] >= hours[0]) & (window['hour'] < hours[1])
+    candidate = in_window & ~np.isnan(rsi) & ~np.isnan(avg_amp) & ~is_giant
+    is_long = candidate & (rsi < long_th)
+    is_short = candidate & ~is_long & (rsi > short_th)
+
+    pos = np.flatnonzero(is_long | is_short)
+    side_long = is_long[pos]
+    amount = np.where(side_long, np.where(rsi[pos] < long_strong[pos], 15, 10),
+                      np.where(rsi[pos] > short_strong[pos], 15, 10))
+    entry_price = window['open'][pos]
+    settle_price = window['open'][pos + horizon]
+    is_win = np.where(side_long, settle_price > entry_price, settle_price < entry_price)
+    return {
+        'days': window['day'][in_range],
+        'index': bar[pos],
+        'day': window['day'][pos],
+        'ts': window['ts'][pos],
+        'long': side_long,
+        'rsi': rsi[pos],
+        'avg_amp': avg_amp[pos],
+        'quiet': is_quiet[pos],
+        'amount': amount,
+        'entry_price': entry_price,
+        'settle_price': settle_price,
+        'is_win': is_win,
+        'pnl': np.where(is_win, amount * payout, -amount),
+    }
+
+
+def zone_touch_candidates(window, lo, hi, zones, hold_periods=10, touch_threshold=0.001):
+    """
+    横盘区域触碰信号 (ZoneTradeEngine.touch_entries) 的窗口版本
+    :param zones: zones_to_arrays() 的结果 (trade_start, end, resistance, support)，全局下标；
+                  区域每次按全部K线重新识别，只有 [lo, hi) 内的触碰会进入模拟
+    交替方向按区域的 trade_start 下标识别 (zone_key)，重新识别后区域编号变化也不影响
+    """
+    trade_start, zone_end, resistance, support = zones
+    bar = window['bar']
+    base = bar[0]
+    live = np.flatnonzero((zone_end >= lo) & (trade_start + 1 < hi))
+    engine = ZoneTradeEngine(window['high'], window['low'], window['close'])
+    entries = engine.touch_entries(np.maximum(trade_start[live], lo - 1) - base, zone_end[live] - base,
+                                   resistance[live], support[live], hold_periods, touch_threshold)
+    pos = entries['entry_index']
+    zone = live[entries['zone']]
+    entry_price = entries['entry_price']
+    exit_price = window['close'][pos + hold_periods]
+    profit = np.where(entries['side'] == SHORT, entry_price - exit_price, exit_price - entry_price)
+    return {
+        'days': window['day'][(bar >= lo) & (bar < hi)],
+        'index': bar[pos],
+        'day': window['day'][pos],
+        'ts': window['ts'][pos],
+        'zone': zone,
+        'zone_key': trade_start[zone],
+        'side': entries['side'],
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'is_win': profit > 0,
+        'pnl': profit,
+        'profit_percent': (profit / entry_price) * 100,
+    }
+
+
+class IncrementalBacktest:
+    """
+    增量回测：每次只处理新追加的K线，状态存进检查点文件
+
+    检查点内容：
+    - 已处理的K线数 n 和已出信号的边界 frontier (需要 i+horizon 结算价的K线要等数据到齐才处理)
+    - 末尾 TAIL_BARS 根K线及其指标 (RSI 递推状态、振幅前缀和)
+    - StreamingSimulator 的状态：未到期持仓、当日累计盈亏、止损标记、各区域上一笔方向
+    - 累计的交易明细和出现过的交易日
+
+    数据刷新后调用 update(klines)：只把 klines[n:] 转成数组，从检查点接着算指标、出信号、过风控，
+    耗时与新增K线数成正比，结果与整段重跑一致
+
+    :param candidates: 模块级信号函数 candidates(window, lo, hi, **params)，例如 rsi_tier_candidates
+    :param context: 信号函数参数之外、同样决定结果的设置 (例如横盘识别参数)，不传给 candidates，只参与 config() 比对
+    """
+
+    def __init__(self, candidates, simulator, params=None, start=100, horizon=10, day_start_hour=9, context=None):
+        self.candidates = candidates
+        self.simulator = simulator
+        self.params = params or {}
+        self.context = context
+        self.start = start
+        self.horizon = horizon
+        self.day_start_hour = day_start_hour
+        self.n = 0
+        self.frontier = start
+        self.rsi_state = None
+        self.tail = {key: np.zeros(0) for key in ('open', 'high', 'low', 'close', 'amp_csum', 'rsi')}
+        self.tail['bar'] = np.zeros(0, dtype=np.int64)
+        self.tail['ts'] = np.zeros(0, dtype=np.int64)
+        self.chunks = []
+        self.day_ids = np.zeros(0, dtype=np.int64)
+
+    def update(self, klines):
+        """
+        处理 klines 中检查点之后新增的K线 (list[dict]，即 load_data() 的结果)
+        :return: 本次新增的交易 (dict of arrays，含 accepted/keep/day_pnl/stop_hit 列)
+        """
+        n = len(klines)
+        if n < self.n:
+            raise ValueError(f"K线比检查点少 ({n} < {self.n})，数据被截断过，需要重新全量回测")
+        if self.n and parse_datetimes([klines[self.n - 1]['datetime']])[0] != self.tail['ts'][-1]:
+            raise ValueError(f"第 {self.n} 根K线与检查点不一致，历史数据被改写过，需要重新全量回测")
+        if n == self.n:
+            return {}
+        return self.append(KlineArrays.from_klines(klines[self.n:]))
+
+    def append(self, arrays):
+        """
+        追加一段紧接在已处理K线之后的新K线 (KlineArrays)；流式回测按块调用
+        :return: 本次新增的交易
+        """
+        if len(arrays) == 0:
+            return {}
+        if self.n and arrays.ts[0] <= self.tail['ts'][-1]:
+            raise ValueError(f"追加的K线 ({arrays.ts[0]}) 不在已处理的K线 ({self.tail['ts'][-1]}) 之后")
+        window, self.rsi_state = extend_window(self.tail, self.rsi_state, arrays, self.n, self.day_start_hour)
+        n = self.n + len(arrays)
+        hi = n - self.horizon
+        added = {}
+        if hi > self.frontier:
+            cand = self.candidates(window, self.frontier, hi, **self.params)
+            days = cand.pop('days')
+            added = dict(cand, **self.simulator.feed(cand['index'], cand['day'], cand['pnl'],
+                                                     cand.get('zone_key'), cand.get('side')))
+            self.chunks.append(added)
+            if len(self.chunks) >= 64:
+                self.trades()
+            self.day_ids = np.union1d(self.day_ids, days)
+            self.frontier = hi
+        self.tail = {key: values[-TAIL_BARS:] for key, values in window.items() if key in self.tail}
+        self.n = n
+        return added
+
+    def trades(self):
+        """全部交易 (dict of arrays)，同时把累计的分块合并成一块"""
+        if len(self.chunks) > 1:
+            self.chunks = [{key: np.concatenate([c[key] for c in self.chunks]) for key in self.chunks[0]}]
+        return self.chunks[0] if self.chunks else {}
+
+    def daily(self, column='keep'):
+        """按交易日汇总 (trading_day.daily_stats 的格式)；column='accepted' 为不计止损的口径"""
+        t = self.trades()
+        if not t:
+            return daily_stats(self.day_ids, np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=bool))
+        mask = t[column]
+        return daily_stats(self.day_ids, t['day'][mask], t['pnl'][mask], t['is_win'][mask],
+                           t['stop_hit'][mask] if column == 'keep' else None)
+
+    def save(self, path):
+        """写入检查点 (先写临时文件再改名)"""
+        self.trades()
+        state = dict(self.__dict__)
+        state.pop('candidates')
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def config(self):
+        """决定结果的全部设置；检查点的设置与本次不同就不能续跑"""
+        sim = self.simulator
+        return (self.params, getattr(self, 'context', None), self.start, self.horizon, self.day_start_hour,
+                sim.hold_bars, sim.max_active, sim.stop_loss_limit, sim.alternate)
+
+    @classmethod
+    def load(cls, path, candidates):
+        """读取检查点，文件不存在返回 None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        bt = cls.__new__(cls)
+        bt.__dict__.update(state)
+        bt.candidates = candidates
+        return bt
+
+
+def checkpoint_path(name):
+    """脚本目录下的检查点文件 {name}.ckpt"""
+    return os.path.join(CHECKPOINT_DIR, f'{name}.ckpt')
+
+
+def resume_or_start(path, candidates, simulator, params=None, **kwargs):
+    """读取检查点；没有检查点或设置已变时新建一个从头开始的增量回测"""
+    bt = IncrementalBacktest(candidates, simulator, params, **kwargs)
+    saved = IncrementalBacktest.load(path, candidates)
+    if saved is not None and saved.config() == bt.config():
+        return saved
+    return bt
@@ -0,0 +1,363 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays
+from kline_resample import resample
+
+# 与 websocket监听模块-买入.py 中 main() 的实盘参数一致
+K1_MIN_BODY_PCT = 0.21       # 15m K1 实体涨跌幅阈值 (%)
+K2_BARS = 15                 # K1 收盘后观察的1m K线数，最后一根是 K2 的收尾K线
+CHECK_SECOND = 55            # 最后一根1m K线在剩余 5 秒时检查 (从开盘起第 55 秒)
+K1_SECONDS = 900
+# 高效买入时段 (一天中的分钟，起始含、结束不含)，见 is_in_efficient_time
+LIVE_EFFICIENT_WINDOWS = ((0, 120), (180, 540), (1080, 1200), (1260, 1320), (1380, 1440))
+# 止盈 330% (100 倍杠杆) 对应的价格变动 %
+TAKE_PROFIT_PRICE_PCT = 3.3
+
+UP = 1
+DOWN = -1
+
+
+def in_windows(minute_of_day, windows):
+    """一天中的分钟是否落在任一 [start, end) 时段内 (标量或数组)"""
+    minute_of_day = np.asarray(minute_of_day)
+    hit = np.zeros(minute_of_day.shape, dtype=bool)
+    for start, end in windows:
+        hit |= (minute_of_day >= start) & (minute_of_day < end)
+    return hit
+
+
+def k1_strength(open_, close):
+    """K1 柱体强度：|收 - 开| / 开 * 100，开盘价为 0 时记 0 (与实盘 change_pct 同一写法)"""
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    safe = np.where(open_ != 0, open_, 1.0)
+    return np.where(open_ != 0, np.abs((close - open_) / safe * 100), 0.0)
+
+
+class K1K2StateMachine:
+    """
+    15m K1 / 1m K2 突破回归策略的状态机 (main() 中实盘逻辑去掉下单、通知和日志后的版本)
+
+    1. 每根 15m K线收盘都重置状态；实体涨跌幅 >= min_body_pct 时它成为 K1，开始监控之后的1m K线
+    2. 已收盘的第 1..k2_bars-1 根1m K线中第一次突破 K1 高/低点，记下突破方向 (同一根上下都破记为向下)
+    3. 第 k2_bars-1 根收盘时已有突破 -> 重点关注；最后一根 (第 k2_bars 根) 在剩余 5 秒时
+       仍在 K1 区间内 -> 反向开仓 (向上突破做空，向下突破做多)，入场价为当时的价格
+    4. 可选过滤：K2/K1 实体比区间 body_ratio=(低, 高)，高效时段 windows (None = 不限制，实盘目前两者都未生效)
+
+    时间戳为秒 (K线开盘时间)；on_final_check 传入最后一根1m K线截至检查时刻的 OHLC
+    """
+
+    WAITING = 'waiting_15m'
+    MONITORING = 'monitoring_1m'
+    KEY_FOCUS = 'key_focus'
+
+    def __init__(self, min_body_pct=K1_MIN_BODY_PCT, body_ratio=None, windows=None, k2_bars=K2_BARS):
+        if not 2 <= k2_bars <= K1_SECONDS // 60:
+            raise ValueError(f"k2_bars 必须在 2..{K1_SECONDS // 60} 之间: {k2_bars}")
+        self.min_body_pct = min_body_pct
+        self.body_ratio = body_ratio
+        self.windows = windows
+        self.k2_bars = k2_bars
+        self.reset()
+
+    def reset(self):
+        self.state = self.WAITING
+        self.k1 = None
+        self.strength = 0.0
+        self.breakout = None
+        self.count = 0
+        self.decided = False
+
+    def on_15m_close(self, ts, open_, high, low, close):
+        """15m K线收盘：重置周期状态，满足阈值则以它为 K1 开始监控，返回是否触发监控"""
+        strength = float(k1_strength(open_, close))
+        self.reset()
+        if strength < self.min_body_pct:
+            return False
+        self.state = self.MONITORING
+        self.k1 = {'ts': ts, 'open': open_, 'high': high, 'low': low, 'close': close}
+        self.strength = strength
+        return True
+
+    @property
+    def awaiting_final(self):
+        """是否在等最后一根1m K线的收尾检查"""
+        return self.state == self.KEY_FOCUS and self.count == self.k2_bars - 1 and not self.decided
+
+    def on_1m_close(self, ts, open_, high, low, close):
+        """1m K线收盘：计数并检测突破，返回当前记录的突破方向 (UP / DOWN / None)"""
+        if self.state == self.WAITING or ts < self.k1['ts'] + K1_SECONDS:
+            return None
+        self.count += 1
+        breakout_up = high > self.k1['high']
+        breakout_down = low < self.k1['low']
+        if (breakout_up or breakout_down) and self.breakout is None:
+            self.breakout = DOWN if breakout_down else UP
+        if self.state == self.MONITORING and self.breakout is not None and self.count == self.k2_bars - 1:
+            self.state = self.KEY_FOCUS
+        return self.breakout
+
+    def on_final_check(self, ts, open_, high, low, close):
+        """
+        最后一根1m K线的收尾检查 (K线未收盘)，每个 K1 只判断一次
+        :return: 信号 dict (ts, side, entry_price, k1_strength, body_ratio, breakout)，不开仓返回 None
+        """
+        if not self.awaiting_final:
+            return None
+        self.decided = True
+        k1 = self.k1
+        if not (low >= k1['low'] and high <= k1['high']):
+            return None
+        k1_body = abs(k1['close'] - k1['open'])
+        body_ratio = 0.0 if k1_body == 0 else abs(close - open_) / k1_body
+        if self.body_ratio is not None and not (self.body_ratio[0] <= body_ratio <= self.body_ratio[1]):
+            return None
+        if self.windows is not None and not in_windows((ts // 60) % 1440, self.windows):
+            return None
+        return {'ts': ts, 'side': -self.breakout, 'entry_price': close, 'k1_strength': self.strength,
+                'body_ratio': body_ratio, 'breakout': self.breakout}
+
+
+def _columns(bars):
+    """KlineArrays 或 resample() 的结果 -> dict 列"""
+    if isinstance(bars, dict):
+        return bars
+    return {'ts': bars.ts, 'open': bars.open, 'high': bars.high, 'low': bars.low, 'close': bars.close}
+
+
+def replay(machine, bars_15m, arrays_1m, arrays_1s=None, check_second=CHECK_SECOND):
+    """
+    按时间顺序把历史K线喂给状态机 (逐根，慢；用来核对 K1K2Backtest 的结果)
+    同一时刻先处理1m K线，再处理 15m 收盘；收尾检查用 partial_bar 的截至检查时刻的 OHLC
+    :return: 信号 dict 列表
+    """
+    k1 = _columns(bars_15m)
+    k1_close = k1['ts'] + K1_SECONDS
+    order = np.argsort(k1_close, kind='stable')
+    j = 0
+    signals = []
+    for i in range(len(arrays_1m)):
+        ts = int(arrays_1m.ts[i])
+        while j < len(order) and k1_close[order[j]] <= ts:
+            p = order[j]
+            if k1.get('complete', None) is None or k1['complete'][p]:
+                machine.on_15m_close(int(k1['ts'][p]), k1['open'][p], k1['high'][p], k1['low'][p], k1['close'][p])
+            else:
+                machine.reset()
+            j += 1
+        bar = (arrays_1m.open[i], arrays_1m.high[i], arrays_1m.low[i], arrays_1m.close[i])
+        if machine.awaiting_final:
+            partial = partial_bar(arrays_1s, np.array([ts]), check_second, *(np.array([v]) for v in bar))
+            signal = machine.on_final_check(ts, *(float(v[0]) for v in partial))
+            if signal is not None:
+                signal['index'] = i
+                signals.append(signal)
+        machine.on_1m_close(ts, *bar)
+    return signals
+
+
+def partial_bar(arrays_1s, minute_ts, check_second, open_, high, low, close):
+    """
+    1m K线截至开盘后 check_second 秒的 OHLC：有1s K线时按 [开盘, 开盘 + check_second) 内的秒线聚合，
+    否则 (或该分钟没有秒线) 用整根1m K线近似 —— 整根的高低点范围更大，"仍在区间内" 的判断偏保守
+    """
+    if arrays_1s is None or len(arrays_1s) == 0:
+        return open_, high, low, close
+    lo = np.searchsorted(arrays_1s.ts, minute_ts)
+    hi = np.searchsorted(arrays_1s.ts, minute_ts + check_second)
+    has = hi > lo
+    width = int((hi - lo).max()) if len(lo) else 0
+    if width == 0:
+        return open_, high, low, close
+    idx = lo[:, None] + np.arange(width)
+    valid = idx < hi[:, None]
+    idx = np.minimum(idx, len(arrays_1s) - 1)
+    h = np.where(valid, arrays_1s.high[idx], -np.inf).max(axis=1)
+    l = np.where(valid, arrays_1s.low[idx], np.inf).min(axis=1)
+    o = arrays_1s.open[np.minimum(lo, len(arrays_1s) - 1)]
+    c = arrays_1s.close[np.maximum(hi - 1, 0)]
+    return (np.where(has, o, open_), np.where(has, h, high), np.where(has, l, low), np.where(has, c, close))
+
+
+class K1K2Backtest:
+    """
+    K1/K2 突破回归策略的向量化历史回测
+
+    每根 15m K线收盘都会重置状态，所以各个 K1 的判断互不影响：
+    把每根 15m K线之后的 k2_bars 根1m K线排成 (K1数, k2_bars) 的矩阵，突破方向、收尾检查、
+    实体比一次性算好 (与阈值无关，只算一次)；阈值、实体比区间、时段只是对这些列的筛选，
+    所以 run() / sweep() 扫一组参数只需要数组运算。结果与逐根 replay 状态机一致
+    (K1 之后缺1m K线的周期直接跳过，实盘按收到的K线计数，缺口处两者会不同)
+    """
+
+    def __init__(self, bars_15m, arrays_1m, arrays_1s=None, k2_bars=K2_BARS, check_second=CHECK_SECOND):
+        """
+        :param bars_15m: 15m K线 (KlineArrays，或 kline_resample.resample(arrays_1m, '15m') 的结果)
+        :param arrays_1m: 1m KlineArrays
+        :param arrays_1s: 可选的1s KlineArrays，用来还原最后一根1m K线在检查时刻的价格
+        """
+        if not 2 <= k2_bars <= K1_SECONDS // 60:
+            raise ValueError(f"k2_bars 必须在 2..{K1_SECONDS // 60} 之间: {k2_bars}")
+        if len(arrays_1m) == 0:
+            raise ValueError("没有1m K线")
+        self.arrays = arrays_1m
+        self.k2_bars = k2_bars
+        self.features = self._features(_columns(bars_15m), arrays_1m, arrays_1s, k2_bars, check_second)
+
+    @staticmethod
+    def _features(k1, arr, arrays_1s, k2_bars, check_second):
+        n = len(arr)
+        minutes = k1['ts'][:, None] + K1_SECONDS + 60 * np.arange(k2_bars)
+        pos = np.searchsorted(arr.ts, minutes)
+        safe = np.minimum(pos, n - 1)
+        present = (pos < n) & (arr.ts[safe] == minutes)
+        complete = present.all(axis=1)
+        if 'complete' in k1:
+            complete &= k1['complete']
+
+        # 已收盘的前 k2_bars-1 根里第一次突破
+        watch = k2_bars - 1
+        k1_high = k1['high'][:, None]
+        k1_low = k1['low'][:, None]
+        up = arr.high[safe[:, :watch]] > k1_high
+        down = arr.low[safe[:, :watch]] < k1_low
+        hit = up | down
+        breakout = hit.any(axis=1)
+        first = hit.argmax(axis=1)
+        rows = np.arange(len(first))
+        direction = np.where(down[rows, first], DOWN, UP)
+
+        # 最后一根1m K线在检查时刻的价格
+        last = safe[:, watch]
+        o, h, l, c = partial_bar(arrays_1s, minutes[:, watch], check_second,
+                                 arr.open[last], arr.high[last], arr.low[last], arr.close[last])
+        in_range = (l >= k1['low']) & (h <= k1['high'])
+        k1_body = np.abs(k1['close'] - k1['open'])
+        body_ratio = np.where(k1_body == 0, 0.0, np.abs(c - o) / np.where(k1_body == 0, 1.0, k1_body))
+        return {
+            'k1_ts': k1['ts'],
+            'strength': k1_strength(k1['open'], k1['close']),
+            'complete': complete,
+            'breakout': breakout & complete,
+            'direction': np.where(breakout, direction, 0),
+            'breakout_bar': np.where(breakout, first, -1),
+            'in_range': in_range,
+            'body_ratio': body_ratio,
+            'index': last,
+            'ts': minutes[:, watch],
+            'side': np.where(breakout, -direction, 0),
+            'entry_price': c,
+        }
+
+    def signals(self, min_body_pct=K1_MIN_BODY_PCT, body_ratio=None, windows=None):
+        """满足条件的 K1 (features 中的行号)"""
+        f = self.features
+        mask = f['breakout'] & f['in_range'] & (f['strength'] >= min_body_pct)
+        if body_ratio is not None:
+            mask &= (f['body_ratio'] >= body_ratio[0]) & (f['body_ratio'] <= body_ratio[1])
+        if windows is not None:
+            mask &= in_windows((f['ts'] // 60) % 1440, windows)
+        return np.flatnonzero(mask)
+
+    def outcomes(self, rows, hold_bars=15, take_profit_pct=TAKE_PROFIT_PRICE_PCT):
+        """
+        信号的结果：入场后 hold_bars 根1m K线内先触及止盈 (价格变动 take_profit_pct %) 按止盈价平仓，
+        否则按第 hold_bars 根的收盘价平仓；数据末尾不够 hold_bars 根的信号不计入
+        :return: dict of arrays (ts, side, entry_price, exit_price, exit_index, take_profit, ret_pct,
+                 k1_strength, body_ratio)
+        """
+        f = self.features
+        arr = self.arrays
+        n = len(arr)
+        rows = rows[f['index'][rows] + hold_bars < n]
+        entry = f['index'][rows]
+        side = f['side'][rows]
+        price = f['entry_price'][rows]
+        target = price * (1 + side * take_profit_pct / 100)
+
+        path = entry[:, None] + 1 + np.arange(hold_bars)
+        reach = np.where(side[:, None] > 0, arr.high[path] >= target[:, None], arr.low[path] <= target[:, None])
+        take_profit = reach.any(axis=1)
+        exit_index = np.where(take_profit, path[np.arange(len(rows)), reach.argmax(axis=1)], entry + hold_bars)
+        exit_price = np.where(take_profit, target, arr.close[exit_index])
+        return {
+            'ts': f['ts'][rows],
+            'side': side,
+            'entry_price': price,
+            'exit_price': exit_price,
+            'exit_index': exit_index,
+            'take_profit': take_profit,
+            'ret_pct': side * (exit_price - price) / price * 100,
+            'k1_strength': f['strength'][rows],
+            'body_ratio': f['body_ratio'][rows],
+        }
+
+    def run(self, min_body_pct=K1_MIN_BODY_PCT, body_ratio=None, windows=None, hold_bars=15,
+            take_profit_pct=TAKE_PROFIT_PRICE_PCT):
+        """一组参数的回测：返回 (trades, summary)"""
+        trades = self.outcomes(self.signals(min_body_pct, body_ratio, windows), hold_bars, take_profit_pct)
+        return trades, summarize(trades)
+
+    def sweep(self, min_body_pcts=(K1_MIN_BODY_PCT,), body_ratios=(None,), windows=(None,), hold_bars=(15,),
+              take_profit_pct=TAKE_PROFIT_PRICE_PCT):
+        """参数网格 (笛卡尔积)，返回 [(params, summary)]"""
+        results = []
+        for pct, ratio, win, hold in itertools.product(min_body_pcts, body_ratios, windows, hold_bars):
+            _, summary = self.run(pct, ratio, win, hold, take_profit_pct)
+            results.append(({'min_body_pct': pct, 'body_ratio': ratio, 'windows': win, 'hold_bars': hold}, summary))
+        return results
+
+
+def summarize(trades):
+    """outcomes() 的交易 -> 单量、胜率、平均/合计收益率、止盈次数、多空笔数"""
+    ret = trades['ret_pct']
+    n = len(ret)
+    return {
+        'trades': n,
+        'wins': int((ret > 0).sum()),
+        'win_rate': float((ret > 0).sum() / n * 100) if n else 0.0,
+        'avg_ret_pct': float(ret.mean()) if n else 0.0,
+        'total_ret_pct': float(ret.sum()),
+        'take_profit': int(trades['take_profit'].sum()),
+        'longs': int((trades['side'] > 0).sum()),
+        'shorts': int((trades['side'] < 0).sum()),
+    }
+
+
+if __name__ == "__main__":
+    # 用法: python k1k2_backtest.py [1m K线文件] [1s K线文件]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(script_dir, 'ETHUSDT_1m_klines.json')
+    arr = KlineArrays.load(data_file)
+    if arr is None:
+        print(f"❌ 找不到数据文件 {data_file}")
+        sys.exit(1)
+    arr_1s = KlineArrays.load(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    bt = K1K2Backtest(resample(arr, '15m'), arr, arr_1s)
+    f = bt.features
+    print(f"✅ {len(arr)} 根1m K线 | {len(f['k1_ts'])} 根15m K线 | 完整的 K2 窗口 {f['complete'].sum()}"
+          + (f" | 秒线 {len(arr_1s)} 根" if arr_1s is not None else " | 无秒线 (收尾检查用整根1m K线近似)"))
+
+    _, live = bt.run()
+    print(f"\n实盘参数 (K1 >= {K1_MIN_BODY_PCT}%, 实体比/时段不限, 持仓 15 根, 止盈 {TAKE_PROFIT_PRICE_PCT}%): "
+          f"{live['trades']} 笔 | 胜率 {live['win_rate']:.2f}% | 平均 {live['avg_ret_pct']:+.4f}% | 合计 {live['total_ret_pct']:+.2f}%")
+
+    results = bt.sweep(min_body_pcts=(0.1, 0.15, 0.21, 0.25, 0.3, 0.4),
+                       body_ratios=(None, (0.5, 1.6)),
+                       windows=(None, LIVE_EFFICIENT_WINDOWS),
+                       hold_bars=(5, 15, 60))
+    print(f"\n{'='*96}")
+    print(f"{'K1阈值':<8} | {'实体比':<10} | {'时段':<6} | {'持仓':<5} | {'单量':<6} | {'胜率':<8} | {'平均收益%':<10} | {'合计%'}")
+    print(f"{'-'*96}")
+    for params, s in sorted(results, key=lambda r: r[1]['total_ret_pct'], reverse=True)[:20]:
+        ratio = '不限' if params['body_ratio'] is None else f"{params['body_ratio'][0]}~{params['body_ratio'][1]}"
+        win = '不限' if params['windows'] is None else '高效'
+        print(f"{params['min_body_pct']:<8} | {ratio:<10} | {win:<6} | {params['hold_bars']:<5} | {s['trades']:<6} | "
+              f"{s['win_rate']:<7.2f}% | {s['avg_ret_pct']:<+10.4f} | {s['total_ret_pct']:+.2f}")
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def parse_datetimes(datetimes):
+    """
+    把 'YYYY-MM-DD HH:MM:SS' 字符串批量转换为 int64 秒级时间戳
+    注意：K线文件里的 datetime 是本地时间字符串，这里按"无时区"解析，
+    所以 (ts // 3600) % 24 得到的小时与 datetime.strptime(...).hour 一致。
+    """
+    return np.array(datetimes, dtype='datetime64[s]').astype(np.int64)
+
+
+def column(klines, key, default=np.nan):
+    """从 list[dict] 中取出一列为 float 数组，缺失或 None 记为 NaN"""
+    values = np.empty(len(klines), dtype=np.float64)
+    for i, k in enumerate(klines):
+        v = k.get(key)
+        values[i] = default if v is None else v
+    return values
+
+
+class KlineArrays:
+    """K线的列式视图：每个字段一个 numpy 数组，供向量化回测使用"""
+
+    def __init__(self, ts, open_, high, low, close, volume):
+        self.ts = ts
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_klines(cls, klines):
+        """从 load_data() 得到的 list[dict] 构造"""
+        return cls(
+            parse_datetimes([k['datetime'] for k in klines]),
+            column(klines, 'open'),
+            column(klines, 'high'),
+            column(klines, 'low'),
+            column(klines, 'close'),
+            column(klines, 'volume', default=0.0),
+        )
+
+    @classmethod
+    def load(cls, data_file):
+        """直接从 JSON K线文件加载，文件不存在返回 None"""
+        if not os.path.exists(data_file):
+            return None
+        with open(data_file, 'r', encoding='utf-8') as f:
+            return cls.from_klines(json.load(f))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def slice(self, start, end):
+        """返回 [start, end) 区间的视图 (不复制数据)"""
+        return KlineArrays(self.ts[start:end], self.open[start:end], self.high[start:end],
+                           self.low[start:end], self.close[start:end], self.volume[start:end])
+
+    @property
+    def hour(self):
+        return (self.ts // 3600) % 24
+
+    @property
+    def weekday(self):
+        """星期几, 周一=0 (1970-01-01 是周四)"""
+        return (self.ts // 86400 + 3) % 7
+
+
+def data_fingerprint(arrays):
+    """K线数据指纹：时间戳和 OHLC 的 sha1，数据有任何变化 (追加/修订) 指纹都会变"""
+    h = hashlib.sha1()
+    for values in (arrays.ts, arrays.open, arrays.high, arrays.low, arrays.close):
+        h.update(np.ascontiguousarray(values).tobytes())
+    return h.hexdigest()[:16]
+
+
+def calc_avg_amp(high, low, period=20):
+    """
+    过去 period 根K线(不含当前)的平均振幅，与各脚本中
+    sum(high[j] - low[j] for j in range(i-period, i)) / period 一致；前 period 根为 0
+    """
+    amp = high - low
+    out = np.zeros(len(amp), dtype=np.float64)
+    if len(amp) > period:
+        csum = np.concatenate(([0.0], np.cumsum(amp)))
+        out[period:] = (csum[period:-1] - csum[:-period - 1]) / period
+    return out
+
+
+def _wilder_rsi(deltas, avg_gain, avg_loss, period, out, offset):
+    """Wilder 平滑的递推部分：逐个 delta 更新平均涨跌幅，RSI 写入 out[offset:]，返回末尾的 (avg_gain, avg_loss)"""
+    for k, delta in enumerate(deltas):
+        gain = delta if delta > 0 else 0
+        loss = -delta if delta < 0 else 0
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        out[offset + k] = 100 if avg_loss == 0 else 100 - (100 / (1 + avg_gain / avg_loss))
+    return avg_gain, avg_loss
+
+
+def calc_rsi(close, period=14, return_state=False):
+    """
+    Wilder RSI，与 WickSniperStrategyPro.calculate_rsi 逐值一致；前 period 根为 NaN
+    平滑是递推的，无法完全向量化，这里只在 float 上做一次紧凑循环
+    return_state=True 时同时返回末尾状态 (avg_gain, avg_loss, 最后收盘价)，供 resume_rsi 接着算新K线；
+    K线不足 period+1 根时状态为 None
+    """
+    n = len(close)
+    rsi = np.full(n, np.nan)
+    if n < period + 1:
+        return (rsi, None) if return_state else rsi
+    deltas = np.diff(close).tolist()
+    avg_gain = 0
+    avg_loss = 0
+    for i in range(period):
+        if deltas[i] > 0: avg_gain += deltas[i]
+        else: avg_loss -= deltas[i]
+    avg_gain /= period
+    avg_loss /= period
+    out = [np.nan] * n
+    out[period] = 100 if avg_loss == 0 else 100 - (100 / (1 + avg_gain / avg_loss))
+    avg_gain, avg_loss = _wilder_rsi(deltas[period:], avg_gain, avg_loss, period, out, period + 1)
+    rsi[:] = out
+    if return_state:
+        return rsi, (avg_gain, avg_loss, float(close[-1]))
+    return rsi
+
+
+def resume_rsi(close, state, period=14):
+    """
+    在 calc_rsi(..., return_state=True) 的末尾状态上继续计算追加K线的 RSI (close 只含新K线)
+    递推的运算顺序不变，结果与整段重算逐值一致
+    :return: (rsi, 新的末尾状态)
+    """
+    avg_gain, avg_loss, last_close = state
+    if len(close) == 0:
+        return np.zeros(0), state
+    deltas = np.diff(np.r_[last_close, close]).tolist()
+    out = [np.nan] * len(close)
+    avg_gain, avg_loss = _wilder_rsi(deltas, avg_gain, avg_loss, period, out, 0)
+    return np.array(out), (avg_gain, avg_loss, float(close[-1]))
+
+
+def calc_bollinger(close, period=20, std_dev=2):
+    """
+    布林带 (总体标准差)，返回 (middle, upper, lower)，前 period-1 根为 NaN
+    与 calculate_bollinger_bands 一样，BB[i] 包含 close[i]，回测时要用 BB[i-1]
+    """
+    n = len(close)
+    middle = np.full(n, np.nan)
+    upper = np.full(n, np.nan)
+    lower = np.full(n, np.nan)
+    if n < period:
+        return middle, upper, lower
+    windows = np.lib.stride_tricks.sliding_window_view(close, period)
+    ma = windows.mean(axis=1)
+    std = np.sqrt(((windows - ma[:, None]) ** 2).mean(axis=1))
+    middle[period - 1:] = ma
+    upper[period - 1:] = ma + std * std_dev
+    lower[period - 1:] = ma - std * std_dev
+    return middle, upper, lower
+
+
+def asof_index(ts, htf_ts, period, lag=1, tolerance=None):
+    """
+    每根低周期K线对应的"第 lag 根已完成的高周期K线"下标，没有则为 -1
+    ts 所在的高周期区间 [bucket, bucket + period) 还没走完，开始时间 < bucket 的K线才算已完成，
+    所以结果只用到当时已知的数据 (无未来函数)
+
+    :param ts: 低周期K线开始时间 (int64，与 htf_ts、period 同一单位)
+    :param htf_ts: 高周期K线开始时间，升序
+    :param lag: 1 = 最近一根已完成的，2 = 再往前一根，依此类推 (按K线数，不按时间)
+    :param tolerance: 最近一根已完成的K线最多允许比 bucket - period 早多少 (数据缺口)，
+                      0 = 必须正好是上一个区间，None = 不限
+    """
+    if lag < 1:
+        raise ValueError("lag 必须 >= 1 (lag=0 是尚未走完的当前K线，会引入未来数据)")
+    ts = np.asarray(ts, dtype=np.int64)
+    htf_ts = np.asarray(htf_ts, dtype=np.int64)
+    if len(htf_ts) == 0:
+        return np.full(len(ts), -1, dtype=np.int64)
+    bucket = ts - ts % period
+    completed = np.searchsorted(htf_ts, bucket, side='left')
+    idx = completed - lag
+    if tolerance is not None:
+        latest = htf_ts[np.maximum(completed - 1, 0)]
+        stale = (completed == 0) | (latest < bucket - period - tolerance)
+        idx[stale] = -1
+    idx[idx < 0] = -1
+    return idx
+
+
+def asof_join(ts, htf_ts, columns, period, lag=1, tolerance=None):
+    """
+    as-of join：把高周期K线的字段 (close、MA20、死鱼盘标记 ...) 按 asof_index 对齐到每根低周期K线上，
+    得到与 ts 等长的普通数组，多周期回测的过滤条件就变成逐列运算
+    没有对应K线的位置：浮点列为 NaN，布尔列为 False，其余为 0
+
+    :param columns: dict 列名 -> 与 htf_ts 等长的数组
+    :return: dict 列名 -> 数组，另加 'index' (高周期K线下标，-1 表示没有)
+    """
+    idx = asof_index(ts, htf_ts, period, lag, tolerance)
+    missing = idx < 0
+    safe = np.maximum(idx, 0)
+    out = {'index': idx}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if len(values) == 0:
+            values = np.zeros(1, dtype=values.dtype)
+        joined = values[safe]
+        if joined.dtype.kind == 'f':
+            joined[missing] = np.nan
+        elif joined.dtype == bool:
+            joined[missing] = False
+        else:
+            joined[missing] = 0
+        out[name] = joined
+    return out
@@ -0,0 +1,174 @@
+import os
+import sys
+import weakref
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import data_fingerprint
+
+# 周期名 -> 秒
+TIMEFRAMES = {
+    '1m': 60,
+    '3m': 180,
+    '5m': 300,
+    '10m': 600,
+    '15m': 900,
+    '1h': 3600,
+    '4h': 14400,
+}
+DEFAULT_TIMEFRAMES = ('3m', '5m', '10m', '15m', '1h', '4h')
+
+# KlineArrays -> {(周期秒数, 基础周期秒数): bars}，K线数组释放后自动清掉
+_MEMO = weakref.WeakKeyDictionary()
+
+
+def timeframe_seconds(timeframe):
+    """'10m' / '1h' / 600 -> 秒数"""
+    if isinstance(timeframe, (int, np.integer)):
+        seconds = int(timeframe)
+    elif timeframe in TIMEFRAMES:
+        seconds = TIMEFRAMES[timeframe]
+    else:
+        raise ValueError(f"未知周期 {timeframe!r}，可选: {', '.join(TIMEFRAMES)} 或秒数")
+    if seconds <= 0:
+        raise ValueError(f"周期必须为正数: {timeframe!r}")
+    return seconds
+
+
+def _aggregate(bars, period):
+    """按 ts - ts % period 分桶聚合一组已排序的K线 (bars 可以是1m，也可以是更细的已聚合周期)"""
+    ts = bars['ts']
+    bucket = ts - ts % period
+    if len(ts) == 0:
+        return {key: values[:0] for key, values in bars.items() if key not in ('complete', 'gap')}
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return {
+        'ts': bucket[starts],
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': bars['close'][ends],
+        'volume': bars['volume'][starts],
+        'count': np.add.reduceat(bars['count'], starts),
+        'first': bars['first'][starts],
+    }
+
+
+def _sequential_sum(values, starts, counts):
+    """
+    分段求和，按段内顺序逐个累加 (与逐根 += 的结果逐位相同；np.add.reduceat 会分组累加，末位可能不同)
+    各段补零排成矩阵后按列累加，循环次数只等于最长一段的长度
+    """
+    if not len(starts):
+        return values[:0].astype(np.float64)
+    rows = np.repeat(np.arange(len(starts)), counts)
+    padded = np.zeros((len(starts), int(counts.max())))
+    padded[rows, np.arange(len(values)) - np.repeat(starts, counts)] = values
+    total = padded[:, 0].copy()
+    for j in range(1, padded.shape[1]):
+        total += padded[:, j]
+    return total
+
+
+def _finish(bars, period, base):
+    """补上缺口标记：complete = 桶内基础K线数量齐全，gap = 与上一根之间有整桶缺失"""
+    bars = dict(bars)
+    bars['complete'] = bars['count'] == period // base
+    bars['gap'] = np.r_[False, np.diff(bars['ts']) > period]
+    return bars
+
+
+def _base_bars(arrays):
+    ts = np.asarray(arrays.ts, dtype=np.int64)
+    if len(ts) > 1 and np.any(ts[1:] <= ts[:-1]):
+        raise ValueError("K线时间戳必须严格递增 (先排序去重再重采样)")
+    return {'ts': ts, 'open': arrays.open, 'high': arrays.high, 'low': arrays.low, 'close': arrays.close,
+            'volume': arrays.volume, 'count': np.ones(len(ts), dtype=np.int64),
+            'first': np.arange(len(ts), dtype=np.int64)}
+
+
+def resample(arrays, timeframe, base=60):
+    """
+    把基础周期 (默认1m) 的 KlineArrays 聚合成更大周期的 OHLCV，桶按 ts - ts % 周期 对齐
+    没有任何K线的桶不输出 (与 pandas resample 后 dropna 一致)
+
+    :return: dict 列名 -> 数组: ts (桶开始时间), open, high, low, close, volume,
+             count (桶内K线数), first (桶内第一根K线在输入中的下标),
+             complete (count 是否等于 周期 / base，缺K线的桶为 False), gap (前面是否缺了整桶)
+    """
+    return resample_timeframes(arrays, (timeframe,), base)[timeframe]
+
+
+def resample_timeframes(arrays, timeframes=DEFAULT_TIMEFRAMES, base=60, cache=None):
+    """
+    一次生成多个周期：周期从小到大，每个周期从已生成的、能整除它的最大周期再聚合
+    (10m 由 5m 聚合，1h 由 15m 聚合 ...)，所以总开销接近只扫一遍1m数据
+    结果按 K线数组对象缓存在内存里，同一份数据再要同样的周期直接返回；
+    传入 cache (result_cache.ResultCache) 时另按数据指纹存盘，换进程也能复用
+    (内存缓存按对象区分，所以重采样过的 KlineArrays 不要再原地修改)
+
+    :return: {周期: resample() 的结果 dict}，键与传入的 timeframes 相同
+    """
+    if base <= 0:
+        raise ValueError(f"基础周期必须为正数: {base}")
+    periods = {tf: timeframe_seconds(tf) for tf in timeframes}
+    for tf, period in periods.items():
+        if period % base:
+            raise ValueError(f"周期 {tf!r} ({period}s) 不是基础周期 {base}s 的整数倍")
+
+    try:
+        memo = _MEMO.setdefault(arrays, {})
+    except TypeError:
+        memo = {}
+    missing = sorted({p for p in periods.values() if (p, base) not in memo})
+
+    if missing and cache is not None:
+        from result_cache import cache_key, code_version
+        key = cache_key('resample', {'periods': missing, 'base': base}, data_fingerprint(arrays),
+                        code_version(resample_timeframes))
+        stored = cache.get(key)
+        if stored is None:
+            stored = _resample_periods(arrays, missing, base, memo)
+            cache.put(key, stored)
+        for period, bars in stored.items():
+            memo[(period, base)] = bars
+    elif missing:
+        _resample_periods(arrays, missing, base, memo)
+
+    return {tf: memo[(period, base)] for tf, period in periods.items()}
+
+
+def _resample_periods(arrays, periods, base, memo):
+    """按从小到大的顺序逐级聚合，结果写入 memo，返回 {周期: bars}"""
+    levels = {base: _base_bars(arrays)}
+    for (period, b), bars in memo.items():
+        if b == base:
+            levels[period] = bars
+    out = {}
+    for period in periods:
+        source = max(p for p in levels if period % p == 0 and p <= period)
+        if source == period:
+            bars = levels[source]
+        else:
+            bars = _aggregate(levels[source], period)
+            # 成交量总是直接从基础K线顺序求和：结果与同时生成了哪些中间周期无关
+            bars['volume'] = _sequential_sum(levels[base]['volume'], bars['first'], bars['count'])
+        bars = _finish(bars, period, base)
+        levels[period] = bars
+        memo[(period, base)] = bars
+        out[period] = bars
+    return out
+
+
+def to_kline_dicts(bars):
+    """resample() 的结果 -> load_data() 同样格式的 list[dict] ('datetime' 字符串 + OHLCV + count)"""
+    datetimes = np.char.replace(bars['ts'].astype('datetime64[s]').astype(str), 'T', ' ').tolist()
+    return [
+        {'datetime': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v, 'count': n}
+        for d, o, h, l, c, v, n in zip(datetimes, bars['open'].tolist(), bars['high'].tolist(),
+                                       bars['low'].tolist(), bars['close'].tolist(),
+                                       bars['volume'].tolist(), bars['count'].tolist())
+    ]
@@ -0,0 +1,127 @@
+import json
+import os
+import queue
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays
+from incremental_backtest import IncrementalBacktest, StreamingSimulator, rsi_tier_candidates
+
+READ_BYTES = 1 << 20
+
+
+def iter_kline_dicts(data_file, chunk_bars=100_000, read_bytes=READ_BYTES):
+    """
+    流式读取 JSON K线文件 (fetch 脚本写出的 [{...}, {...}] 数组，有无缩进均可)，
+    每次产出 chunk_bars 根K线的 list[dict]；内存中只有当前块和一小段未解析的文本
+    """
+    decoder = json.JSONDecoder()
+    chunk = []
+    with open(data_file, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # 跳过空白和分隔符，直到下一个元素的开头
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ',' or (not started and buf[pos] == '[')):
+                started = started or buf[pos] == '['
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                break
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    if buf[pos:].strip():
+                        raise ValueError(f"{data_file} 不是完整的 JSON 数组 (结尾处: {buf[pos:pos + 50]!r})")
+                    break
+                # 元素被块边界截断，丢掉已解析的部分再读一块
+                more = f.read(read_bytes)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            chunk.append(obj)
+            pos = end
+            if len(chunk) >= chunk_bars:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_kline_arrays(data_file, chunk_bars=100_000):
+    """按块产出 KlineArrays (列式)，见 iter_kline_dicts"""
+    for chunk in iter_kline_dicts(data_file, chunk_bars):
+        yield KlineArrays.from_klines(chunk)
+
+
+def prefetch(iterable, depth=2):
+    """
+    在后台线程里提前取 depth 块：读文件/解析下一块与当前块的回测计算重叠
+    后台线程里的异常会在取到那一块时重新抛出
+    """
+    q = queue.Queue(maxsize=depth)
+    done = object()
+
+    def worker():
+        try:
+            for item in iterable:
+                q.put((True, item))
+        except BaseException as e:
+            q.put((False, e))
+        finally:
+            q.put((True, done))
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        ok, item = q.get()
+        if not ok:
+            raise item
+        if item is done:
+            return
+        yield item
+
+
+def stream_backtest(data_file, backtest, chunk_bars=100_000, depth=2, on_chunk=None):
+    """
+    流式回测：按块读K线，依次交给 IncrementalBacktest.append，指标递推状态和风控状态跨块延续
+    结果与一次性加载全部K线完全一致，内存只与块大小和交易笔数有关
+
+    :param backtest: IncrementalBacktest (新建的，或从检查点恢复的 —— 已处理过的K线会跳过)
+    :param on_chunk: 可选回调 on_chunk(backtest, added)，每块处理完调用一次
+    :return: backtest
+    """
+    skip = backtest.n
+    for arrays in prefetch(iter_kline_arrays(data_file, chunk_bars), depth):
+        if skip >= len(arrays):
+            skip -= len(arrays)
+            continue
+        if skip:
+            arrays = arrays.slice(skip, len(arrays))
+            skip = 0
+        added = backtest.append(arrays)
+        if on_chunk:
+            on_chunk(backtest, added)
+    return backtest
+
+
+if __name__ == "__main__":
+    # 用法: python kline_stream.py [K线文件] [每块K线数]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(script_dir, 'ETHUSDT_1m_klines.json')
+    chunk_bars = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    if not os.path.exists(data_file):
+        print(f"❌ 找不到数据文件 {data_file}")
+        sys.exit(1)
+
+    # 与 DailyAnalysis.run_analysis(stop_loss_limit=-45) 同样的策略和口径
+    bt = IncrementalBacktest(rsi_tier_candidates, StreamingSimulator(10, None, -45))
+    stream_backtest(data_file, bt, chunk_bars,
+                    on_chunk=lambda b, added: print(f"已处理 {b.n} 根K线, 新增信号 {len(added.get('index', []))}"))
+
+    from daily_analysis import DailyAnalysis
+    DailyAnalysis(data_file=data_file).print_summary(bt.daily('accepted'), bt.daily('keep'), -45)
@@ -0,0 +1,239 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_avg_amp, calc_rsi, calc_bollinger
+from signal_table import build_signal_table, take
+
+
+def streak_lengths(is_win, losses=True):
+    """
+    按顺序返回每一段连败 (losses=False 时为连胜) 的长度
+    与 asian_sniper 里逐笔累加 current_streak 的结果一致
+    """
+    hit = ~np.asarray(is_win, dtype=bool) if losses else np.asarray(is_win, dtype=bool)
+    edges = np.diff(np.r_[0, hit.astype(np.int8), 0])
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def max_streaks(is_win, losses=True):
+    """二维 (路径 x 交易) 输赢矩阵，每条路径的最长连败 (或连胜)"""
+    hit = ~is_win if losses else is_win
+    t = np.arange(hit.shape[1], dtype=np.int32)
+    # 最近一次"中断"的位置；连败长度 = 当前位置 - 中断位置
+    last_break = np.maximum.accumulate(np.where(hit, np.int32(-1), t), axis=1)
+    return np.where(hit, t - last_break, 0).max(axis=1)
+
+
+def block_bootstrap_indices(n, n_paths, length, block, rng):
+    """
+    循环块自助法：每条路径由若干段长度为 block 的连续交易拼接而成 (越过末尾绕回开头)，
+    块内的连败/连胜结构得以保留
+    :return: int32 下标矩阵 (n_paths, length)
+    """
+    n_blocks = -(-length // block)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks), dtype=np.int64)
+    idx = (starts[:, :, None] + np.arange(block)) % n
+    return idx.reshape(n_paths, n_blocks * block)[:, :length].astype(np.int32)
+
+
+def _percentiles(values, qs=(5, 25, 50, 75, 95)):
+    return {q: float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+class MonteCarlo:
+    """
+    交易序列的蒙特卡洛：对观测到的逐笔输赢做块自助重抽样，一次生成成千上万条路径 (路径 x 交易 的矩阵)，
+    连败分布、马丁爆仓概率、日止损触发率都在整块矩阵上向量化计算，按 chunk 条路径分批以控制内存
+
+    :param is_win: 观测到的逐笔输赢 (按时间顺序)
+    :param stake: 逐笔下注额 (用于日止损)，默认每笔 10U
+    :param day: 逐笔所属交易日 id，用于抽样每天的交易笔数；None 时不能做日止损分析
+    :param block: 块长度 (笔)，应大于典型连败长度
+    :param length: 每条路径的交易笔数，默认与观测序列等长
+    """
+
+    def __init__(self, is_win, stake=None, day=None, payout=0.8, block=10, length=None, seed=0, chunk=20000):
+        self.is_win = np.asarray(is_win, dtype=bool)
+        if len(self.is_win) == 0:
+            raise ValueError("没有交易可供重抽样")
+        self.stake = np.full(len(self.is_win), 10.0) if stake is None else np.asarray(stake, dtype=np.float64)
+        self.pnl = np.where(self.is_win, self.stake * payout, -self.stake)
+        self.day_sizes = None
+        if day is not None:
+            _, self.day_sizes = np.unique(np.asarray(day), return_counts=True)
+        self.payout = payout
+        self.block = block
+        self.length = length or len(self.is_win)
+        self.seed = seed
+        self.chunk = chunk
+
+    def _chunks(self, n_paths):
+        """逐批产出 (rng, 下标矩阵)，同一个 seed 每次得到同一批路径"""
+        rng = np.random.default_rng(self.seed)
+        done = 0
+        while done < n_paths:
+            size = min(self.chunk, n_paths - done)
+            yield rng, block_bootstrap_indices(len(self.is_win), size, self.length, self.block, rng)
+            done += size
+
+    def streaks(self, n_paths=100000, max_k=10):
+        """
+        最长连败的分布
+        :return: dict max_streak (每条路径), p_at_least {k: P(最长连败 >= k)}, percentiles
+        """
+        out = np.concatenate([max_streaks(self.is_win[idx]) for _, idx in self._chunks(n_paths)])
+        counts = np.bincount(out, minlength=max_k + 2)
+        at_least = counts[::-1].cumsum()[::-1] / n_paths
+        return {
+            'max_streak': out,
+            'p_at_least': {k: float(at_least[k]) for k in range(1, max_k + 1)},
+            'percentiles': _percentiles(out),
+        }
+
+    def martingale(self, n_paths=100000, base_bet=5.0, target_profit=4.0, max_steps=5, bet_cap=250.0,
+                   initial=1000.0):
+        """
+        马丁注码在每条路径上的结果，规则与 signal_table.martingale_stake 一致：
+        输了下一笔下注 (本轮累计亏损 + 目标利润) / 赔率，不超过 bet_cap，赢了或连败 max_steps 笔后重置；
+        余额 <= 0 视为爆仓，之后不再下注 (与 equity_stats 一致)
+        时间方向只能顺序推进，但每一步都对所有路径同时计算
+        :return: dict ruin_prob, final (每条路径), final_percentiles, max_drawdown_percentiles,
+                 lost_cycles_mean (每条路径平均有几轮连败 max_steps 笔)
+        """
+        finals, drawdowns, busts, cycles = [], [], [], []
+        for _, idx in self._chunks(n_paths):
+            win = self.is_win[idx]
+            size = len(win)
+            step = np.zeros(size, dtype=np.int64)
+            round_loss = np.zeros(size)
+            balance = np.full(size, float(initial))
+            peak = balance.copy()
+            drawdown = np.zeros(size)
+            alive = np.ones(size, dtype=bool)
+            lost_cycles = np.zeros(size, dtype=np.int64)
+            for t in range(win.shape[1]):
+                w = win[:, t]
+                bet = np.where(step == 0, base_bet,
+                               np.minimum(np.round((round_loss + target_profit) / self.payout, 2), bet_cap))
+                balance += np.where(w, bet * self.payout, -bet) * alive
+                np.maximum(peak, balance, out=peak)
+                np.maximum(drawdown, peak - balance, out=drawdown)
+                alive &= balance > 0
+                round_loss = np.where(w, 0.0, round_loss + bet)
+                step = np.where(w, 0, step + 1)
+                reset = step >= max_steps
+                lost_cycles += reset & alive
+                step[reset] = 0
+                round_loss[reset] = 0.0
+            finals.append(balance)
+            drawdowns.append(drawdown)
+            busts.append(~alive)
+            cycles.append(lost_cycles)
+        final = np.concatenate(finals)
+        return {
+            'ruin_prob': float(np.concatenate(busts).mean()),
+            'final': final,
+            'final_percentiles': _percentiles(final),
+            'max_drawdown_percentiles': _percentiles(np.concatenate(drawdowns)),
+            'lost_cycles_mean': float(np.concatenate(cycles).mean()),
+        }
+
+    def _day_labels(self, rng, n_paths):
+        """每条路径按观测到的"每天交易笔数"分布切分成若干天，返回每笔交易在本路径里的天序号"""
+        length = self.length
+        max_days = length // max(self.day_sizes.min(), 1) + 1
+        sizes = rng.choice(self.day_sizes, size=(n_paths, max_days))
+        bounds = np.cumsum(sizes, axis=1)
+        starts = np.zeros((n_paths, length + 1), dtype=np.int32)
+        rows = np.repeat(np.arange(n_paths), max_days)
+        cols = np.minimum(bounds, length).ravel()
+        np.add.at(starts, (rows, cols), 1)
+        return np.cumsum(starts[:, :length], axis=1)
+
+    def daily_stop(self, n_paths=100000, stop_levels=(-30, -45, -60, -90)):
+        """
+        日止损触发率：重抽样的交易按观测到的每天笔数切成交易日，在每个交易日内累计盈亏，
+        累计 <= 止损线即停止当天剩余交易
+        :return: {止损线: {'hit_rate': 触发止损的天数占比, 'day_pnl_mean', 'path_profit_percentiles',
+                          'path_profit_mean'}}，另含 None 键为不设止损
+        """
+        if self.day_sizes is None:
+            raise ValueError("需要传入 day 才能做日止损分析")
+        levels = list(stop_levels)
+        stats = {level: {'hit': 0, 'days': 0, 'profit': []} for level in levels + [None]}
+        for rng, idx in self._chunks(n_paths):
+            pnl = self.pnl[idx]
+            size, length = pnl.shape
+            day = self._day_labels(rng, size)
+            t = np.arange(length)
+            first = np.concatenate([np.ones((size, 1), dtype=bool), day[:, 1:] != day[:, :-1]], axis=1)
+            start = np.maximum.accumulate(np.where(first, t, 0), axis=1)
+            csum = np.cumsum(pnl, axis=1)
+            day_cum = csum - np.take_along_axis(csum - pnl, start, axis=1)
+            n_days = int(first.sum())
+
+            stats[None]['days'] += n_days
+            stats[None]['profit'].append(pnl.sum(axis=1))
+            for level in levels:
+                hit = day_cum <= level
+                # 当天之前的交易里是否已经触发过止损 (触发那一笔本身仍计入)
+                last_hit = np.maximum.accumulate(np.where(hit, t, -1), axis=1)
+                stopped_before = np.concatenate([np.full((size, 1), -1), last_hit[:, :-1]], axis=1) >= start
+                kept = np.where(stopped_before, 0.0, pnl)
+                stats[level]['hit'] += int((hit & ~stopped_before).sum())
+                stats[level]['days'] += n_days
+                stats[level]['profit'].append(kept.sum(axis=1))
+
+        out = {}
+        for level, s in stats.items():
+            profit = np.concatenate(s['profit'])
+            out[level] = {
+                'hit_rate': s['hit'] / s['days'] if s['days'] else 0.0,
+                'day_pnl_mean': float(profit.sum() / s['days']) if s['days'] else 0.0,
+                'path_profit_mean': float(profit.mean()),
+                'path_profit_percentiles': _percentiles(profit),
+            }
+        return out
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    # 亚盘狙击的信号口径：UTC 0-8点，RSI<25/>75，触碰布林带，触碰价入场，i+10 开盘价结算
+    _, upper, lower = calc_bollinger(arr.close, 20, 2)
+    table = build_signal_table(arr, calc_rsi(arr.close, 14), calc_avg_amp(arr.high, arr.low, 20), lower, upper,
+                               hours=(0, 8), long_below=25, short_above=75, giant_floor=0.0, entry='band',
+                               settle='open')
+    table = take(table, table['touch'])
+    n_paths = 100000
+    mc = MonteCarlo(table['is_win'], day=table['day'])
+    observed = streak_lengths(table['is_win'])
+    print(f"✅ 观测交易 {len(mc.is_win)} 笔 | 胜率 {mc.is_win.mean() * 100:.2f}% | 最长连败 {observed.max() if len(observed) else 0} 笔")
+    print(f"块自助重抽样: {n_paths} 条路径 x {mc.length} 笔 (块长 {mc.block})")
+
+    print("\n📊 最长连败分布:")
+    s = mc.streaks(n_paths)
+    for k in range(3, 11):
+        print(f"P(最长连败 >= {k:>2} 笔) = {s['p_at_least'][k] * 100:6.2f}%")
+    print("分位数: " + ' | '.join(f"P{q}={v:.0f}" for q, v in s['percentiles'].items()))
+
+    print("\n🎲 马丁 (5U起步, 目标赚4U, 5连败止损, 单笔上限250U, 本金1000U):")
+    m = mc.martingale(n_paths)
+    print(f"爆仓概率: {m['ruin_prob'] * 100:.3f}% | 平均每条路径连败止损 {m['lost_cycles_mean']:.2f} 轮")
+    print("最终余额: " + ' | '.join(f"P{q}={v:.0f}" for q, v in m['final_percentiles'].items()))
+    print("最大回撤: " + ' | '.join(f"P{q}={v:.0f}" for q, v in m['max_drawdown_percentiles'].items()))
+
+    print("\n🛑 日止损 (每笔10U):")
+    print(f"{'止损线':<8} | {'触发率':<8} | {'日均盈亏':<10} | {'路径利润均值':<12} | {'P5':<8} | {'P95'}")
+    for level, d in mc.daily_stop(n_paths).items():
+        name = '不设' if level is None else f"{level}U"
+        p = d['path_profit_percentiles']
+        print(f"{name:<8} | {d['hit_rate'] * 100:6.2f}% | {d['day_pnl_mean']:+9.2f} | {d['path_profit_mean']:+11.2f} | {p[5]:+8.0f} | {p[95]:+.0f}")
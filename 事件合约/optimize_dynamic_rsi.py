@@ -14,8 +14,49 @@ except ImportError:
     sys.path.append(os.path.join(os.getcwd(), '事件合约'))
     from wick_sniper_pro import WickSniperStrategyPro
 
+from kline_arrays import calc_avg_amp
+from optimize_rsi import rsi_sweep_arrays, evaluate_rsi_params
+from sweep_runner import SweepRunner
+
+
+def evaluate_dynamic_scenario(arrays, scenario):
+    """
+    One scenario; same rules as DynamicRSIOptimizer.run_backtest.
+    The regime (quiet / normal / volatile) is picked per bar from the 20-bar avg amplitude,
+    then the per-bar thresholds go through the static RSI evaluator.
+    """
+    if not scenario['dynamic']:
+        return evaluate_rsi_params(arrays, scenario['params'])
+
+    avg_amp = calc_avg_amp(arrays['high'], arrays['low'], 20)
+    quiet = avg_amp < scenario['low_vol_threshold']
+    volatile = ~quiet & (avg_amp > scenario['high_vol_threshold'])
+    thresholds = tuple(
+        np.where(quiet, q, np.where(volatile, v, m))
+        for q, m, v in zip(scenario['quiet_params'], scenario['normal_params'], scenario['volatile_params'])
+    )
+    return evaluate_rsi_params(arrays, thresholds)
+
+
+def evaluate_quiet_regime(arrays, params):
+    """
+    Dynamic C with a searchable quiet regime: params = (avg amp quantile in %, quiet long entry, quiet short entry).
+    Extreme levels sit 5 points beyond the entries, as in the hand-written scenarios.
+    """
+    quantile, quiet_long, quiet_short = params
+    amps = calc_avg_amp(arrays['high'], arrays['low'], 20)[20:]
+    return evaluate_dynamic_scenario(arrays, {
+        'dynamic': True,
+        'low_vol_threshold': np.percentile(amps, quantile),
+        'high_vol_threshold': 999,
+        'quiet_params': (quiet_long, quiet_long - 5, quiet_short, quiet_short + 5),
+        'normal_params': (25, 20, 75, 80),
+        'volatile_params': (25, 20, 75, 80)
+    })
+
+
 class DynamicRSIOptimizer(WickSniperStrategyPro):
-    def run_optimization(self):
+    def run_optimization(self, processes=None):
         print(f"\n{'='*50}")
         print(f"Running DYNAMIC RSI Optimization")
         print(f"Stop Loss: -45U | Max Trades: 5 | Time: 09:00-20:00")
@@ -32,14 +73,8 @@ class DynamicRSIOptimizer(WickSniperStrategyPro):
             self.calculate_bollinger_bands(20, 2)
 
         # 1. Analyze Volatility (Avg Amp) Distribution to set thresholds
-        amps = []
-        for i in range(20, len(self.klines_1m)):
-            # Calculate avg_amp for this candle (same as strategy)
-            sum_amp = 0
-            for j in range(i-20, i):
-                sum_amp += (self.klines_1m[j]['high'] - self.klines_1m[j]['low'])
-            avg_amp = sum_amp / 20
-            amps.append(avg_amp)
+        arrays = rsi_sweep_arrays(self.klines_1m)
+        amps = calc_avg_amp(arrays['high'], arrays['low'], 20)[20:]
         
         p25 = np.percentile(amps, 25)
         p50 = np.percentile(amps, 50)
@@ -82,11 +117,13 @@ class DynamicRSIOptimizer(WickSniperStrategyPro):
             }
         ]
         
+        # Scenarios run in worker processes; the kline columns live in shared memory once.
+        def on_result(scen, res):
+            print(f"Done: {scen['name']} -> {res['profit']:.2f}")
+
         results = []
 
-        for scen in scenarios:
-            print(f"Testing: {scen['name']} ...")
-            res = self.run_backtest(scen)
+        for scen, res in zip(scenarios, SweepRunner(arrays, evaluate_dynamic_scenario, processes).run_all(scenarios, on_result)):
             results.append({
                 'name': scen['name'],
                 'profit': res['profit'],
@@ -15,6 +15,12 @@ except ImportError:
     sys.path.append(os.path.join(os.getcwd(), '事件合约'))
     from wick_sniper_pro import WickSniperStrategyPro
 
+from stage_profiler import timed, run_profiled
+from kline_arrays import KlineArrays, column, asof_join
+from kline_resample import resample
+
+PERIOD_10M_MS = 600000
+
 class MtfOptimizer(WickSniperStrategyPro):
     def __init__(self):
         # Fix path
@@ -25,8 +31,9 @@ class MtfOptimizer(WickSniperStrategyPro):
                 data_path = possible_path
         
         super().__init__(data_file=data_path)
-        self.klines_10m = {} # timestamp -> {close, ma20}
+        self.klines_10m = {} # columns: time (bin start, ms), close, ma20
 
+    @timed()
     def preprocess_data(self):
         """Ensure data has 'time' field in ms timestamp"""
         if not self.klines_1m: return
@@ -38,6 +45,7 @@ class MtfOptimizer(WickSniperStrategyPro):
                 dt = datetime.strptime(k['datetime'], '%Y-%m-%d %H:%M:%S')
                 k['time'] = int(dt.timestamp() * 1000)
 
+    @timed()
     def resample_10m(self):
         """Resample 1m klines to 10m and calculate MA20"""
         print("⏳ Resampling 1m data to 10m timeframe...")
@@ -45,47 +53,38 @@ class MtfOptimizer(WickSniperStrategyPro):
         # Ensure data is preprocessed
         self.preprocess_data()
         
-        # Convert to DataFrame for easier resampling
-        df = pd.DataFrame(self.klines_1m)
-        
-        # Ensure time column is datetime object for resampling
-        if 'time' in df.columns:
-            df['datetime_obj'] = pd.to_datetime(df['time'], unit='ms')
-        else:
-            # Fallback
-            df['datetime_obj'] = pd.to_datetime(df['datetime'])
-            
-        df.set_index('datetime_obj', inplace=True)
-        
-        # Resample logic
-        # Open: first 1m open
-        # High: max of 1m highs
-        # Low: min of 1m lows
-        # Close: last 1m close
-        df_10m = df.resample('10min').agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum'
-        })
-        
-        # Drop NaNs (if any gaps)
-        df_10m.dropna(inplace=True)
-        
+        # Bucket on the epoch timestamps (seconds); bins without any 1m bar are skipped
+        klines = self.klines_1m
+        times = np.array([k['time'] for k in klines], dtype=np.int64)
+        arrays = KlineArrays(times // 1000, column(klines, 'open'), column(klines, 'high'),
+                             column(klines, 'low'), column(klines, 'close'), column(klines, 'volume', default=0.0))
+        bars = resample(arrays, '10m')
+
         # Calculate MA20 on 10m
-        df_10m['ma20'] = df_10m['close'].rolling(window=20).mean()
-        
-        # Convert back to dict for fast lookup: timestamp(ms) -> data
-        for index, row in df_10m.iterrows():
-            # index is the start time of the bin (e.g. 09:00:00)
-            ts = int(index.timestamp() * 1000)
-            self.klines_10m[ts] = {
-                'close': row['close'],
-                'ma20': row['ma20']
-            }
-            
-        print(f"✅ Generated {len(self.klines_10m)} 10m candles.")
+        ma20 = pd.Series(bars['close']).rolling(window=20).mean().to_numpy()
+
+        # Keep as columns for the as-of join; time is the start of the bin in ms (e.g. 09:00:00)
+        self.klines_10m = {
+            'time': bars['ts'] * 1000,
+            'close': bars['close'],
+            'ma20': ma20,
+            'complete': bars['complete'],
+        }
+
+        print(f"✅ Generated {len(self.klines_10m['time'])} 10m candles.")
+
+    def trend_10m(self, times_ms):
+        """
+        Trend of the LAST COMPLETED 10m candle for every 1m bar, as a column:
+        1 = close above MA20, -1 = at/below MA20, 0 = unknown (MA20 not ready, or the previous
+        10m bin is missing from the data).
+        """
+        joined = asof_join(times_ms, self.klines_10m['time'],
+                           {'close': self.klines_10m['close'], 'ma20': self.klines_10m['ma20']},
+                           PERIOD_10M_MS, lag=1, tolerance=0)
+        trend = np.where(joined['close'] > joined['ma20'], 1, -1)
+        trend[np.isnan(joined['ma20'])] = 0
+        return trend
 
     def get_trend_10m(self, current_time_ms):
         """
@@ -94,24 +93,8 @@ class MtfOptimizer(WickSniperStrategyPro):
         # Current time is e.g. 09:13.
         # The current 10m candle started at 09:10.
         # The last COMPLETED 10m candle started at 09:00.
-        
-        # 1. Find start of current 10m period
-        current_period_start = (current_time_ms // 600000) * 600000
-        
-        # 2. Look back 1 period (10 mins ago)
-        last_period_start = current_period_start - 600000
-        
-        if last_period_start in self.klines_10m:
-            k = self.klines_10m[last_period_start]
-            if pd.isna(k['ma20']):
-                return 'NEUTRAL'
-            
-            if k['close'] > k['ma20']:
-                return 'UP'
-            else:
-                return 'DOWN'
-        
-        return 'NEUTRAL'
+        trend = self.trend_10m([current_time_ms])[0]
+        return {1: 'UP', -1: 'DOWN'}.get(int(trend), 'NEUTRAL')
 
     def check_exits(self, current_time, current_price):
         for trade in self.active_trades:
@@ -138,6 +121,7 @@ class MtfOptimizer(WickSniperStrategyPro):
                 self.daily_pnl += payout
                 self.trade_history.append(trade)
 
+    @timed('signal loop')
     def run_backtest_mtf(self, use_filter=False):
         """
         Run backtest with optional MTF filter.
@@ -161,6 +145,10 @@ class MtfOptimizer(WickSniperStrategyPro):
         if 'rsi' not in self.klines_1m[-1]:
             self.calculate_rsi(14)
             self.calculate_bollinger_bands(20, 2)
+
+        # MTF trend joined onto the 1m bars once, instead of a 10m lookup per bar
+        if use_filter:
+            trend = self.trend_10m([k['time'] for k in self.klines_1m])
             
         for i in range(50, len(self.klines_1m)):
             k = self.klines_1m[i]
@@ -203,10 +191,9 @@ class MtfOptimizer(WickSniperStrategyPro):
                 
             # === MTF FILTER ===
             if use_filter:
-                trend = self.get_trend_10m(current_time)
-                if trend == 'UP' and signal == 'SHORT':
+                if trend[i] > 0 and signal == 'SHORT':
                     continue # Don't short in uptrend
-                if trend == 'DOWN' and signal == 'LONG':
+                if trend[i] < 0 and signal == 'LONG':
                     continue # Don't long in downtrend
             # ==================
             
@@ -236,6 +223,7 @@ class MtfOptimizer(WickSniperStrategyPro):
             'trades': total
         }
 
+    @timed()
     def run_optimization(self):
         print(f"\n{'='*50}")
         print(f"Running MTF (10m Trend Filter) Optimization")
@@ -264,5 +252,6 @@ class MtfOptimizer(WickSniperStrategyPro):
         print(f"{'='*80}")
 
 if __name__ == "__main__":
+    # python optimize_mtf.py [--profile[=stacks.folded]]
     opt = MtfOptimizer()
-    opt.run_optimization()
+    run_profiled(opt.run_optimization)
@@ -1,7 +1,7 @@
 import json
 import os
-from datetime import datetime, timedelta
 import sys
+import numpy as np
 
 # Add current directory to path to import wick_sniper_pro
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -13,8 +13,91 @@ except ImportError:
     sys.path.append(os.path.join(os.getcwd(), '事件合约'))
     from wick_sniper_pro import WickSniperStrategyPro
 
+from kline_arrays import KlineArrays, column, calc_avg_amp
+from trading_day import trading_day_ids, limit_concurrent, apply_daily_stop, daily_stats, stop_loss_frontier
+from sweep_runner import SweepRunner
+from result_cache import ResultCache
+from stage_profiler import timed, run_profiled
+
+def rsi_sweep_arrays(klines):
+    """Columns the RSI sweeps need (shared with worker processes)."""
+    arr = KlineArrays.from_klines(klines)
+    return {'ts': arr.ts, 'open': arr.open, 'high': arr.high, 'low': arr.low, 'rsi': column(klines, 'rsi')}
+
+
+def build_rsi_trades(arrays, rsi_long, rsi_long_ex, rsi_short, rsi_short_ex, giant_mult=3.0, max_active_trades=5,
+                     start_hour=9):
+    """
+    Signals, tiered amounts and settlement for one RSI parameter set (before the daily stop).
+    arrays: dict with 'ts', 'open', 'high', 'low', 'rsi' (see rsi_sweep_arrays).
+    Thresholds are scalars or per-bar arrays (e.g. chosen by volatility regime).
+    giant_mult: the previous candle is "giant" (no entry) above giant_mult * 20-bar avg amplitude (and > 15U).
+    Returns (day_id, in_window, trade_day, profit, is_win).
+    """
+    ts, open_, high, low, rsi = arrays['ts'], arrays['open'], arrays['high'], arrays['low'], arrays['rsi']
+    n = len(ts)
+
+    day_id = trading_day_ids(ts, start_hour)
+    hour = (ts // 3600) % 24
+    bar = np.arange(n)
+    in_window = (bar >= 100) & (bar < n - 10) & (hour >= 9) & (hour < 20)
+
+    # Giant Candle Check
+    avg_amp = calc_avg_amp(high, low, 20)
+    prev_amp = np.r_[np.nan, (high - low)[:-1]]
+    is_giant = (avg_amp > 0) & (prev_amp > giant_mult * avg_amp) & (prev_amp > 15.0)
+
+    # Dynamic RSI Logic
+    prev_rsi = np.r_[np.nan, rsi[:-1]]
+    candidate = in_window & ~np.isnan(rsi) & ~is_giant
+    is_long = candidate & (prev_rsi < rsi_long)
+    is_short = candidate & ~is_long & (prev_rsi > rsi_short)
+    entry_idx = np.flatnonzero(is_long | is_short)
+
+    # Max Trades Check (one sweep over the signals only).
+    # Trades are taken 09:00-20:00 and the trading day starts at 09:00,
+    # so the 10-bar holding window never crosses a day boundary and the
+    # cap can be applied before the daily stop.
+    entry_idx = entry_idx[limit_concurrent(entry_idx, 10, max_active_trades)]
+
+    side_long = is_long[entry_idx]
+    r = prev_rsi[entry_idx]
+    long_ex = np.broadcast_to(rsi_long_ex, n)[entry_idx]
+    short_ex = np.broadcast_to(rsi_short_ex, n)[entry_idx]
+    amount = np.where(side_long, np.where(r < long_ex, 15, 10), np.where(r > short_ex, 15, 10))
+
+    entry_price = open_[entry_idx]
+    settlement_price = open_[entry_idx + 10]
+    is_win = np.where(side_long, settlement_price > entry_price, settlement_price < entry_price)
+    profit = np.where(is_win, 0.8 * amount, -1.0 * amount)
+
+    return day_id, in_window, day_id[entry_idx], profit, is_win
+
+
+def evaluate_rsi_params(arrays, params):
+    """
+    One RSI parameter set with the -45U daily stop; module level so sweep workers can import it.
+    params: (rsi_long, rsi_long_ex, rsi_short, rsi_short_ex[, giant_mult])
+    """
+    stop_loss_limit = -45
+    day_id, in_window, trade_day, profit, is_win = build_rsi_trades(arrays, *params)
+
+    # Stop Loss Check
+    keep, _, stop_hit = apply_daily_stop(trade_day, profit, stop_loss_limit)
+    daily = daily_stats(day_id[in_window], trade_day[keep], profit[keep], is_win[keep], stop_hit[keep])
+
+    total_profit = daily['profit'].sum()
+    total_trades = int(daily['trades'].sum())
+    total_wins = int(daily['wins'].sum())
+    win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
+    stopped_days = int(daily['stopped'].sum())
+
+    return {'profit': total_profit, 'win_rate': win_rate, 'trades': total_trades, 'stopped_days': stopped_days}
+
+
 class RSIOptimizer(WickSniperStrategyPro):
-    def run_optimization(self):
+    @timed()
+    def run_optimization(self, processes=None, cache=None):
         print(f"\n{'='*50}")
         print(f"Running RSI Optimization (Stop Loss: -45U, Max Trades: 5)")
         print(f"{'='*50}")
@@ -43,13 +126,25 @@ class RSIOptimizer(WickSniperStrategyPro):
             (30, 25, 75, 80), # Asymmetric (Easier to Long)
         ]
         
-        results = []
+        # Each parameter set runs in a worker process; the kline columns live in shared memory once.
+        # With a cache only the parameter sets it has not seen (for this code and data) are computed.
+        arrays = self.sweep_arrays()
+        runner = SweepRunner(arrays, evaluate_rsi_params, processes)
+        print(f"Testing {len(params_grid)} parameter sets on {min(runner.processes, len(params_grid))} processes ...")
 
-        for params in params_grid:
+        def on_result(params, res):
             rsi_long, rsi_long_ex, rsi_short, rsi_short_ex = params
-            print(f"Testing RSI: Long<{rsi_long}/{rsi_long_ex} | Short>{rsi_short}/{rsi_short_ex} ...")
-            
-            res = self.run_single_backtest(rsi_long, rsi_long_ex, rsi_short, rsi_short_ex)
+            print(f"Done RSI: Long<{rsi_long}/{rsi_long_ex} | Short>{rsi_short}/{rsi_short_ex} -> {res['profit']:.2f}")
+
+        if cache is None:
+            sweep = runner.run_all(params_grid, on_result)
+        else:
+            hits = cache.hits
+            sweep = cache.run_all('optimize_rsi', evaluate_rsi_params, arrays, params_grid, processes, on_result)
+            print(f"Cache: {cache.hits - hits} of {len(params_grid)} parameter sets reused")
+
+        results = []
+        for params, res in zip(params_grid, sweep):
             results.append({
                 'params': params,
                 'profit': res['profit'],
@@ -70,124 +165,56 @@ class RSIOptimizer(WickSniperStrategyPro):
             p_str = f"{r['params'][0]}/{r['params'][1]}/{r['params'][2]}/{r['params'][3]}"
             print(f"{p_str:<25} | {r['profit']:<10.2f} | {r['win_rate']:<9.2f}% | {r['trades']:<8} | {r['stopped_days']:<10}")
 
+    def sweep_arrays(self):
+        return rsi_sweep_arrays(self.klines_1m)
+
+    def build_trades(self, rsi_long, rsi_long_ex, rsi_short, rsi_short_ex, max_active_trades=5, start_hour=9):
+        return build_rsi_trades(self.sweep_arrays(), rsi_long, rsi_long_ex, rsi_short, rsi_short_ex,
+                                max_active_trades=max_active_trades, start_hour=start_hour)
+
     def run_single_backtest(self, rsi_long, rsi_long_ex, rsi_short, rsi_short_ex):
-        stop_loss_limit = -45
-        max_active_trades = 5
-        start_hour = 9
-        
-        daily_stats = {} 
-        current_day_pnl = 0
-        is_stopped_today = False
-        
-        active_trade_indices = [] # List of expiry indices
-        
-        for i in range(100, len(self.klines_1m) - 10):
-            k1m = self.klines_1m[i]
-            prev_k1m = self.klines_1m[i-1]
-            
-            # Update active trades
-            active_trade_indices = [idx for idx in active_trade_indices if idx > i]
-            
-            dt = datetime.strptime(k1m['datetime'], '%Y-%m-%d %H:%M:%S')
-            
-            if dt.hour < start_hour:
-                trading_day_date = (dt - timedelta(days=1)).strftime('%Y-%m-%d')
-            else:
-                trading_day_date = dt.strftime('%Y-%m-%d')
-            
-            if not (9 <= dt.hour < 20):
-                continue
-
-            if trading_day_date not in daily_stats:
-                daily_stats[trading_day_date] = {
-                    'profit': 0, 'trades': 0, 'wins': 0, 'stopped': False
-                }
-                current_day_pnl = 0
-                is_stopped_today = False
-            
-            if k1m.get('rsi') is None: continue
-            
-            # Stop Loss Check
-            if is_stopped_today: continue
-            
-            # Max Trades Check
-            if len(active_trade_indices) >= max_active_trades: continue
-
-            prev_rsi = prev_k1m['rsi']
-            trade = None
-            bet_amount = 0
-            
-            # Giant Candle Check
-            avg_amp = 0
-            if i > 20:
-                sum_amp = 0
-                for j in range(i-20, i):
-                    sum_amp += (self.klines_1m[j]['high'] - self.klines_1m[j]['low'])
-                avg_amp = sum_amp / 20
-            
-            prev_amp = prev_k1m['high'] - prev_k1m['low']
-            if avg_amp > 0 and prev_amp > 3 * avg_amp and prev_amp > 15.0:
-                continue 
-
-            # Dynamic RSI Logic
-            if prev_rsi < rsi_long:
-                if prev_rsi < rsi_long_ex: bet_amount = 15
-                else: bet_amount = 10
-                trade = {'type': 'LONG', 'entry_price': k1m['open'], 'amount': bet_amount}
-                
-            elif prev_rsi > rsi_short:
-                if prev_rsi > rsi_short_ex: bet_amount = 15
-                else: bet_amount = 10
-                trade = {'type': 'SHORT', 'entry_price': k1m['open'], 'amount': bet_amount}
-                
-            if trade:
-                active_trade_indices.append(i + 10)
-                
-                settlement_kline = self.klines_1m[i+10]
-                settlement_price = settlement_kline['open']
-                
-                is_win = False
-                profit = 0
-                
-                if trade['type'] == 'LONG':
-                    is_win = settlement_price > trade['entry_price']
-                else:
-                    is_win = settlement_price < trade['entry_price']
-                
-                if is_win:
-                    profit = 0.8 * trade['amount']
-                else:
-                    profit = -1.0 * trade['amount']
-                    
-                daily_stats[trading_day_date]['profit'] += profit
-                daily_stats[trading_day_date]['trades'] += 1
-                if is_win: daily_stats[trading_day_date]['wins'] += 1
-                
-                current_day_pnl += profit
-                
-                if current_day_pnl <= stop_loss_limit:
-                    is_stopped_today = True
-                    daily_stats[trading_day_date]['stopped'] = True
-
-        total_profit = sum(d['profit'] for d in daily_stats.values())
-        total_trades = sum(d['trades'] for d in daily_stats.values())
-        total_wins = sum(d['wins'] for d in daily_stats.values())
-        win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
-        stopped_days = len([d for d in daily_stats.values() if d['stopped']])
-        
-        return {'profit': total_profit, 'win_rate': win_rate, 'trades': total_trades, 'stopped_days': stopped_days}
+        return evaluate_rsi_params(self.sweep_arrays(), (rsi_long, rsi_long_ex, rsi_short, rsi_short_ex))
 
-if __name__ == "__main__":
+    @timed()
+    def run_stop_frontier(self, params=(25, 20, 75, 80), stop_levels=None):
+        """
+        Profit / stopped days / drawdown for a whole grid of daily stop levels,
+        computed from one set of trades instead of one backtest per level.
+        """
+        if stop_levels is None:
+            stop_levels = np.r_[np.arange(-150, -14, 5), -np.inf]
+        _, _, trade_day, profit, is_win = self.build_trades(*params)
+        frontier = stop_loss_frontier(trade_day, profit, stop_levels, is_win)
+
+        print(f"\n{'='*80}")
+        print(f"Daily Stop Frontier for RSI {'/'.join(str(p) for p in params)}")
+        print(f"{'STOP':<8} | {'PROFIT':<10} | {'WIN RATE':<10} | {'TRADES':<8} | {'STOP DAYS':<10} | {'MAX DD':<8}")
+        print(f"{'-'*80}")
+        for n in range(len(frontier['stop'])):
+            stop = frontier['stop'][n]
+            trades = frontier['trades'][n]
+            win_rate = frontier['wins'][n] / trades * 100 if trades > 0 else 0
+            stop_str = 'None' if np.isinf(stop) else f"{stop:.0f}"
+            print(f"{stop_str:<8} | {frontier['profit'][n]:<10.2f} | {win_rate:<9.2f}% | {trades:<8} | {frontier['stopped_days'][n]:<10} | {frontier['max_drawdown'][n]:<8.2f}")
+        return frontier
+
+def main():
     try:
         script_dir = os.path.dirname(os.path.abspath(__file__))
         data_path = os.path.join(script_dir, 'ETHUSDT_1m_klines.json')
         
         optimizer = RSIOptimizer(data_file=data_path)
         if optimizer.load_data():
-            optimizer.run_optimization()
+            optimizer.run_optimization(cache=ResultCache())
+            optimizer.run_stop_frontier()
         else:
             print("Data load failed.")
     except Exception as e:
         print(f"An error occurred: {e}")
         import traceback
         traceback.print_exc()
+
+
+if __name__ == "__main__":
+    # python optimize_rsi.py [--profile[=stacks.folded]]
+    run_profiled(main)
@@ -0,0 +1,146 @@
+import numpy as np
+
+HOURS = 24
+WEEKDAYS = 7
+DIRECTIONS = {'SHORT': 0, 'LONG': 1}
+REGIMES = {'normal': 0, 'quiet': 1}
+
+
+def hour_mask(ranges):
+    """
+    时间窗口并集 -> 长度24的 bool 数组
+    每个窗口 (start, end) 与 TimeWindowTester.run_backtest 口径一致：
+    start < end 时为 [start, end)，否则跨午夜 (hour >= start 或 hour < end)
+    """
+    mask = np.zeros(HOURS, dtype=bool)
+    hours = np.arange(HOURS)
+    for start, end in ranges:
+        if start < end:
+            mask |= (hours >= start) & (hours < end)
+        else:
+            mask |= (hours >= start) | (hours < end)
+    return mask
+
+
+class OutcomeCube:
+    """
+    信号结果立方体：按 (小时, 星期, 方向, 行情状态) 汇总单量、胜场和下注额
+
+    只需对信号表做一次 bincount，之后任意时间窗口 (及其并集)、星期、方向、行情状态的
+    胜率和期望收益都是在 24x7x2x2 的小数组上求和，不再重新扫描K线
+    """
+
+    def __init__(self, hour, weekday, long, quiet, is_win, stake=None, payout=0.8):
+        hour = np.asarray(hour, dtype=np.int64)
+        stake = np.ones(len(hour)) if stake is None else np.asarray(stake, dtype=np.float64)
+        placed = stake > 0
+        is_win = np.asarray(is_win, dtype=bool) & placed
+        cell = ((hour * WEEKDAYS + np.asarray(weekday, dtype=np.int64)) * 2
+                + np.asarray(long, dtype=np.int64)) * 2 + np.asarray(quiet, dtype=np.int64)
+        shape = (HOURS, WEEKDAYS, 2, 2)
+        size = HOURS * WEEKDAYS * 4
+        self.payout = payout
+        self.trades = np.bincount(cell, weights=placed, minlength=size).astype(np.int64).reshape(shape)
+        self.wins = np.bincount(cell, weights=is_win, minlength=size).astype(np.int64).reshape(shape)
+        self.staked = np.bincount(cell, weights=stake * placed, minlength=size).reshape(shape)
+        self.won = np.bincount(cell, weights=stake * is_win, minlength=size).reshape(shape)
+
+    @classmethod
+    def from_table(cls, table, arrays, stake=None, payout=0.8):
+        """由 signal_table.build_signal_table 的信号表构造，小时/星期取信号K线的时间"""
+        index = table['index']
+        return cls(arrays.hour[index], arrays.weekday[index], table['long'], table['quiet'], table['is_win'],
+                   stake, payout)
+
+    def by_hour(self, weekdays=None, direction=None, regime=None):
+        """按小时的 (单量, 胜场, 下注额, 赢的下注额)，其余维度按条件筛选后求和"""
+        picks = ((1, weekdays), (2, None if direction is None else [DIRECTIONS[direction]]),
+                 (3, None if regime is None else [REGIMES[regime]]))
+        out = []
+        for values in (self.trades, self.wins, self.staked, self.won):
+            for axis, keep in picks:
+                if keep is not None:
+                    values = np.take(values, list(keep), axis=axis)
+            out.append(values.sum(axis=(1, 2, 3)))
+        return tuple(out)
+
+    def _result(self, trades, wins, staked, won):
+        profit = won * self.payout - (staked - won)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = np.where(trades > 0, wins / np.maximum(trades, 1) * 100, 0.0)
+            ev = np.where(staked > 0, profit / np.where(staked > 0, staked, 1), 0.0)
+        return trades, wins, win_rate, profit, ev
+
+    def query(self, ranges, weekdays=None, direction=None, regime=None):
+        """
+        任意时间窗口并集的统计
+        :param ranges: [(start, end), ...]，例如 [(0, 8), (20, 24)] 或跨午夜 [(22, 2)]
+        :return: dict trades, wins, win_rate (%), profit, ev (每 1U 下注的期望收益)
+        """
+        mask = hour_mask(ranges)
+        totals = [values[mask].sum() for values in self.by_hour(weekdays, direction, regime)]
+        trades, wins, win_rate, profit, ev = self._result(*totals)
+        return {
+            'ranges': list(ranges),
+            'trades': int(trades),
+            'wins': int(wins),
+            'win_rate': win_rate.item(),
+            'profit': profit.item(),
+            'ev': ev.item(),
+        }
+
+    def search(self, min_trades=50, segments=2, weekdays=None, direction=None, regime=None, sort_key='ev', top=20):
+        """
+        穷举所有连续时间窗口 (含跨午夜) 以及两段不相邻窗口的并集
+        用按小时的前缀和 (首尾拼接一次处理跨午夜) 一次算出全部窗口，两段组合用广播求和
+        :return: 按 sort_key 从高到低的前 top 个结果
+        """
+        per_hour = self.by_hour(weekdays, direction, regime)
+        prefix = [np.r_[0, np.cumsum(np.r_[values, values])] for values in per_hour]
+
+        start = np.repeat(np.arange(HOURS), HOURS - 1)
+        length = np.tile(np.arange(1, HOURS), HOURS)
+        sums = [p[start + length] - p[start] for p in prefix]
+        bits = ((1 << length) - 1) << start
+        bits = (bits | (bits >> HOURS)) & ((1 << HOURS) - 1)
+        windows = [((s, (s + l) % HOURS or HOURS),) for s, l in zip(start.tolist(), length.tolist())]
+
+        # 全天
+        windows.append(((0, HOURS),))
+        sums = [np.r_[s, values.sum()] for s, values in zip(sums, per_hour)]
+        bits = np.r_[bits, (1 << HOURS) - 1]
+
+        groups = [(lambda i: windows[i], sums)]
+        if segments >= 2:
+            single = len(windows) - 1
+            a, b = np.triu_indices(single, k=1)
+            full = (1 << HOURS) - 1
+            rot_left = ((bits[a] << 1) | (bits[a] >> (HOURS - 1))) & full
+            rot_right = ((bits[a] >> 1) | (bits[a] << (HOURS - 1))) & full
+            # 两段必须不重叠且不相邻，否则等价于一个连续窗口
+            apart = ((bits[a] | rot_left | rot_right) & bits[b]) == 0
+            a, b = a[apart], b[apart]
+            groups.append((lambda i, a=a, b=b: windows[a[i]] + windows[b[i]], [s[a] + s[b] for s in sums]))
+
+        results = []
+        for name, totals in groups:
+            trades, wins, win_rate, profit, ev = self._result(*totals)
+            keys = {'trades': trades, 'win_rate': win_rate, 'profit': profit, 'ev': ev}
+            ok = np.flatnonzero(trades >= min_trades)
+            best = ok[np.argsort(-keys[sort_key][ok], kind='stable')[:top]]
+            for i in best.tolist():
+                results.append({
+                    'ranges': list(name(i)),
+                    'trades': int(trades[i]),
+                    'wins': int(wins[i]),
+                    'win_rate': win_rate[i].item(),
+                    'profit': profit[i].item(),
+                    'ev': ev[i].item(),
+                })
+        results.sort(key=lambda r: r[sort_key], reverse=True)
+        return results[:top]
+
+
+def format_ranges(ranges):
+    """[(0, 8), (22, 2)] -> 'UTC 0-8 + 22-2'"""
+    return 'UTC ' + ' + '.join(f"{start}-{end}" for start, end in ranges)
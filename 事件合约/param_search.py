@@ -0,0 +1,245 @@
+import functools
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sweep_runner import SweepRunner, kline_columns
+
+
+class SearchSpace:
+    """
+    参数空间：dims 为有序的 {名字: (下限, 上限, 步长)}，步长为 None 表示连续取值
+    候选参数是按 dims 顺序排列的元组，可以直接传给 evaluate_rsi_params / evaluate_bb_params 这类评估函数
+    constraint(params) 返回 False 的组合会被丢弃 (例如极值档必须比入场档更极端)
+    """
+
+    def __init__(self, dims, constraint=None):
+        self.names = list(dims)
+        self.low = np.array([dims[k][0] for k in self.names], dtype=np.float64)
+        self.high = np.array([dims[k][1] for k in self.names], dtype=np.float64)
+        self.step = [dims[k][2] for k in self.names]
+        self.constraint = constraint
+
+    def __len__(self):
+        return len(self.names)
+
+    def to_params(self, unit):
+        """[0, 1] 归一化坐标 -> 参数元组 (按步长取整)"""
+        values = self.low + np.clip(unit, 0, 1) * (self.high - self.low)
+        params = []
+        for value, step, low in zip(values.tolist(), self.step, self.low.tolist()):
+            if step is None:
+                params.append(value)
+            else:
+                value = low + round((value - low) / step) * step
+                params.append(int(round(value)) if float(step).is_integer() and float(low).is_integer()
+                              else round(value, 10))
+        return tuple(params)
+
+    def to_unit(self, params):
+        """参数元组 -> [0, 1] 归一化坐标"""
+        span = np.where(self.high > self.low, self.high - self.low, 1.0)
+        return (np.asarray(params, dtype=np.float64) - self.low) / span
+
+    def valid(self, params):
+        return self.constraint is None or bool(self.constraint(params))
+
+    def sample(self, size, rng, exclude=()):
+        """随机抽取最多 size 个满足约束、互不重复的参数组合"""
+        seen = set(exclude)
+        out = []
+        for _ in range(size * 50):
+            params = self.to_params(rng.random(len(self)))
+            if params not in seen and self.valid(params):
+                seen.add(params)
+                out.append(params)
+                if len(out) == size:
+                    break
+        return out
+
+
+def _score(result, metric):
+    return metric(result) if callable(metric) else result[metric]
+
+
+def evaluate_prefix(evaluate, columns, task):
+    """只用前 end 根K线评估；指标只依赖过去的K线，所以前缀上的指标与全量数据上的完全一致"""
+    end, params = task
+    return evaluate({key: values[:end] for key, values in columns.items()}, params)
+
+
+def successive_halving(columns, evaluate, candidates, metric='profit', eta=3, min_fraction=1 / 9, processes=None):
+    """
+    逐轮加长数据 (min_fraction, min_fraction*eta, ..., 1) 评估候选参数，每轮只保留前 1/eta
+    数据越短越便宜，大部分候选在最短的那段数据上就被淘汰，总计算量约为全量评估的 log_eta 倍而不是候选数倍
+
+    :param evaluate: SweepRunner 用的模块级评估函数 evaluate(columns, params)
+    :param metric: 结果字典里的键名 (越大越好)，或 callable(result) -> 分数
+    :return: dict
+        best: (params, result)，result 为全量数据上的结果
+        final: 最后一轮 [(params, result)]，按分数从高到低
+        rounds: 每轮 {'end', 'candidates', 'scores'}
+    """
+    if eta < 2:
+        raise ValueError(f"eta 必须 >= 2: {eta}")
+    n = len(columns['ts'])
+    alive = list(dict.fromkeys(candidates))
+    if not alive:
+        raise ValueError("没有候选参数")
+
+    fractions = []
+    fraction = min_fraction
+    while fraction < 1:
+        fractions.append(fraction)
+        fraction *= eta
+    fractions.append(1.0)
+
+    runner = SweepRunner(columns, functools.partial(evaluate_prefix, evaluate), processes)
+    rounds = []
+    for r, fraction in enumerate(fractions):
+        end = n if fraction >= 1 else max(int(n * fraction), 1)
+        results = runner.run_all([(end, params) for params in alive])
+        scores = [_score(res, metric) for res in results]
+        order = sorted(range(len(alive)), key=lambda i: scores[i], reverse=True)
+        rounds.append({'end': end, 'candidates': alive, 'scores': scores})
+        ranked = [(alive[i], results[i]) for i in order]
+        if r == len(fractions) - 1:
+            break
+        alive = [params for params, _ in ranked[:max(1, math.ceil(len(alive) / eta))]]
+
+    return {'best': ranked[0], 'final': ranked, 'rounds': rounds}
+
+
+class TPEProposer:
+    """
+    基于模型的参数建议 (Tree-structured Parzen Estimator 的简化版，只用 numpy)
+
+    把已评估的参数按分数分成好 (前 gamma) 与差两组，在归一化空间里各做一个高斯核密度；
+    从好组附近抽样大量候选，选 好密度/差密度 最大的那些作为下一批。
+    适合 RSI 档位、布林带标准差、波动率分位数这类连续阈值
+    """
+
+    def __init__(self, space, gamma=0.25, n_startup=10, n_candidates=256, bandwidth=0.1, seed=0):
+        self.space = space
+        self.gamma = gamma
+        self.n_startup = n_startup
+        self.n_candidates = n_candidates
+        self.bandwidth = bandwidth
+        self.rng = np.random.default_rng(seed)
+        self.params = []
+        self.scores = []
+
+    def observe(self, params, score):
+        self.params.append(tuple(params))
+        self.scores.append(float(score))
+
+    def _density(self, x, centers):
+        d = (x[:, None, :] - centers[None, :, :]) / self.bandwidth
+        return np.exp(-0.5 * (d ** 2).sum(axis=2)).mean(axis=1) + 1e-12
+
+    def propose(self, size):
+        """给出 size 个未评估过的参数组合"""
+        seen = set(self.params)
+        if len(self.params) < self.n_startup:
+            return self.space.sample(size, self.rng, exclude=seen)
+
+        order = np.argsort(self.scores, kind='stable')[::-1]
+        n_good = max(1, int(math.ceil(self.gamma * len(order))))
+        unit = np.array([self.space.to_unit(p) for p in self.params])
+        good, bad = unit[order[:n_good]], unit[order[n_good:]]
+
+        centers = good[self.rng.integers(len(good), size=self.n_candidates)]
+        x = np.clip(centers + self.rng.normal(0, self.bandwidth, centers.shape), 0, 1)
+        ratio = self._density(x, good) / (self._density(x, bad) if len(bad) else 1.0)
+
+        out = []
+        for i in np.argsort(-ratio, kind='stable').tolist():
+            params = self.space.to_params(x[i])
+            if params not in seen and self.space.valid(params):
+                seen.add(params)
+                out.append(params)
+                if len(out) == size:
+                    return out
+        # 好组附近已经被试遍，用随机样本补足
+        return out + self.space.sample(size - len(out), self.rng, exclude=seen)
+
+
+def model_search(columns, evaluate, space, budget=60, batch=None, metric='profit', processes=None, seed=0,
+                 proposer=None):
+    """
+    固定预算的模型引导搜索：每批由 TPEProposer 给出 batch 个参数，在进程池里并行评估后回灌模型
+    :return: [(params, result)]，按分数从高到低
+    """
+    runner = SweepRunner(columns, evaluate, processes)
+    batch = batch or max(runner.processes, 4)
+    proposer = proposer or TPEProposer(space, seed=seed)
+    history = []
+    while len(history) < budget:
+        params_list = proposer.propose(min(batch, budget - len(history)))
+        if not params_list:
+            break
+        for params, res in zip(params_list, runner.run_all(params_list)):
+            proposer.observe(params, _score(res, metric))
+            history.append((params, res))
+    history.sort(key=lambda item: _score(item[1], metric), reverse=True)
+    return history
+
+
+def rsi_threshold_space():
+    """optimize_rsi 的四个 RSI 档位 (做多入场/极值, 做空入场/极值，取整数) 和连续取值的巨型K线倍数"""
+    return SearchSpace(
+        {'rsi_long': (15, 35, 1), 'rsi_long_ex': (10, 30, 1), 'rsi_short': (65, 85, 1), 'rsi_short_ex': (70, 90, 1),
+         'giant_mult': (2.0, 6.0, None)},
+        constraint=lambda p: p[1] < p[0] and p[3] > p[2],
+    )
+
+
+def rsi_params_label(params):
+    """'25/20/75/80/3.00' 形式的参数标签"""
+    return '/'.join(str(p) for p in params[:4]) + ''.join(f"/{p:.2f}" for p in params[4:])
+
+
+if __name__ == "__main__":
+    from kline_arrays import KlineArrays, calc_rsi, calc_avg_amp
+    from optimize_rsi import evaluate_rsi_params
+    from optimize_dynamic_rsi import evaluate_quiet_regime
+    from bb_optimizer import evaluate_bb_params
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    rsi = calc_rsi(arr.close, 14)
+    rsi_columns = {'ts': arr.ts, 'open': arr.open, 'high': arr.high, 'low': arr.low, 'rsi': rsi}
+    space = rsi_threshold_space()
+
+    candidates = space.sample(243, np.random.default_rng(0))
+    print(f"🔍 逐轮减半: {len(candidates)} 组 RSI 档位 (K线 {len(arr)} 根)")
+    halving = successive_halving(rsi_columns, evaluate_rsi_params, candidates)
+    for r in halving['rounds']:
+        print(f"  前 {r['end']:>7} 根K线: {len(r['candidates']):>4} 组, 最高分 {max(r['scores']):+.2f}")
+    print(f"{'PARAMS (L/Lex/S/Sex/Giant)':<28} | {'PROFIT':<10} | {'WIN RATE':<10} | {'TRADES':<8} | {'STOP DAYS':<10}")
+    for params, res in halving['final'][:10]:
+        p_str = rsi_params_label(params)
+        print(f"{p_str:<28} | {res['profit']:<10.2f} | {res['win_rate']:<9.2f}% | {res['trades']:<8} | {res['stopped_days']:<10}")
+
+    print("\n🔍 模型引导搜索: RSI 档位 + 巨型K线倍数 (预算 60 次)")
+    for params, res in model_search(rsi_columns, evaluate_rsi_params, space, budget=60)[:5]:
+        print(f"  {rsi_params_label(params):<25} 净利润 {res['profit']:+.2f} | 胜率 {res['win_rate']:.2f}% | 单量 {res['trades']}")
+
+    bb_columns = kline_columns(arr, rsi=rsi, avg_amp=calc_avg_amp(arr.high, arr.low, 20))
+    bb_space = SearchSpace({'period': (14, 34, 1), 'std': (1.5, 3.0, None)})
+    print("\n🔍 模型引导搜索: 布林带 (周期, 连续标准差) (预算 40 次)")
+    for params, res in model_search(bb_columns, evaluate_bb_params, bb_space, budget=40, metric='net_profit')[:5]:
+        print(f"  BB ({params[0]}, {params[1]:.3f})  单量 {res['trades']} | 胜率 {res['win_rate']:.2f}% | 净利润 {res['net_profit']:+.2f} U")
+
+    quiet_space = SearchSpace({'amp_quantile': (5.0, 50.0, None), 'quiet_long': (25, 35, 1), 'quiet_short': (65, 75, 1)})
+    print("\n🔍 模型引导搜索: 安静行情分位数 + 安静档位 (Dynamic C, 预算 40 次)")
+    for params, res in model_search(rsi_columns, evaluate_quiet_regime, quiet_space, budget=40)[:5]:
+        print(f"  P{params[0]:.1f} 做多<{params[1]} 做空>{params[2]}  净利润 {res['profit']:+.2f} | 胜率 {res['win_rate']:.2f}% | 单量 {res['trades']}")
@@ -0,0 +1,197 @@
+import os
+import sys
+from collections import deque
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_avg_amp, calc_rsi, calc_bollinger
+from signal_table import build_signal_table, tiered_stake, settle_pnl, equity_stats
+from trading_day import trading_day_ids
+
+DEFAULT_SYMBOLS = ('BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'BNBUSDT')
+
+# 信号被拒绝的原因
+ACCEPTED = 0
+REJECT_STOP = 1
+REJECT_GLOBAL_CAP = 2
+REJECT_SYMBOL_CAP = 3
+REASONS = {ACCEPTED: '成交', REJECT_STOP: '日止损', REJECT_GLOBAL_CAP: '总持仓上限', REJECT_SYMBOL_CAP: '单币持仓上限'}
+
+# 与 optimize_rsi / daily_analysis 一致的默认口径：09:00-20:00，RSI 25/75 分级注码，开盘价入场，i+10 开盘价结算
+SIGNAL_DEFAULTS = dict(hours=(9, 20), long_below=25, short_above=75, giant_floor=15.0, entry='open', settle='open')
+
+
+def load_symbols(symbols=DEFAULT_SYMBOLS, data_dir='.', interval='1m'):
+    """按 fetch_data_300 的文件名 {symbol}_{interval}_klines.json 加载各币种，缺文件的币种跳过"""
+    out = {}
+    for symbol in symbols:
+        arrays = KlineArrays.load(os.path.join(data_dir, f'{symbol}_{interval}_klines.json'))
+        if arrays is not None:
+            out[symbol] = arrays
+    return out
+
+
+def time_axis(symbol_arrays):
+    """
+    共同时间轴：所有币种时间戳的并集 (升序)，以及每个币种每根K线在时间轴上的位置
+    各币种的K线可以有缺口或起止时间不同
+    """
+    axis = np.unique(np.concatenate([arrays.ts for arrays in symbol_arrays.values()]))
+    return axis, {symbol: np.searchsorted(axis, arrays.ts) for symbol, arrays in symbol_arrays.items()}
+
+
+def symbol_signals(arrays, stake_fn=tiered_stake, payout=0.8, **table_kwargs):
+    """
+    单个币种的候选信号 (向量化)：算好 RSI/布林带/振幅后生成信号表，stake_fn(table) 给出每行注码，只保留下注的行
+    :return: dict ts, index, long, stake, is_win, pnl (按时间排序)
+    """
+    kwargs = dict(SIGNAL_DEFAULTS, **table_kwargs)
+    _, upper, lower = calc_bollinger(arrays.close, 20, 2)
+    table = build_signal_table(arrays, calc_rsi(arrays.close, 14), calc_avg_amp(arrays.high, arrays.low, 20),
+                               lower, upper, **kwargs)
+    stake = stake_fn(table)
+    rows = np.flatnonzero(stake > 0)
+    return {
+        'ts': arrays.ts[table['index'][rows]],
+        'index': table['index'][rows],
+        'long': table['long'][rows],
+        'stake': stake[rows],
+        'is_win': table['is_win'][rows],
+        'pnl': settle_pnl(table, stake, payout)[rows],
+    }
+
+
+def merge_signals(per_symbol):
+    """把各币种的信号合并成一条按时间排序的队列 (同一分钟内按 per_symbol 的顺序)"""
+    symbols = list(per_symbol)
+    signals = [per_symbol[s] for s in symbols]
+    merged = {key: np.concatenate([sig[key] for sig in signals]) for key in signals[0]} if signals else {}
+    merged['symbol'] = np.concatenate([np.full(len(sig['ts']), n, dtype=np.int64) for n, sig in enumerate(signals)])
+    order = np.lexsort((merged['symbol'], merged['ts']))
+    merged = {key: values[order] for key, values in merged.items()}
+    merged['symbols'] = symbols
+    return merged
+
+
+def simulate_portfolio(ts, symbol, day, pnl, hold_seconds=600, max_open=10, max_open_per_symbol=None,
+                       stop_loss_limit=-45.0):
+    """
+    共享的风控/仓位模拟：所有币种的信号按时间顺序经过同一套规则
+    - 全局日止损：当日 (所有币种合计) 累计盈亏 <= stop_loss_limit 后当天不再开单 (触发那笔仍成交)
+    - 全局最大持仓 max_open，可选单币最大持仓 max_open_per_symbol
+    规则的先后与单币种脚本一致：先看是否已止损，再看持仓上限
+    持仓时间固定，到期时间随入场时间单调，用队列即可；只遍历信号本身
+
+    :return: (reason, day_pnl, stop_hit)，reason 为 ACCEPTED / REJECT_* 之一
+    """
+    n = len(ts)
+    reason = np.full(n, ACCEPTED, dtype=np.int8)
+    day_pnl = np.zeros(n)
+    stop_hit = np.zeros(n, dtype=bool)
+    open_exits = deque()
+    symbol_exits = {}
+    current_day = None
+    running = 0.0
+    stopped = False
+    for k, (t, s, d, p) in enumerate(zip(ts.tolist(), symbol.tolist(), day.tolist(), pnl.tolist())):
+        if d != current_day:
+            current_day = d
+            running = 0.0
+            stopped = False
+        while open_exits and open_exits[0] <= t:
+            open_exits.popleft()
+        if stopped:
+            reason[k] = REJECT_STOP
+            continue
+        if len(open_exits) >= max_open:
+            reason[k] = REJECT_GLOBAL_CAP
+            continue
+        if max_open_per_symbol is not None:
+            exits = symbol_exits.setdefault(s, deque())
+            while exits and exits[0] <= t:
+                exits.popleft()
+            if len(exits) >= max_open_per_symbol:
+                reason[k] = REJECT_SYMBOL_CAP
+                continue
+            exits.append(t + hold_seconds)
+        open_exits.append(t + hold_seconds)
+        running += p
+        day_pnl[k] = running
+        if stop_loss_limit is not None and running <= stop_loss_limit:
+            stopped = True
+            stop_hit[k] = True
+    return reason, day_pnl, stop_hit
+
+
+def exposure(axis, entry_ts, hold_seconds=600):
+    """每个时间点的持仓笔数 (按成交的交易在共同时间轴上做差分累加)"""
+    delta = np.bincount(np.searchsorted(axis, entry_ts), minlength=len(axis) + 1)
+    delta -= np.bincount(np.searchsorted(axis, entry_ts + hold_seconds), minlength=len(axis) + 1)
+    return np.cumsum(delta)[:len(axis)]
+
+
+def run_portfolio(symbol_arrays, max_open=10, max_open_per_symbol=5, stop_loss_limit=-45.0, hold_bars=10,
+                  day_start_hour=9, stake_fn=tiered_stake, payout=0.8, **table_kwargs):
+    """
+    多币种组合回测：各币种独立向量化生成信号，合并后经过共享的持仓上限和日止损
+    :return: dict total, per_symbol {symbol: {trades, wins, win_rate, profit}}, rejected {原因: 笔数},
+             stopped_days, max_exposure, signals (合并后的信号队列，含 reason 列)
+    """
+    if not symbol_arrays:
+        raise ValueError("没有可用的币种数据")
+    per_symbol = {symbol: symbol_signals(arrays, stake_fn, payout, horizon=hold_bars, **table_kwargs)
+                  for symbol, arrays in symbol_arrays.items()}
+    merged = merge_signals(per_symbol)
+    hold_seconds = hold_bars * 60
+    merged['day'] = trading_day_ids(merged['ts'], day_start_hour)
+    reason, day_pnl, stop_hit = simulate_portfolio(merged['ts'], merged['symbol'], merged['day'], merged['pnl'],
+                                                   hold_seconds, max_open, max_open_per_symbol, stop_loss_limit)
+    merged['reason'] = reason
+    merged['day_pnl'] = day_pnl
+    accepted = reason == ACCEPTED
+
+    def stats(mask):
+        trades = int(mask.sum())
+        wins = int((mask & merged['is_win']).sum())
+        return {
+            'trades': trades,
+            'wins': wins,
+            'win_rate': wins / trades * 100 if trades else 0,
+            'profit': merged['pnl'][mask].sum().item(),
+        }
+
+    axis, _ = time_axis(symbol_arrays)
+    return {
+        'total': dict(stats(accepted), **equity_stats(merged['pnl'][accepted])),
+        'per_symbol': {s: stats(accepted & (merged['symbol'] == n)) for n, s in enumerate(merged['symbols'])},
+        'rejected': {REASONS[r]: int((reason == r).sum()) for r in (REJECT_STOP, REJECT_GLOBAL_CAP, REJECT_SYMBOL_CAP)},
+        'stopped_days': int(stop_hit.sum()),
+        'max_exposure': int(exposure(axis, merged['ts'][accepted], hold_seconds).max()) if accepted.any() else 0,
+        'signals': merged,
+    }
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    symbols = sys.argv[1:] or DEFAULT_SYMBOLS
+    data = load_symbols(symbols, script_dir)
+    if not data:
+        print(f"❌ 找不到任何数据文件 ({', '.join(f'{s}_1m_klines.json' for s in symbols)})")
+        sys.exit(1)
+    missing = [s for s in symbols if s not in data]
+    print(f"✅ 加载 {len(data)} 个币种: {', '.join(data)}" + (f" | 缺少: {', '.join(missing)}" if missing else ""))
+
+    res = run_portfolio(data, max_open=10, max_open_per_symbol=5, stop_loss_limit=-45.0)
+    total = res['total']
+    print(f"\n{'='*80}")
+    print(f"组合回测 (总持仓 <= 10, 单币 <= 5, 全局日止损 -45U)")
+    print(f"{'币种':<10} | {'单量':<6} | {'胜率':<7} | {'净利润'}")
+    print(f"{'-'*80}")
+    for symbol, s in res['per_symbol'].items():
+        print(f"{symbol:<10} | {s['trades']:<6} | {s['win_rate']:6.2f}% | {s['profit']:+.2f}U")
+    print(f"{'-'*80}")
+    print(f"{'合计':<10} | {total['trades']:<6} | {total['win_rate']:6.2f}% | {total['profit']:+.2f}U")
+    print(f"最大回撤: {total['max_drawdown']:.2f}U | 止损天数: {res['stopped_days']} | 最大同时持仓: {res['max_exposure']}")
+    print("被拒绝的信号: " + ' | '.join(f"{name} {count}" for name, count in res['rejected'].items()))
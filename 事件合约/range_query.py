@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class SparseTable:
+    """
+    区间最值稀疏表：O(n log n) 预处理，之后区间最值查询 O(1)，
+    "从某根K线开始第一次穿越价格 X" 的首达查询 O(log n)，且全部查询按数组批量完成
+
+    op='min' 用于 low (止损/支撑被跌破)，op='max' 用于 high (止损/压力被突破)
+    """
+
+    def __init__(self, values, op='min'):
+        if op not in ('min', 'max'):
+            raise ValueError(f"op 只能是 'min' 或 'max': {op}")
+        self.op = op
+        self._reduce = np.minimum if op == 'min' else np.maximum
+        values = np.asarray(values, dtype=np.float64)
+        self.n = len(values)
+        # levels[k][i] = values[i : i + 2**k] 的最值 (只保留完整区间)
+        self.levels = [values]
+        k = 1
+        while (1 << k) <= self.n:
+            prev = self.levels[-1]
+            half = 1 << (k - 1)
+            self.levels.append(self._reduce(prev[:-half], prev[half:]))
+            k += 1
+
+    def __len__(self):
+        return self.n
+
+    def query(self, left, right):
+        """闭区间 [left, right] 的最值，left/right 为等长整数数组 (要求 left <= right)"""
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        length = right - left + 1
+        k = np.floor(np.log2(length)).astype(np.int64)
+        out = np.empty(len(left), dtype=np.float64)
+        for level in np.unique(k).tolist():
+            sel = k == level
+            table = self.levels[level]
+            out[sel] = self._reduce(table[left[sel]], table[right[sel] - (1 << level) + 1])
+        return out
+
+    def _crossed(self, block, threshold, inclusive):
+        if self.op == 'min':
+            return block <= threshold if inclusive else block < threshold
+        return block >= threshold if inclusive else block > threshold
+
+    def first_cross(self, start, threshold, end=None, inclusive=False):
+        """
+        对每个查询，找 [start, end) 内第一根穿越 threshold 的K线
+        op='min': values[t] < threshold (inclusive 时 <=)
+        op='max': values[t] > threshold (inclusive 时 >=)
+
+        二进制跳跃：从最大的 2**k 开始，整段都没有穿越就跳过整段，
+        每个查询最多 log2(n) 步，所有查询一起向量化推进
+        :return: 索引数组，找不到时为 len(values)
+        """
+        pos = np.array(start, dtype=np.int64, copy=True)
+        threshold = np.broadcast_to(np.asarray(threshold, dtype=np.float64), pos.shape)
+        for level in range(len(self.levels) - 1, -1, -1):
+            step = 1 << level
+            table = self.levels[level]
+            fits = pos + step <= self.n
+            idx = np.flatnonzero(fits)
+            if len(idx) == 0:
+                continue
+            clear = ~self._crossed(table[pos[idx]], threshold[idx], inclusive)
+            pos[idx[clear]] += step
+        if end is not None:
+            pos[pos >= np.asarray(end)] = self.n
+        return pos
@@ -0,0 +1,175 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from result_store import canonical_params
+from sweep_runner import SweepRunner
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.backtest_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_MISSING = object()
+
+
+def _source_files(func):
+    """函数所在模块，以及该模块直接或间接引用到的同目录模块的源码文件 (沿 import 链递归)"""
+    targets = [func]
+    while isinstance(targets[0], functools.partial):
+        partial = targets.pop(0)
+        targets = [partial.func] + [arg for arg in partial.args if callable(arg)] + targets
+    files = set()
+    pending = [inspect.getmodule(target) for target in targets]
+    while pending:
+        module = pending.pop()
+        path = getattr(module, '__file__', None)
+        if path is None or os.path.abspath(path) in files:
+            continue
+        here = os.path.dirname(os.path.abspath(path))
+        files.add(os.path.abspath(path))
+        for value in vars(module).values():
+            dep = value if inspect.ismodule(value) else inspect.getmodule(value)
+            dep_path = getattr(dep, '__file__', None)
+            if dep_path and os.path.dirname(os.path.abspath(dep_path)) == here:
+                pending.append(dep)
+    return sorted(files)
+
+
+def code_version(func):
+    """策略代码版本：相关源码文件内容的哈希，改动策略或其依赖的本目录模块后缓存自动失效"""
+    h = hashlib.sha1()
+    for path in _source_files(func):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def columns_fingerprint(columns):
+    """列字典 (K线 + 指标) 的数据指纹"""
+    h = hashlib.sha1()
+    for key in sorted(columns):
+        values = np.ascontiguousarray(columns[key])
+        h.update(f"{key}:{values.dtype.str}:{values.shape}".encode())
+        h.update(values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def cache_key(strategy, params, fingerprint, version):
+    text = canonical_params({'strategy': strategy, 'params': params, 'data': fingerprint, 'code': version})
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    回测结果缓存：键为 (策略名, 代码版本, 完整参数, 数据指纹) 的哈希，值为评估函数的返回值 (指标/交易列表，pickle 存盘)
+    同样的输入再跑一次直接返回；参数扫描只计算缓存里没有的点
+    目录总大小超过 max_bytes 时按最近使用时间淘汰 (命中会刷新文件的修改时间)
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pkl')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, evict=True):
+        """写入一个条目；批量写入时传 evict=False，写完后再调用一次 evict() (每次淘汰都要遍历整个缓存目录)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，多个进程同时写同一个键也不会读到半个文件
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        if evict:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.pkl'):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """超过容量时删除最久未使用的条目，返回删除的条目数"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def call(self, strategy, func, params, fingerprint, version=None):
+        """func(**params) 的带缓存调用"""
+        key = cache_key(strategy, params, fingerprint, version or code_version(func))
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func(**params)
+            self.put(key, value)
+        return value
+
+    def run_all(self, strategy, evaluate, columns, param_list, processes=None, on_result=None, fingerprint=None):
+        """
+        SweepRunner.run_all 的带缓存版本：命中的参数直接取结果，只把缺失的点交给进程池
+        :return: 与 param_list 同顺序的结果列表
+        """
+        param_list = list(param_list)
+        fingerprint = fingerprint or columns_fingerprint(columns)
+        version = code_version(evaluate)
+        keys = [cache_key(strategy, params, fingerprint, version) for params in param_list]
+        results = [self.get(key, _MISSING) for key in keys]
+        missing = [n for n, res in enumerate(results) if res is _MISSING]
+
+        if on_result:
+            for params, res in zip(param_list, results):
+                if res is not _MISSING:
+                    on_result(params, res)
+
+        computed = SweepRunner(columns, evaluate, processes).run_all([param_list[n] for n in missing], on_result)
+        for n, res in zip(missing, computed):
+            self.put(keys[n], res, evict=False)
+            results[n] = res
+        if missing:
+            self.evict()
+        return results
@@ -0,0 +1,251 @@
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backtest_results.sqlite')
+
+# 逐笔交易的列；amount 用 NUMERIC，整数注码原样存为整数 (导出 CSV 时与原来一致)
+TRADE_COLUMNS = (
+    ('seq', 'INTEGER'), ('time', 'TEXT'), ('ts', 'INTEGER'), ('side', 'TEXT'), ('price', 'REAL'),
+    ('amount', 'NUMERIC'), ('rsi', 'REAL'), ('avg_amp', 'REAL'), ('regime', 'TEXT'), ('result', 'TEXT'),
+    ('profit', 'REAL'), ('day', 'TEXT'), ('day_pnl', 'REAL'), ('active', 'INTEGER'), ('stop_hit', 'INTEGER'),
+    ('exit_time', 'TEXT'), ('exit_price', 'REAL'), ('extra', 'TEXT'),
+)
+DAILY_COLUMNS = (('day', 'TEXT'), ('trades', 'INTEGER'), ('wins', 'INTEGER'), ('profit', 'REAL'),
+                 ('stopped', 'INTEGER'))
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    data_fingerprint TEXT,
+    metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    {', '.join(f'{name} {kind}' for name, kind in TRADE_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS daily (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    {', '.join(f'{name} {kind}' for name, kind in DAILY_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_runs_strategy ON runs(strategy, data_fingerprint);
+CREATE INDEX IF NOT EXISTS idx_trades_run ON trades(run_id, seq);
+CREATE INDEX IF NOT EXISTS idx_trades_outcome ON trades(side, result, regime);
+CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades(ts);
+CREATE INDEX IF NOT EXISTS idx_daily_run ON daily(run_id, day);
+"""
+
+# trades() 支持的等值筛选条件 -> 列名
+TRADE_FILTERS = {'side': 't.side', 'result': 't.result', 'regime': 't.regime', 'strategy': 'r.strategy',
+                 'data_fingerprint': 'r.data_fingerprint'}
+
+
+def canonical_params(params):
+    """参数字典 -> 稳定的 JSON 文本 (键排序，numpy 标量转成 Python 数值)"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=_to_python)
+
+
+def _to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法序列化: {type(value)}")
+
+
+def _column_values(values, n):
+    """列数据 -> 逐行 Python 值 (None 表示缺失)；标量广播到 n 行"""
+    if values is None:
+        return [None] * n
+    if np.isscalar(values) or isinstance(values, str):
+        return [values] * n
+    arr = np.asarray(values)
+    if arr.dtype.kind == 'f':
+        return [None if v != v else v for v in arr.tolist()]
+    if arr.dtype.kind == 'b':
+        return [int(v) for v in arr.tolist()]
+    return arr.tolist()
+
+
+class ResultStore:
+    """
+    回测结果库 (SQLite)：每次运行一条 runs 记录 (策略名、参数、数据指纹、汇总指标)，
+    逐笔交易和逐日统计按 run_id 存表并建索引，跨运行的筛选直接用 SQL 完成；
+    文字报告/CSV 只在需要时从库里渲染
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_run(self, strategy, params, fingerprint=None, trades=None, daily=None, metrics=None):
+        """
+        写入一次运行
+        :param trades: dict of arrays，键为 TRADE_COLUMNS 中的列名 (缺的列记为空，seq 缺省为 0..n-1)
+        :param daily: dict of arrays，键为 DAILY_COLUMNS 中的列名
+        :return: run_id
+        """
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (created, strategy, params, data_fingerprint, metrics) VALUES (?, ?, ?, ?, ?)",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), strategy, canonical_params(params), fingerprint,
+                 canonical_params(metrics or {})))
+            run_id = cur.lastrowid
+            for table, columns, data in (('trades', TRADE_COLUMNS, trades), ('daily', DAILY_COLUMNS, daily)):
+                if not data:
+                    continue
+                unknown = set(data) - {name for name, _ in columns}
+                if unknown:
+                    raise ValueError(f"{table} 表没有这些列: {sorted(unknown)}")
+                n = max(len(np.atleast_1d(v)) for v in data.values() if not np.isscalar(v))
+                if table == 'trades' and 'seq' not in data:
+                    data = dict(data, seq=np.arange(n))
+                names = [name for name, _ in columns if name in data]
+                rows = zip(*[_column_values(data[name], n) for name in names])
+                self.conn.executemany(
+                    f"INSERT INTO {table} (run_id, {', '.join(names)}) VALUES (?, {', '.join('?' * len(names))})",
+                    ((run_id, *row) for row in rows))
+        return run_id
+
+    def runs(self, strategy=None, fingerprint=None):
+        """列出运行记录 (新的在前)，params/metrics 已解析为字典"""
+        sql = "SELECT * FROM runs WHERE 1=1"
+        args = []
+        if strategy is not None:
+            sql += " AND strategy = ?"
+            args.append(strategy)
+        if fingerprint is not None:
+            sql += " AND data_fingerprint = ?"
+            args.append(fingerprint)
+        out = []
+        for row in self.conn.execute(sql + " ORDER BY run_id DESC", args):
+            run = dict(row)
+            run['params'] = json.loads(run['params'])
+            run['metrics'] = json.loads(run['metrics']) if run['metrics'] else {}
+            out.append(run)
+        return out
+
+    def latest_run(self, strategy):
+        runs = self.runs(strategy)
+        return runs[0]['run_id'] if runs else None
+
+    def trades(self, run_ids=None, where=None, args=(), **filters):
+        """
+        跨运行查询逐笔交易，返回 dict of arrays (含 run_id, strategy)
+        例如 store.trades(side='SHORT', result='LOSS', regime='quiet')
+        :param run_ids: 单个 run_id 或列表，None 为全部
+        :param where: 额外的 SQL 条件 (可引用 t.<列> / r.<列>)，参数放在 args
+        :param filters: TRADE_FILTERS 里的等值条件
+        """
+        sql = "SELECT t.*, r.strategy FROM trades t JOIN runs r ON r.run_id = t.run_id WHERE 1=1"
+        params = []
+        if run_ids is not None:
+            run_ids = [run_ids] if np.isscalar(run_ids) else list(run_ids)
+            sql += f" AND t.run_id IN ({', '.join('?' * len(run_ids))})"
+            params += run_ids
+        for key, value in filters.items():
+            if key not in TRADE_FILTERS:
+                raise ValueError(f"不支持的筛选条件: {key}")
+            sql += f" AND {TRADE_FILTERS[key]} = ?"
+            params.append(value)
+        if where:
+            sql += f" AND ({where})"
+            params += list(args)
+        rows = self.conn.execute(sql + " ORDER BY t.run_id, t.seq", params).fetchall()
+        names = ['run_id'] + [name for name, _ in TRADE_COLUMNS] + ['strategy']
+        return {name: np.array([row[name] for row in rows]) for name in names}
+
+    def daily(self, run_id):
+        rows = self.conn.execute("SELECT * FROM daily WHERE run_id = ? ORDER BY day", (run_id,)).fetchall()
+        return {name: np.array([row[name] for row in rows]) for name, _ in DAILY_COLUMNS}
+
+    def delete_run(self, run_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def _trade_rows(self, run_id):
+        return self.conn.execute("SELECT * FROM trades WHERE run_id = ? ORDER BY seq", (run_id,))
+
+    def export_csv(self, run_id, path):
+        """
+        按 DailyAnalysis 原来的 backtest_details.csv 格式导出 (analyze_csv.py 可直接读取)
+        触发日止损的那笔后面跟一行 STOP
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("Time,Type,Price,Amount,RSI,ActiveTrades,Result,Profit,DayPnL\n")
+            for row in self._trade_rows(run_id):
+                f.write(f"{row['time']},{row['side']},{row['price']},{row['amount']},{row['rsi']:.2f},{row['active']},{row['result']},{row['profit']:.2f},{row['day_pnl']:.2f}\n")
+                if row['stop_hit']:
+                    f.write(f"{row['time']},STOP,0,0,0,0,STOPPED,0,{row['day_pnl']:.2f}\n")
+        return path
+
+    def report_lines(self, run_id):
+        """逐行生成一次运行的文字报告 (生成器，按需渲染，不预先写文件)"""
+        run = self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if run is None:
+            raise ValueError(f"没有这个 run_id: {run_id}")
+        yield "=" * 80
+        yield f"回测记录 #{run_id} - {run['strategy']}"
+        yield f"运行时间: {run['created']} | 数据指纹: {run['data_fingerprint']}"
+        yield f"参数: {run['params']}"
+        yield f"指标: {run['metrics']}"
+        yield "=" * 80
+        for row in self._trade_rows(run_id):
+            result = "✅ 胜" if row['result'] == 'WIN' else "❌ 负"
+            yield ""
+            yield f"交易 #{row['seq'] + 1} - {row['side']} {result}"
+            yield f"  入场: {row['time']} @ {row['price']}" + (f" | 注码 {row['amount']}U" if row['amount'] is not None else "")
+            if row['exit_time'] is not None:
+                yield f"  出场: {row['exit_time']} @ {row['exit_price']}"
+            if row['rsi'] is not None:
+                yield f"  RSI: {row['rsi']:.2f}" + (f" | 行情: {row['regime']}" if row['regime'] else "")
+            yield f"  盈亏: {row['profit']:+.2f}" + (f" | 当日累计: {row['day_pnl']:+.2f}" if row['day_pnl'] is not None else "")
+            if row['extra']:
+                for key, value in json.loads(row['extra']).items():
+                    yield f"  {key}: {value}"
+            if row['stop_hit']:
+                yield "  ⛔ 触发当日止损"
+
+    def write_report(self, run_id, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.report_lines(run_id):
+                f.write(line + "\n")
+        return path
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB
+    if not os.path.exists(path):
+        print(f"❌ 找不到结果库 {path} (先运行 daily_analysis.py 等回测脚本)")
+        sys.exit(1)
+    with ResultStore(path) as store:
+        print(f"{'RUN':<5} | {'时间':<19} | {'策略':<16} | {'数据指纹':<16} | {'指标'}")
+        for run in store.runs()[:20]:
+            print(f"{run['run_id']:<5} | {run['created']:<19} | {run['strategy']:<16} | {str(run['data_fingerprint']):<16} | {run['metrics']}")
+
+        t = store.trades(side='SHORT', result='LOSS', regime='quiet')
+        print(f"\n安静行情下亏损的做空 (全部运行): {len(t['run_id'])} 笔, 合计 {sum(t['profit']):+.2f}U")
+        for run_id in np.unique(t['run_id']).tolist():
+            sel = t['run_id'] == run_id
+            print(f"  run #{run_id}: {int(sel.sum())} 笔 | 平均 RSI {np.mean(t['rsi'][sel].astype(float)):.1f}")
@@ -0,0 +1,184 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_avg_amp, calc_rsi, calc_bollinger
+
+# 下单接口 timeIncrements 支持的结算周期 (1m K线根数)
+HORIZONS = (1, 5, 10, 30, 60)
+# 常见的 payoutRatio 档位
+PAYOUTS = (0.7, 0.75, 0.8, 0.85, 0.9)
+
+
+def band_touch_price(open_, entry_idx, side_long, upper, lower):
+    """
+    布林带触碰入场价 (与 bb_optimizer 一致)：
+    做多 min(open[i], lower[i-1])，做空 max(open[i], upper[i-1])
+    """
+    o = open_[entry_idx]
+    return np.where(side_long, np.minimum(o, lower[entry_idx - 1]), np.maximum(o, upper[entry_idx - 1]))
+
+
+class SettlementMatrix:
+    """
+    事件合约的前向结算矩阵
+
+    对每根K线 i 和每个结算周期 h 预先算好结算价 settle[h, i] (第 i+h 根K线的价格)，
+    以及相对入场价 (open[i] / close[i]) 的涨跌符号 sign[h, i] (+1 涨, -1 跌, 0 平)。
+    任意一组信号只需一次 gather + 归约，就能得到所有 周期 × 赔率 组合的期望收益曲面。
+    平价按输处理，与各回测脚本里严格的 > / < 判断一致。
+    """
+
+    def __init__(self, arrays, horizons=HORIZONS, settle='open'):
+        """
+        :param arrays: KlineArrays
+        :param horizons: 结算周期 (K线根数)
+        :param settle: 结算价取法 'open' (第 i+h 根开盘价) | 'close' | 'mid' ((open+close)/2)
+        """
+        self.arrays = arrays
+        self.horizons = np.asarray(horizons, dtype=np.int64)
+        self.settle_mode = settle
+        n = len(arrays)
+
+        if settle == 'open':
+            price = arrays.open
+        elif settle == 'close':
+            price = arrays.close
+        elif settle == 'mid':
+            price = (arrays.open + arrays.close) / 2
+        else:
+            raise ValueError(f"未知的结算价取法: {settle}")
+
+        # settle[h, i] = price[i + h]，越界为 NaN
+        self.settle = np.full((len(self.horizons), n), np.nan)
+        for row, h in enumerate(self.horizons.tolist()):
+            if h < n:
+                self.settle[row, :n - h] = price[h:]
+        self._signs = {}
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def valid(self, entry_idx):
+        """valid[h, t]: 第 t 笔信号在周期 h 内是否有结算K线"""
+        return (np.asarray(entry_idx)[None, :] + self.horizons[:, None]) < len(self)
+
+    def sign(self, entry='open'):
+        """全部K线按 open / close 入场时的涨跌符号矩阵 (int8)，按入场方式缓存"""
+        if entry not in self._signs:
+            if entry == 'open':
+                base = self.arrays.open
+            elif entry == 'close':
+                base = self.arrays.close
+            else:
+                raise ValueError(f"未知的入场价取法: {entry}")
+            with np.errstate(invalid='ignore'):
+                self._signs[entry] = np.sign(self.settle - base[None, :]).astype(np.int8)
+        return self._signs[entry]
+
+    def outcomes(self, entry_idx, side_long, entry='open'):
+        """
+        信号的输赢矩阵
+        :param entry: 'open' | 'close' 使用预计算的符号矩阵；
+                      也可以传入与 entry_idx 等长的入场价数组 (例如 band_touch_price 的结果)
+        :return: (win, valid)，形状都是 (周期数, 信号数)
+        """
+        entry_idx = np.asarray(entry_idx, dtype=np.int64)
+        direction = np.where(side_long, 1, -1).astype(np.int8)
+        if isinstance(entry, str):
+            moved = self.sign(entry)[:, entry_idx]
+        else:
+            with np.errstate(invalid='ignore'):
+                moved = np.sign(self.settle[:, entry_idx] - np.asarray(entry, dtype=np.float64)[None, :])
+        valid = self.valid(entry_idx)
+        win = (moved * direction[None, :] > 0) & valid
+        return win, valid
+
+    def score(self, entry_idx, side_long, entry='open', payouts=PAYOUTS, amount=None):
+        """
+        给一组信号打分，返回 周期 × 赔率 的结果曲面
+        :param amount: 每笔下注金额 (标量或数组)，None 表示每笔 1U
+        :return: dict
+            horizons, payouts
+            trades, wins, win_rate (%): 每个周期一个值
+            breakeven (%): 每个赔率的保本胜率 1 / (1 + payout)
+            pnl: (周期, 赔率) 总盈亏
+            ev: (周期, 赔率) 每 1U 下注的期望收益
+        """
+        win, valid = self.outcomes(entry_idx, side_long, entry)
+        payouts = np.asarray(payouts, dtype=np.float64)
+        stake = np.broadcast_to(np.asarray(1.0 if amount is None else amount, dtype=np.float64),
+                                (len(entry_idx),))
+
+        trades = valid.sum(axis=1)
+        wins = win.sum(axis=1)
+        staked = valid @ stake
+        won = win @ stake
+        lost = staked - won
+        pnl = won[:, None] * payouts[None, :] - lost[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = np.where(trades > 0, wins / trades * 100, 0.0)
+            ev = np.where(staked[:, None] > 0, pnl / staked[:, None], 0.0)
+        return {
+            'horizons': self.horizons,
+            'payouts': payouts,
+            'trades': trades,
+            'wins': wins,
+            'win_rate': win_rate,
+            'breakeven': 100 / (1 + payouts),
+            'pnl': pnl,
+            'ev': ev,
+        }
+
+
+def format_surface(result, title=''):
+    """把 score() 的结果排成文本表：每行一个结算周期，每列一个赔率的每 U 期望收益"""
+    payouts = result['payouts'].tolist()
+    lines = []
+    if title:
+        lines.append(title)
+    header = f"{'周期':<6} | {'单量':<7} | {'胜率':<7} | " + " | ".join(f"EV@{p:<5}" for p in payouts)
+    lines.append(header)
+    lines.append("-" * len(header))
+    for row, h in enumerate(result['horizons'].tolist()):
+        cells = " | ".join(f"{v:+.4f} " for v in result['ev'][row].tolist())
+        lines.append(f"{str(h) + 'm':<6} | {int(result['trades'][row]):<7} | {result['win_rate'][row]:6.2f}% | {cells}")
+    lines.append("保本胜率: " + ", ".join(f"{p}: {b:.2f}%" for p, b in zip(payouts, result['breakeven'].tolist())))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    # RSI 均值回归信号 (与 daily_analysis 相同：09:00-20:00，上一根 RSI <25 做多 / >75 做空，过滤巨型K线)
+    rsi = calc_rsi(arr.close, 14)
+    _, upper, lower = calc_bollinger(arr.close, 20, 2)
+    avg_amp = calc_avg_amp(arr.high, arr.low, 20)
+    prev_amp = np.r_[np.nan, (arr.high - arr.low)[:-1]]
+    prev_rsi = np.r_[np.nan, rsi[:-1]]
+    bar = np.arange(len(arr))
+    hour = arr.hour
+    candidate = (bar >= 100) & (hour >= 9) & (hour < 20) & ~np.isnan(prev_rsi)
+    candidate &= ~((avg_amp > 0) & (prev_amp > 3 * avg_amp) & (prev_amp > 15.0))
+    is_long = candidate & (prev_rsi < 25)
+    is_short = candidate & ~is_long & (prev_rsi > 75)
+    entry_idx = np.flatnonzero(is_long | is_short)
+    side_long = is_long[entry_idx]
+
+    matrix = SettlementMatrix(arr)
+    print(format_surface(matrix.score(entry_idx, side_long, 'open'), "\n📊 RSI 信号 | 开盘价入场"))
+    print(format_surface(matrix.score(entry_idx, side_long, 'close'), "\n📊 RSI 信号 | 收盘价入场"))
+
+    # 布林带触碰入场：只保留当根K线真正触及上一根布林带的信号
+    touched = np.where(side_long, arr.low[entry_idx] <= lower[entry_idx - 1], arr.high[entry_idx] >= upper[entry_idx - 1])
+    touch_idx = entry_idx[touched]
+    touch_long = side_long[touched]
+    touch_price = band_touch_price(arr.open, touch_idx, touch_long, upper, lower)
+    print(format_surface(matrix.score(touch_idx, touch_long, touch_price), "\n📊 RSI 信号 | 布林带触碰价入场"))
@@ -0,0 +1,350 @@
+import itertools
+import os
+import re
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_avg_amp, calc_rsi, calc_bollinger
+from settlement_matrix import SettlementMatrix
+
+# 每个字节中 1 的个数
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class BitMask:
+    """按位压缩的K线布尔掩码 (每根K线 1 bit)，组合条件只做字节级 AND/OR"""
+
+    def __init__(self, packed, n):
+        self.packed = packed
+        self.n = n
+
+    @classmethod
+    def from_bool(cls, mask):
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask, bitorder='little'), len(mask))
+
+    @classmethod
+    def full(cls, n, value=True):
+        return cls.from_bool(np.full(n, value, dtype=bool))
+
+    def __and__(self, other):
+        return BitMask(self.packed & other.packed, self.n)
+
+    def __or__(self, other):
+        return BitMask(self.packed | other.packed, self.n)
+
+    def __xor__(self, other):
+        return BitMask(self.packed ^ other.packed, self.n)
+
+    def __invert__(self):
+        packed = ~self.packed
+        tail = self.n % 8
+        if tail:
+            # 末尾多出来的填充位保持为 0，否则计数会出错
+            packed[-1] &= (1 << tail) - 1
+        return BitMask(packed, self.n)
+
+    def count(self):
+        return int(_POPCOUNT[self.packed].sum())
+
+    def to_bool(self):
+        return np.unpackbits(self.packed, count=self.n, bitorder='little').astype(bool)
+
+    def indices(self):
+        return np.flatnonzero(self.to_bool())
+
+
+_TOKEN = re.compile(r'\s*(?:(\d+(?:\.\d+)?)|(\.\.)|(<=|>=|==|!=|<|>)|([&|!()])|([A-Za-z_]\w*))')
+
+
+def tokenize(expr):
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"无法解析的表达式: {expr!r} (位置 {pos})")
+        number, dots, compare, symbol, name = m.groups()
+        if number is not None:
+            tokens.append(('num', float(number)))
+        elif dots:
+            tokens.append(('..', dots))
+        elif compare:
+            tokens.append(('cmp', compare))
+        elif symbol:
+            tokens.append((symbol, symbol))
+        else:
+            tokens.append(('name', name))
+        pos = m.end()
+    return tokens
+
+
+class SignalAlgebra:
+    """
+    条件表达式 -> BitMask
+
+    语法 (优先级 ! > & > |，可用括号)：
+        rsi14<25 & bb_touch_lower & hour_utc in 0..8 & !giant
+    - 比较: 特征 <|<=|>|>=|==|!= 数值
+    - 区间: 特征 in a..b，左闭右开 [a, b)，与 backtest_complex 的 time_ranges 一致
+    - 标志: 直接写名字，例如 giant
+    每个原子条件只计算一次并缓存，之后所有组合都在压缩位图上完成
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.features = {}
+        self.flags = {}
+        self.resolvers = []
+        self._atoms = {}
+        self._exprs = {}
+        # (做多成交价, 做空成交价)，由 default_algebra 按布林带触碰口径填充
+        self.band_fill = None
+
+    def add_feature(self, name, values):
+        self.features[name] = np.asarray(values, dtype=np.float64)
+
+    def add_flag(self, name, mask):
+        self.flags[name] = BitMask.from_bool(mask)
+
+    def add_resolver(self, pattern, build):
+        """按名字模式动态生成特征，例如 rsi(\\d+) -> 任意周期的 RSI"""
+        self.resolvers.append((re.compile(pattern), build))
+
+    def feature(self, name):
+        if name not in self.features:
+            for pattern, build in self.resolvers:
+                m = pattern.fullmatch(name)
+                if m:
+                    self.add_feature(name, build(*m.groups()))
+                    break
+            else:
+                raise ValueError(f"未知的特征: {name}")
+        return self.features[name]
+
+    def atom(self, name, op=None, a=None, b=None):
+        key = (name, op, a, b)
+        if key not in self._atoms:
+            if op is None:
+                if name not in self.flags:
+                    raise ValueError(f"未知的标志: {name}")
+                self._atoms[key] = self.flags[name]
+            else:
+                v = self.feature(name)
+                with np.errstate(invalid='ignore'):
+                    if op == 'in':
+                        mask = (v >= a) & (v < b)
+                    elif op == '<':
+                        mask = v < a
+                    elif op == '<=':
+                        mask = v <= a
+                    elif op == '>':
+                        mask = v > a
+                    elif op == '>=':
+                        mask = v >= a
+                    elif op == '==':
+                        mask = v == a
+                    else:
+                        mask = v != a
+                self._atoms[key] = BitMask.from_bool(mask)
+        return self._atoms[key]
+
+    def compile(self, expr):
+        if expr not in self._exprs:
+            tokens = tokenize(expr)
+            result, pos = self._parse_or(tokens, 0)
+            if pos != len(tokens):
+                raise ValueError(f"表达式多余的内容: {expr!r}")
+            self._exprs[expr] = result
+        return self._exprs[expr]
+
+    def _parse_or(self, tokens, pos):
+        left, pos = self._parse_and(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] == '|':
+            right, pos = self._parse_and(tokens, pos + 1)
+            left = left | right
+        return left, pos
+
+    def _parse_and(self, tokens, pos):
+        left, pos = self._parse_not(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] == '&':
+            right, pos = self._parse_not(tokens, pos + 1)
+            left = left & right
+        return left, pos
+
+    def _parse_not(self, tokens, pos):
+        if pos >= len(tokens):
+            raise ValueError("表达式不完整")
+        kind = tokens[pos][0]
+        if kind == '!':
+            inner, pos = self._parse_not(tokens, pos + 1)
+            return ~inner, pos
+        if kind == '(':
+            inner, pos = self._parse_or(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos][0] != ')':
+                raise ValueError("括号不匹配")
+            return inner, pos + 1
+        if kind != 'name':
+            raise ValueError(f"此处需要条件名: {tokens[pos][1]}")
+        name = tokens[pos][1]
+        pos += 1
+        if pos < len(tokens) and tokens[pos][0] == 'cmp':
+            op = tokens[pos][1]
+            if pos + 1 >= len(tokens) or tokens[pos + 1][0] != 'num':
+                raise ValueError(f"{name} {op} 之后需要数值")
+            return self.atom(name, op, tokens[pos + 1][1]), pos + 2
+        if pos < len(tokens) and tokens[pos] == ('name', 'in'):
+            if (pos + 3 >= len(tokens) or tokens[pos + 1][0] != 'num'
+                    or tokens[pos + 2][0] != '..' or tokens[pos + 3][0] != 'num'):
+                raise ValueError(f"{name} in 之后需要 a..b")
+            return self.atom(name, 'in', tokens[pos + 1][1], tokens[pos + 3][1]), pos + 4
+        return self.atom(name), pos
+
+
+def default_algebra(arrays, bb_period=20, bb_std=2, warmup=101):
+    """
+    标准条件集 (与 backtest_complex 的口径一致，所有指标都取上一根K线)：
+        rsiN            上一根K线的 RSI(N)
+        hour_utc        当前K线的小时
+        weekday         星期几，周一=0
+        prev_amp        上一根K线振幅
+        avg_amp         上一根K线之前20根的平均振幅
+        bb_touch_lower  当前 low <= 上一根布林下轨
+        bb_touch_upper  当前 high >= 上一根布林上轨
+        giant           上一根振幅 > 3 倍平均振幅 (巨型K线)
+        valid           回测循环覆盖的K线：warmup 之后，RSI/布林带已就绪
+    """
+    n = len(arrays)
+    algebra = SignalAlgebra(n)
+    prev = lambda values: np.r_[np.nan, values[:-1]]
+
+    rsi14 = calc_rsi(arrays.close, 14)
+    algebra.add_feature('rsi14', prev(rsi14))
+    algebra.add_resolver(r'rsi(\d+)', lambda period: prev(calc_rsi(arrays.close, int(period))))
+
+    _, upper, lower = calc_bollinger(arrays.close, bb_period, bb_std)
+    amp = arrays.high - arrays.low
+    avg_amp = prev(calc_avg_amp(arrays.high, arrays.low, 20))
+    prev_amp = prev(amp)
+    algebra.add_feature('hour_utc', arrays.hour)
+    algebra.add_feature('weekday', arrays.weekday)
+    algebra.add_feature('prev_amp', prev_amp)
+    algebra.add_feature('avg_amp', avg_amp)
+
+    prev_lower = prev(lower)
+    prev_upper = prev(upper)
+    with np.errstate(invalid='ignore'):
+        algebra.add_flag('bb_touch_lower', arrays.low <= prev_lower)
+        algebra.add_flag('bb_touch_upper', arrays.high >= prev_upper)
+        algebra.add_flag('giant', (avg_amp > 0) & (prev_amp > 3 * avg_amp))
+    algebra.add_flag('valid', (np.arange(n) >= warmup) & ~np.isnan(rsi14) & ~np.isnan(lower))
+
+    # 布林带触碰成交价 (做多 min(open, 下轨)，做空 max(open, 上轨))
+    algebra.band_fill = (np.fmin(arrays.open, prev_lower), np.fmax(arrays.open, prev_upper))
+    return algebra
+
+
+class SignalSearch:
+    """
+    用位图给成千上万个条件组合打分
+
+    每根K线做多/做空在 horizon 根之后是否获胜，按入场方式 ('open' 开盘价 / 'band' 布林带触碰价)
+    预先压缩成位图；一个组合的胜场数 = popcount(信号 & 获胜位图)，不再逐根模拟
+    """
+
+    def __init__(self, arrays, algebra=None, horizon=10, payout=0.8, settle='open'):
+        self.arrays = arrays
+        self.algebra = algebra or default_algebra(arrays)
+        self.horizon = horizon
+        self.payout = payout
+        n = len(arrays)
+        self.universe = self.algebra.compile('valid') & BitMask.from_bool(np.arange(n) < n - horizon)
+
+        matrix = SettlementMatrix(arrays, horizons=(horizon,), settle=settle)
+        bars = np.arange(n)
+        long_side = np.ones(n, dtype=bool)
+        self.outcomes = {}
+        for entry, prices in (('open', ('open', 'open')), ('band', self.algebra.band_fill)):
+            win_long, _ = matrix.outcomes(bars, long_side, prices[0])
+            win_short, _ = matrix.outcomes(bars, ~long_side, prices[1])
+            self.outcomes[entry] = (BitMask.from_bool(win_long[0]), BitMask.from_bool(win_short[0]))
+
+    def signals(self, long_expr, short_expr=None):
+        """做多/做空位图；同一根K线两边都满足时做多优先 (与 if/elif 一致)"""
+        long_mask = self.algebra.compile(long_expr) & self.universe
+        if short_expr is None:
+            return long_mask, BitMask.full(self.algebra.n, False)
+        short_mask = self.algebra.compile(short_expr) & self.universe & ~long_mask
+        return long_mask, short_mask
+
+    def score(self, long_expr, short_expr=None, entry='open'):
+        long_mask, short_mask = self.signals(long_expr, short_expr)
+        win_long, win_short = self.outcomes[entry]
+        trades = long_mask.count() + short_mask.count()
+        wins = (long_mask & win_long).count() + (short_mask & win_short).count()
+        profit = wins * self.payout - (trades - wins)
+        return {
+            'long': long_expr,
+            'short': short_expr,
+            'entry': entry,
+            'trades': trades,
+            'wins': wins,
+            'win_rate': wins / trades * 100 if trades else 0,
+            'profit': profit,
+            'ev': profit / trades if trades else 0,
+        }
+
+    def search(self, rules, min_trades=1):
+        """rules: 可迭代的 (long_expr, short_expr, entry)，返回按 EV 从高到低排序的结果"""
+        results = [self.score(*rule) for rule in rules]
+        results = [r for r in results if r['trades'] >= min_trades]
+        results.sort(key=lambda r: r['ev'], reverse=True)
+        return results
+
+
+def rsi_band_rules(rsi_levels, windows, periods=(14,)):
+    """
+    RSI 极值 × 时间窗口 × 布林带确认 × 巨型K线过滤 的全部组合
+    :param rsi_levels: [(低, 高), ...]
+    :param windows: [None 或 (开始小时, 结束小时), ...]
+    """
+    for period, (low, high), window, bb_confirm, avoid_news in itertools.product(
+            periods, rsi_levels, windows, (False, True), (False, True)):
+        long_parts = [f"rsi{period}<{low}"]
+        short_parts = [f"rsi{period}>{high}"]
+        if bb_confirm:
+            long_parts.append('bb_touch_lower')
+            short_parts.append('bb_touch_upper')
+        if window:
+            long_parts.append(f"hour_utc in {window[0]}..{window[1]}")
+            short_parts.append(f"hour_utc in {window[0]}..{window[1]}")
+        if avoid_news:
+            long_parts.append('!giant')
+            short_parts.append('!giant')
+        yield ' & '.join(long_parts), ' & '.join(short_parts), 'band' if bb_confirm else 'open'
+
+
+if __name__ == "__main__":
+    import time
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    search = SignalSearch(arr)
+    start = time.time()
+    rsi_levels = [(low, 100 - low) for low in range(10, 36, 1)]
+    windows = [None] + [(s, e) for s in range(0, 24, 2) for e in range(s + 2, 25, 2)]
+    results = search.search(rsi_band_rules(rsi_levels, windows, periods=(7, 14, 21)), min_trades=50)
+    print(f"\n🔍 评估了 {len(rsi_levels) * len(windows) * 4 * 3} 个组合，用时 {time.time() - start:.2f}s")
+
+    print(f"{'做多条件':<60} | {'入场':<5} | {'交易数':<6} | {'胜率':<7} | {'EV'}")
+    print("-" * 100)
+    for r in results[:20]:
+        print(f"{r['long']:<60} | {r['entry']:<5} | {r['trades']:<6} | {r['win_rate']:6.2f}% | {r['ev']:+.4f}")
@@ -0,0 +1,245 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, calc_avg_amp, calc_rsi, calc_bollinger
+from settlement_matrix import SettlementMatrix
+from trading_day import trading_day_ids, limit_concurrent, apply_daily_stop
+
+
+def build_signal_table(arrays, rsi, avg_amp, bb_lower, bb_upper, hours=(9, 20), long_below=30, short_above=70,
+                       giant_floor=15.0, quiet_threshold=None, entry='band', settle='open', horizon=10,
+                       start=100, day_start_hour=9, giant_mult=3.0):
+    """
+    候选信号表：只扫描一次K线，把所有候选信号和结算结果存成紧凑的列数组，
+    之后任何注码规则都只在这张表 (几千行) 上计算
+
+    与各回测脚本口径一致，指标都取上一根K线 (rsi/avg_amp/布林带传入的是每根K线自己的值)：
+    - 时间窗口 hours=(开始, 结束)，左闭右开
+    - 巨型K线: 上一根振幅 > giant_mult * avg_amp (默认 3 倍) 且 > giant_floor (giant_floor=0 即不设绝对下限)
+    - 上一根 RSI < long_below 做多，否则 RSI > short_above 做空 (取最宽的阈值，分级由注码规则决定)
+    - entry: 'band' 布林带触碰价 min(open, 下轨)/max(open, 上轨)，'open' 开盘价
+    - settle: 第 i+horizon 根K线的 'open' 或 'mid' ((open+close)/2)
+
+    :return: dict of arrays (每行一个信号)
+        index, day, long, rsi, avg_amp, quiet, touch, entry_price, settle_price, is_win
+    """
+    n = len(arrays)
+    prev = lambda values: np.r_[np.nan, np.asarray(values, dtype=np.float64)[:-1]]
+    prev_rsi = prev(rsi)
+    prev_amp_avg = prev(avg_amp)
+    prev_lower = prev(bb_lower)
+    prev_upper = prev(bb_upper)
+    prev_amp = prev(arrays.high - arrays.low)
+
+    bar = np.arange(n)
+    hour = arrays.hour
+    candidate = (bar >= start) & (bar < n - horizon) & (hour >= hours[0]) & (hour < hours[1])
+    candidate &= ~np.isnan(prev_rsi) & ~np.isnan(prev_lower)
+    candidate &= ~((prev_amp_avg > 0) & (prev_amp > giant_mult * prev_amp_avg) & (prev_amp > giant_floor))
+
+    is_long = candidate & (prev_rsi < long_below)
+    is_short = candidate & ~is_long & (prev_rsi > short_above)
+    index = np.flatnonzero(is_long | is_short)
+    side_long = is_long[index]
+
+    if entry == 'band':
+        entry_price = np.where(side_long, np.minimum(arrays.open[index], prev_lower[index]),
+                               np.maximum(arrays.open[index], prev_upper[index]))
+    elif entry == 'open':
+        entry_price = arrays.open[index]
+    else:
+        raise ValueError(f"未知的入场价取法: {entry}")
+
+    matrix = SettlementMatrix(arrays, horizons=(horizon,), settle=settle)
+    win, _ = matrix.outcomes(index, side_long, entry_price)
+    quiet = np.zeros(len(index), dtype=bool) if quiet_threshold is None else prev_amp_avg[index] < quiet_threshold
+
+    return {
+        'index': index,
+        'day': trading_day_ids(arrays.ts, day_start_hour)[index],
+        'long': side_long,
+        'rsi': prev_rsi[index],
+        'avg_amp': prev_amp_avg[index],
+        'quiet': quiet,
+        'touch': np.where(side_long, arrays.low[index] <= prev_lower[index], arrays.high[index] >= prev_upper[index]),
+        'entry_price': entry_price,
+        'settle_price': matrix.settle[0][index],
+        'is_win': win[0],
+    }
+
+
+def take(table, mask):
+    """按行筛选信号表"""
+    return {key: values[mask] for key, values in table.items()}
+
+
+# ---------------- 注码规则：每个函数返回每行的下注金额，0 表示不下单 ----------------
+
+def tiered_stake(table, long_levels=((20, 15), (25, 10)), short_levels=((80, 15), (75, 10)), require_touch=False):
+    """
+    RSI 分级注码 (TieredBacktest / Plan B)
+    long_levels: 做多 (RSI 上限, 金额)，从严到宽排列，命中的第一档生效
+    short_levels: 做空 (RSI 下限, 金额)
+    """
+    rsi = table['rsi']
+    long_amount = np.zeros(len(rsi))
+    short_amount = np.zeros(len(rsi))
+    for threshold, amount in reversed(long_levels):
+        long_amount = np.where(rsi < threshold, amount, long_amount)
+    for threshold, amount in reversed(short_levels):
+        short_amount = np.where(rsi > threshold, amount, short_amount)
+    stake = np.where(table['long'], long_amount, short_amount)
+    if require_touch:
+        stake = np.where(table['touch'], stake, 0.0)
+    return stake
+
+
+def dynamic_stake(table, quiet_levels=(((25, 15), (30, 10)), ((75, 15), (70, 10))),
+                  normal_levels=(((20, 15), (25, 10)), ((80, 15), (75, 10))), require_touch=False):
+    """Dynamic C：安静行情 (quiet) 与正常行情各用一套 (做多档位, 做空档位)"""
+    quiet = tiered_stake(table, quiet_levels[0], quiet_levels[1], require_touch)
+    normal = tiered_stake(table, normal_levels[0], normal_levels[1], require_touch)
+    return np.where(table['quiet'], quiet, normal)
+
+
+def flat_stake(table, amount=10.0, long_below=25, short_above=75, require_touch=False):
+    """固定注码"""
+    return tiered_stake(table, ((long_below, amount),), ((short_above, amount),), require_touch)
+
+
+def martingale_stake(table, stake, base_bet=5.0, target_profit=4.0, max_steps=5, bet_cap=250.0, payout=0.8):
+    """
+    马丁注码 (AsianSniperStrategy.run_simulation)：只对 stake > 0 的行下单，
+    输了下一笔下注 (本轮累计亏损 + 目标利润) / 赔率 (保留两位小数，不超过 bet_cap)，
+    赢了或连败 max_steps 笔后重置为 base_bet
+    与输赢序列有关，只能顺序计算，但只遍历已下单的几千行
+    """
+    rows = np.flatnonzero(np.asarray(stake) > 0)
+    out = np.zeros(len(stake))
+    step = 0
+    round_loss = 0.0
+    for row, is_win in zip(rows.tolist(), table['is_win'][rows].tolist()):
+        if step == 0:
+            bet = base_bet
+        else:
+            bet = round((round_loss + target_profit) / payout, 2)
+            if bet > bet_cap:
+                bet = bet_cap
+        out[row] = bet
+        if is_win:
+            step = 0
+            round_loss = 0.0
+        else:
+            round_loss += bet
+            step += 1
+            if step >= max_steps:
+                step = 0
+                round_loss = 0.0
+    return out
+
+
+def limit_active(table, stake, hold_bars=10, max_active=5):
+    """最大同时持仓限制，被拒绝的信号注码置 0"""
+    stake = np.asarray(stake, dtype=np.float64).copy()
+    rows = np.flatnonzero(stake > 0)
+    stake[rows[~limit_concurrent(table['index'][rows], hold_bars, max_active)]] = 0.0
+    return stake
+
+
+def daily_stop(table, stake, stop_loss_limit=-45.0, payout=0.8):
+    """
+    每日止损：当日累计盈亏触及 stop_loss_limit 后的信号注码置 0
+    :return: (stake, day_pnl, stop_hit)，day_pnl/stop_hit 与 stake 等长，未下单的行为 0/False
+    """
+    stake = np.asarray(stake, dtype=np.float64).copy()
+    rows = np.flatnonzero(stake > 0)
+    keep, day_pnl, stop_hit = apply_daily_stop(table['day'][rows], settle_pnl(take(table, rows), stake[rows], payout),
+                                               stop_loss_limit)
+    stake[rows[~keep]] = 0.0
+    full_pnl = np.zeros(len(stake))
+    full_pnl[rows] = day_pnl
+    full_stop = np.zeros(len(stake), dtype=bool)
+    full_stop[rows] = stop_hit & keep
+    return stake, full_pnl, full_stop
+
+
+def settle_pnl(table, stake, payout=0.8):
+    """每行盈亏：赢 stake * payout，输 -stake，未下单为 0"""
+    stake = np.asarray(stake, dtype=np.float64)
+    return np.where(table['is_win'], stake * payout, -stake) * (stake > 0)
+
+
+def equity_stats(pnl, initial=1000.0):
+    """资金曲线：最终余额、最大回撤；余额 <= 0 视为爆仓，之后的交易不再计入"""
+    # 从初始余额开始顺序累加，与逐笔 balance += pnl 的浮点结果一致
+    balance = np.cumsum(np.r_[initial, pnl])[1:]
+    bust = np.flatnonzero(balance <= 0)
+    if len(bust):
+        balance = balance[:bust[0] + 1]
+    if len(balance) == 0:
+        return {'final': initial, 'max_drawdown': 0, 'bust': False}
+    peak = np.maximum(np.maximum.accumulate(balance), initial)
+    drawdown = (peak - balance).max()
+    return {'final': balance[-1].item(), 'max_drawdown': max(drawdown.item(), 0), 'bust': bool(len(bust))}
+
+
+def summarize(table, stake, payout=0.8):
+    """汇总一种注码规则的结果，并按注码金额分组"""
+    stake = np.asarray(stake, dtype=np.float64)
+    placed = stake > 0
+    pnl = settle_pnl(table, stake, payout)
+    wins = placed & table['is_win']
+    tiers = {}
+    for amount in np.unique(stake[placed]).tolist():
+        sel = stake == amount
+        tiers[amount] = {
+            'trades': int(sel.sum()),
+            'wins': int((sel & wins).sum()),
+            'profit': pnl[sel].sum().item(),
+        }
+    trades = int(placed.sum())
+    return {
+        'trades': trades,
+        'wins': int(wins.sum()),
+        'win_rate': wins.sum() / trades * 100 if trades else 0,
+        'profit': pnl.sum().item(),
+        'staked': stake.sum().item(),
+        'tiers': tiers,
+        **equity_stats(pnl[placed]),
+    }
+
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    avg_amp = calc_avg_amp(arr.high, arr.low, 20)
+    _, upper, lower = calc_bollinger(arr.close, 20, 2)
+    p25 = np.percentile(avg_amp[20:], 25)
+    table = build_signal_table(arr, calc_rsi(arr.close, 14), avg_amp, lower, upper, hours=(1, 12),
+                               quiet_threshold=p25)
+    print(f"✅ 候选信号 {len(table['index'])} 条 (K线 {len(arr)} 根)")
+
+    tiered = tiered_stake(table)
+    policies = {
+        '固定10U (RSI 25/75)': flat_stake(table),
+        '固定10U + 触碰布林带': flat_stake(table, require_touch=True),
+        '分级 15U/10U': tiered,
+        '动态分级 (Dynamic C)': dynamic_stake(table),
+        '分级 + 最多5单': limit_active(table, tiered),
+        '分级 + 最多5单 + 日止损-45': daily_stop(table, limit_active(table, tiered))[0],
+        '马丁 (5U起, 目标4U, 5连败止损)': martingale_stake(table, flat_stake(table, require_touch=True)),
+    }
+
+    print(f"{'注码规则':<28} | {'单量':<6} | {'胜率':<7} | {'净利润':<10} | {'最大回撤':<9} | {'爆仓'}")
+    print("-" * 85)
+    for name, stake in policies.items():
+        s = summarize(table, stake)
+        print(f"{name:<28} | {s['trades']:<6} | {s['win_rate']:6.2f}% | {s['profit']:+9.2f}U | {s['max_drawdown']:8.2f}U | {'是' if s['bust'] else '否'}")
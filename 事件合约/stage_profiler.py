@@ -0,0 +1,181 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    阶段计时登记表：with TIMER.stage('load'): ... 或 @timed() 装饰函数
+    阶段可以嵌套，按路径 'run/indicators/calculate_rsi' 累计耗时和调用次数
+    只记录主线程 (子线程里的阶段直接执行，不计时)
+    """
+
+    def __init__(self):
+        self.totals = {}  # 路径 -> [秒, 次数]，按第一次进入的顺序
+        self.stack = []
+        self.main = threading.main_thread()
+
+    @contextmanager
+    def stage(self, name):
+        if threading.current_thread() is not self.main:
+            yield
+            return
+        self.stack.append(name)
+        path = '/'.join(self.stack)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stack.pop()
+            entry = self.totals.setdefault(path, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+    def timed(self, name=None):
+        """装饰器：函数的每次调用记为一个阶段 (默认用函数名)"""
+        def decorate(func):
+            label = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def current(self):
+        return '/'.join(self.stack)
+
+    def reset(self):
+        self.totals = {}
+        self.stack = []
+
+    def print_report(self, wall=None, file=None):
+        """按嵌套层次打印各阶段耗时；wall 为总耗时，用于计算占比和未计入阶段的部分"""
+        file = file or sys.stdout
+        top = sum(sec for path, (sec, _) in self.totals.items() if '/' not in path)
+        wall = wall or top
+        print(f"\n{'='*72}", file=file)
+        print(f"阶段耗时 (总计 {wall:.3f}s)", file=file)
+        print(f"{'阶段':<44} | {'耗时(s)':>9} | {'次数':>6} | {'占比':>6}", file=file)
+        print(f"{'-'*72}", file=file)
+        # 父阶段排在子阶段前面，同一层按第一次进入的顺序
+        order = {path: n for n, path in enumerate(self.totals)}
+        key = lambda path: [order.get('/'.join(path.split('/')[:d + 1]), 0) for d in range(path.count('/') + 1)]
+        for path in sorted(self.totals, key=key):
+            sec, calls = self.totals[path]
+            depth = path.count('/')
+            label = '  ' * depth + path.rsplit('/', 1)[-1]
+            print(f"{label:<44} | {sec:>9.3f} | {calls:>6} | {sec / wall * 100 if wall else 0:>5.1f}%", file=file)
+        if wall > top:
+            print(f"{'(未计入阶段)':<44} | {wall - top:>9.3f} | {'':>6} | {(wall - top) / wall * 100:>5.1f}%", file=file)
+
+
+TIMER = StageTimer()
+stage = TIMER.stage
+timed = TIMER.timed
+
+
+class StackSampler:
+    """
+    后台线程定时采样主线程的调用栈，累计成 collapsed stack 格式
+    ('阶段;文件:函数;文件:函数 次数'，flamegraph.pl / speedscope 可直接读取)
+    栈底加上当时所在的阶段路径，火焰图按阶段分组
+    """
+
+    def __init__(self, interval=0.005, timer=TIMER):
+        self.interval = interval
+        self.timer = timer
+        self.counts = Counter()
+        self.target = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.target)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.reverse()
+        stage_path = self.timer.current()
+        if stage_path:
+            names = [f"[{part}]" for part in stage_path.split('/')] + names
+        if names:
+            self.counts[';'.join(names)] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def profile_flag(argv=None):
+    """
+    从命令行参数中取出 --profile / --profile=输出文件.folded (会从 sys.argv 中移除，不影响脚本自己的参数)
+    :return: (是否启用, collapsed stack 输出文件或 None)
+    """
+    argv = sys.argv if argv is None else argv
+    enabled = False
+    folded = None
+    for arg in list(argv[1:]):
+        if arg == '--profile' or arg.startswith('--profile='):
+            enabled = True
+            folded = arg.split('=', 1)[1] if '=' in arg else folded
+            argv.remove(arg)
+    return enabled, folded
+
+
+def run_profiled(func, *args, top=25, **kwargs):
+    """
+    研究脚本的入口：命令行不带 --profile 时直接运行 func (阶段计时照常记录，开销可以忽略)；
+    带 --profile 时在 cProfile 下运行，结束后打印阶段耗时和按累计时间排序的前 top 个函数，
+    --profile=out.folded 另外采样调用栈写出 collapsed stack 文件 (画火焰图用)
+    """
+    enabled, folded = profile_flag()
+    if not enabled:
+        return func(*args, **kwargs)
+
+    sampler = StackSampler() if folded else None
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    if sampler:
+        sampler.start()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        if sampler:
+            sampler.stop()
+        wall = time.perf_counter() - t0
+        TIMER.print_report(wall)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative').print_stats(top)
+        print(f"\n{'='*72}\ncProfile 前 {top} 个函数 (按累计时间)\n{'='*72}")
+        print(out.getvalue().strip('\n'))
+        if sampler:
+            sampler.write(folded)
+            print(f"\n🔥 调用栈采样 {sum(sampler.counts.values())} 次，已写入 {folded} (flamegraph.pl / speedscope)")
@@ -1,6 +1,5 @@
 import json
 import os
-from datetime import datetime, timedelta
 import sys
 import numpy as np
 import pandas as pd
@@ -15,7 +14,15 @@ except ImportError:
     sys.path.append(os.path.join(os.getcwd(), '事件合约'))
     from wick_sniper_pro import WickSniperStrategyPro
 
+from kline_arrays import KlineArrays, column
+from trading_day import (trading_day_ids, limit_concurrent, apply_daily_stop,
+                         daily_stats, monthly_stats, month_labels)
+from incremental_backtest import (IncrementalBacktest, StreamingSimulator, dynamic_c_candidates,
+                                  inclusive_avg_amp, checkpoint_path)
+from stage_profiler import timed, run_profiled
+
 class StandardBacktest(WickSniperStrategyPro):
+    @timed()
     def run_standard_test(self):
         """
         Run the Standard Backtest using 'Dynamic C' Strategy.
@@ -56,134 +63,118 @@ class StandardBacktest(WickSniperStrategyPro):
         log_file = open(log_filename, 'w', encoding='utf-8')
         log_file.write("Time,Type,Price,Amount,RSI,Volatility,MarketState,Result,Profit,DayPnL\n")
         
-        # 5. Backtest Loop
-        trades = []
-        daily_stats = {} 
-        current_day_pnl = 0
-        is_stopped_today = False
-        active_trade_indices = []
-        
-        # Strategy Params (Dynamic C)
+        # 5. Backtest (vectorized signals, grouped daily stop)
+        klines = self.klines_1m
+        arr = KlineArrays.from_klines(klines)
+        rsi_col = column(klines, 'rsi')
+        amp_col = column(klines, 'avg_amp')
+        n = len(arr)
+
+        # Trading Day Logic (Starts at 09:00)
+        day_id = trading_day_ids(arr.ts, 9)
+        hour = arr.hour
+        bar = np.arange(n)
+        in_range = (bar >= 100) & (bar < n - 10)
+        in_window = in_range & (hour >= 9) & (hour < 20)
+
+        # === STRATEGY LOGIC (Dynamic C) ===
         # Quiet: Long < 30 (10U)/25 (15U), Short > 70 (10U)/75 (15U)
         # Normal: Long < 25 (10U)/20 (15U), Short > 75 (10U)/80 (15U)
-        
-        for i in range(100, len(self.klines_1m) - 10):
-            k = self.klines_1m[i]
-            prev_k = self.klines_1m[i-1]
-            
-            # Update Active Trades
-            active_trade_indices = [idx for idx in active_trade_indices if idx > i]
-            
-            # Date & Time Check
-            dt = datetime.strptime(k['datetime'], '%Y-%m-%d %H:%M:%S')
-            
-            # Trading Day Logic (Starts at 09:00)
-            if dt.hour < 9:
-                trading_day = (dt - timedelta(days=1)).strftime('%Y-%m-%d')
-            else:
-                trading_day = dt.strftime('%Y-%m-%d')
-                
-            if trading_day not in daily_stats:
-                daily_stats[trading_day] = {'profit': 0, 'trades': 0, 'wins': 0, 'stopped': False}
-                current_day_pnl = 0
-                is_stopped_today = False
-            
-            # Time Filter (09:00 - 20:00)
-            if not (9 <= dt.hour < 20):
-                continue
-                
-            # Stop Loss Check
-            if is_stopped_today:
-                continue
-                
-            # Max Trades Check
-            if len(active_trade_indices) >= 5:
-                continue
-                
-            # === STRATEGY LOGIC (Dynamic C) ===
-            if 'rsi' not in prev_k or 'avg_amp' not in prev_k: continue
-            
-            rsi = prev_k['rsi']
-            avg_amp = prev_k['avg_amp']
-            
-            # Giant Candle Check
-            prev_amp = prev_k['high'] - prev_k['low']
-            is_giant = False
-            if avg_amp > 0 and prev_amp > 3 * avg_amp and prev_amp > 15.0:
-                is_giant = True
-            
-            if is_giant: continue
-            
-            # Market State
-            is_quiet = avg_amp < p25
-            market_state = "Quiet" if is_quiet else "Normal"
-            
-            # Thresholds
-            if is_quiet:
-                long_th = 30; long_strong = 25
-                short_th = 70; short_strong = 75
-            else:
-                long_th = 25; long_strong = 20
-                short_th = 75; short_strong = 80
-                
-            signal = None
-            amount = 0
-            
-            if rsi < long_th:
-                signal = 'LONG'
-                amount = 15 if rsi < long_strong else 10
-            elif rsi > short_th:
-                signal = 'SHORT'
-                amount = 15 if rsi > short_strong else 10
-                
-            if signal:
-                # Execute Trade
-                active_trade_indices.append(i + 10)
-                
-                # Settlement (Simplified: Open of i+10)
-                settlement_k = self.klines_1m[i+10]
-                entry_price = k['open']
-                exit_price = settlement_k['open']
-                
-                is_win = False
-                if signal == 'LONG': is_win = exit_price > entry_price
-                else: is_win = exit_price < entry_price
-                
-                payout = amount * 0.8 if is_win else -amount
-                
-                # Update Stats
-                current_day_pnl += payout
-                daily_stats[trading_day]['profit'] += payout
-                daily_stats[trading_day]['trades'] += 1
-                if is_win: daily_stats[trading_day]['wins'] += 1
-                
-                # Log
-                res_str = "WIN" if is_win else "LOSS"
-                log_file.write(f"{k['datetime']},{signal},{entry_price},{amount},{rsi:.1f},{avg_amp:.2f},{market_state},{res_str},{payout:.1f},{current_day_pnl:.1f}\n")
-                
-                # Check Stop Loss
-                if current_day_pnl <= -45:
-                    is_stopped_today = True
-                    daily_stats[trading_day]['stopped'] = True
-                    log_file.write(f"{k['datetime']},STOP,0,0,0,0,STOPPED,STOP,0,{current_day_pnl:.1f}\n")
+        rsi = np.r_[np.nan, rsi_col[:-1]]
+        avg_amp = np.r_[np.nan, amp_col[:-1]]
+        prev_amp = np.r_[np.nan, (arr.high - arr.low)[:-1]]
+        is_giant = (avg_amp > 0) & (prev_amp > 3 * avg_amp) & (prev_amp > 15.0)
+        is_quiet = avg_amp < p25
+
+        long_th = np.where(is_quiet, 30, 25); long_strong = np.where(is_quiet, 25, 20)
+        short_th = np.where(is_quiet, 70, 75); short_strong = np.where(is_quiet, 75, 80)
+
+        candidate = in_window & ~np.isnan(rsi) & ~np.isnan(avg_amp) & ~is_giant
+        is_long = candidate & (rsi < long_th)
+        is_short = candidate & ~is_long & (rsi > short_th)
+        entry_idx = np.flatnonzero(is_long | is_short)
+
+        # Max Trades Check (10-bar holds never cross the 09:00 day boundary)
+        entry_idx = entry_idx[limit_concurrent(entry_idx, 10, 5)]
+
+        signal_long = is_long[entry_idx]
+        amount = np.where(signal_long,
+                          np.where(rsi[entry_idx] < long_strong[entry_idx], 15, 10),
+                          np.where(rsi[entry_idx] > short_strong[entry_idx], 15, 10))
+
+        # Settlement (Simplified: Open of i+10)
+        entry_price = arr.open[entry_idx]
+        exit_price = arr.open[entry_idx + 10]
+        is_win = np.where(signal_long, exit_price > entry_price, exit_price < entry_price)
+        payout = np.where(is_win, amount * 0.8, -amount)
+
+        # Check Stop Loss
+        trade_day = day_id[entry_idx]
+        keep, day_pnl, stop_hit = apply_daily_stop(trade_day, payout, -45)
+
+        # Log
+        for t in np.flatnonzero(keep).tolist():
+            i = int(entry_idx[t])
+            signal = 'LONG' if signal_long[t] else 'SHORT'
+            market_state = "Quiet" if is_quiet[i] else "Normal"
+            res_str = "WIN" if is_win[t] else "LOSS"
+            log_file.write(f"{klines[i]['datetime']},{signal},{entry_price[t].item()},{amount[t].item()},{rsi[i]:.1f},{avg_amp[i]:.2f},{market_state},{res_str},{payout[t]:.1f},{day_pnl[t]:.1f}\n")
+            if stop_hit[t]:
+                log_file.write(f"{klines[i]['datetime']},STOP,0,0,0,0,STOPPED,STOP,0,{day_pnl[t]:.1f}\n")
 
         log_file.close()
         print(f"✅ Detailed logs saved to: {log_filename}")
-        
+
         # 6. Macro Analysis
-        self.print_macro_stats(daily_stats)
+        daily = daily_stats(day_id[in_range], trade_day[keep], payout[keep], is_win[keep], stop_hit[keep])
+        self.print_macro_stats(daily)
 
-    def print_macro_stats(self, daily_stats):
+    def run_incremental(self, checkpoint=None):
+        """
+        Dynamic C macro report resumed from a checkpoint (see incremental_backtest.py): only bars appended
+        since the last run are simulated. The quiet-market P25 threshold is fixed when the checkpoint is
+        created; delete the checkpoint to recalibrate it (run_standard_test always uses the full history).
+        """
+        checkpoint = checkpoint or checkpoint_path('standard_backtest')
+        if not self.klines_1m:
+            if not self.load_data():
+                print("❌ Failed to load data.")
+                return
+
+        bt = IncrementalBacktest.load(checkpoint, dynamic_c_candidates)
+        if bt is None:
+            arr = KlineArrays.from_klines(self.klines_1m)
+            amps = inclusive_avg_amp(arr.high - arr.low)
+            p25 = np.percentile(amps[~np.isnan(amps)], 25)
+            bt = IncrementalBacktest(dynamic_c_candidates, StreamingSimulator(10, 5, -45), {'quiet_threshold': p25})
+        resumed_from = bt.n
+        added = bt.update(self.klines_1m)
+        bt.save(checkpoint)
+
+        print(f"\n{'='*60}")
+        print(f"🚀 INCREMENTAL BACKTEST: Dynamic C Strategy")
+        print(f"🛡️ Risk: Stop Loss -45U | Max Trades 5 | Time 09:00-20:00")
+        print(f"📊 Volatility P25 Threshold: {bt.params['quiet_threshold']:.4f} (fixed in checkpoint)")
+        print(f"⏩ Bars: {resumed_from} checkpointed + {bt.n - resumed_from} new | New signals: {len(added.get('index', []))}")
+        print(f"{'='*60}")
+        if len(bt.day_ids):
+            self.print_macro_stats(bt.daily('keep'))
+
+    @timed('report')
+    def print_macro_stats(self, daily):
+        """
+        :param daily: trading_day.daily_stats() result (one array per column, one row per trading day)
+        """
         print(f"\n{'='*60}")
         print(f"📊 MACRO ANALYSIS REPORT")
         print(f"{'='*60}")
         
-        total_days = len(daily_stats)
-        total_profit = sum(d['profit'] for d in daily_stats.values())
-        stopped_days = len([d for d in daily_stats.values() if d['stopped']])
+        total_days = len(daily['day'])
+        total_profit = daily['profit'].sum()
+        stopped_days = int(daily['stopped'].sum())
         
-        total_trades = sum(d['trades'] for d in daily_stats.values())
-        total_wins = sum(d['wins'] for d in daily_stats.values())
+        total_trades = int(daily['trades'].sum())
+        total_wins = int(daily['wins'].sum())
         win_rate = (total_wins / total_trades * 100) if total_trades > 0 else 0
         
         print(f"Total Profit: {total_profit:.2f} U")
@@ -193,44 +184,26 @@ class StandardBacktest(WickSniperStrategyPro):
         print(f"Win Rate: {win_rate:.2f}% ({total_wins}/{total_trades})")
         
         # Monthly Stats
-        monthly_stats = {}
-        for day, stats in daily_stats.items():
-            month = day[:7] # YYYY-MM
-            if month not in monthly_stats:
-                monthly_stats[month] = {'profit': 0, 'days': 0, 'trades': 0, 'wins': 0}
-            monthly_stats[month]['profit'] += stats['profit']
-            monthly_stats[month]['days'] += 1
-            monthly_stats[month]['trades'] += stats['trades']
-            monthly_stats[month]['wins'] += stats['wins']
+        monthly = monthly_stats(daily)
             
         print(f"\n📅 Monthly Performance:")
         print(f"{'Month':<10} | {'Profit':<10} | {'Avg/Day':<10} | {'Win Rate':<10}")
         print("-" * 50)
-        for month in sorted(monthly_stats.keys()):
-            p = monthly_stats[month]['profit']
-            d = monthly_stats[month]['days']
-            t = monthly_stats[month]['trades']
-            w = monthly_stats[month]['wins']
+        for month, p, d, t, w in zip(month_labels(monthly['month']), monthly['profit'].tolist(),
+                                     monthly['days'].tolist(), monthly['trades'].tolist(), monthly['wins'].tolist()):
             avg = p / d if d > 0 else 0
             wr = (w / t * 100) if t > 0 else 0
             print(f"{month:<10} | {p:<10.1f} | {avg:<10.1f} | {wr:<9.1f}%")
             
         # Streak Analysis
         print(f"\n📉 Losing Streak Analysis (Consecutive Losing Days):")
-        streaks = []
-        current_streak = 0
-        for day in sorted(daily_stats.keys()):
-            if daily_stats[day]['profit'] < 0:
-                current_streak += 1
-            else:
-                if current_streak > 0:
-                    streaks.append(current_streak)
-                current_streak = 0
-        if current_streak > 0: streaks.append(current_streak)
+        losing = np.r_[False, daily['profit'] < 0, False].astype(np.int8)
+        edges = np.diff(losing)
+        streaks = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
         
-        if streaks:
-            print(f"Max Consecutive Losing Days: {max(streaks)}")
-            print(f"Average Losing Streak: {sum(streaks)/len(streaks):.1f} days")
+        if len(streaks):
+            print(f"Max Consecutive Losing Days: {streaks.max()}")
+            print(f"Average Losing Streak: {streaks.mean():.1f} days")
         else:
             print("No losing streaks found.")
 
@@ -240,4 +213,4 @@ if __name__ == "__main__":
     data_path = os.path.join(script_dir, 'ETHUSDT_1m_klines.json')
     
     bt = StandardBacktest(data_file=data_path)
-    bt.run_standard_test()
+    run_profiled(bt.run_standard_test)  # --profile[=stacks.folded] prints stage timings
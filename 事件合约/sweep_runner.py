@@ -0,0 +1,118 @@
+import functools
+import os
+import sys
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays
+
+# 子进程里挂载好的共享数组 (由 _init_worker 设置)
+_ARRAYS = None
+_HANDLES = []
+
+
+class SharedArrays:
+    """
+    把K线/指标数组放进 multiprocessing.shared_memory (每个数组一块)，
+    子进程只拿到 (名字, 形状, dtype) 描述，按描述挂载成 numpy 视图，不复制数据
+    用完需 close() (或用 with 语句) 释放共享内存
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = []
+        for key, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            view = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)
+            view[...] = values
+            self.blocks.append(shm)
+            self.spec.append((key, shm.name, values.shape, values.dtype.str))
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec):
+    """按 SharedArrays.spec 挂载共享数组，返回 {名字: 只读 numpy 视图}"""
+    arrays = {}
+    for key, name, shape, dtype in spec:
+        shm = shared_memory.SharedMemory(name=name)
+        _HANDLES.append(shm)  # 保持引用，否则视图的内存会被释放
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        view.flags.writeable = False
+        arrays[key] = view
+    return arrays
+
+
+def kline_columns(arrays, **extra):
+    """KlineArrays -> 可放进共享内存的列字典，extra 为附加的指标列 (如 rsi=..., avg_amp=...)"""
+    columns = {'ts': arrays.ts, 'open': arrays.open, 'high': arrays.high, 'low': arrays.low,
+               'close': arrays.close, 'volume': arrays.volume}
+    columns.update(extra)
+    return columns
+
+
+def as_kline_arrays(columns):
+    """kline_columns 的逆操作：子进程里把共享列重新包装成 KlineArrays (不复制)"""
+    return KlineArrays(columns['ts'], columns['open'], columns['high'], columns['low'],
+                       columns['close'], columns['volume'])
+
+
+def _init_worker(spec):
+    global _ARRAYS
+    _ARRAYS = attach(spec)
+
+
+def _call(evaluate, params):
+    return params, evaluate(_ARRAYS, params)
+
+
+class SweepRunner:
+    """
+    多进程参数扫描
+
+    evaluate(arrays, params) 必须是模块级函数 (子进程通过 pickle 按名字导入)，
+    arrays 是共享内存里的数组字典；数据只在主进程写入一次，各子进程直接读取
+    结果按完成顺序流式返回，排序/打印仍由调用方按原脚本的方式完成
+    """
+
+    def __init__(self, arrays, evaluate, processes=None):
+        self.arrays = arrays
+        self.evaluate = evaluate
+        self.processes = processes or os.cpu_count() or 1
+
+    def run(self, param_list):
+        """逐个产出 (params, result)，顺序为完成顺序"""
+        param_list = list(param_list)
+        if self.processes <= 1 or len(param_list) <= 1:
+            for params in param_list:
+                yield params, self.evaluate(self.arrays, params)
+            return
+
+        with SharedArrays(self.arrays) as shared:
+            with Pool(min(self.processes, len(param_list)), initializer=_init_worker,
+                      initargs=(shared.spec,)) as pool:
+                yield from pool.imap_unordered(functools.partial(_call, self.evaluate), param_list)
+
+    def run_all(self, param_list, on_result=None):
+        """跑完全部参数，返回与 param_list 同顺序的结果列表；on_result(params, result) 在每个结果到达时调用"""
+        param_list = list(param_list)
+        results = {}
+        for params, result in self.run(param_list):
+            results[repr(params)] = result
+            if on_result:
+                on_result(params, result)
+        return [results[repr(params)] for params in param_list]
@@ -1,7 +1,18 @@
+import functools
+import hashlib
 import json
 import os
 from datetime import datetime
 import requests
+import numpy as np
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from zone_detector import ConsolidationDetector, ConsolidationSweep
+from zone_backtest import ZoneTradeEngine, zones_to_arrays, SHORT
+from kline_arrays import KlineArrays, data_fingerprint
+from result_store import ResultStore, DEFAULT_DB
+from incremental_backtest import StreamingSimulator, zone_touch_candidates, resume_or_start, checkpoint_path
 
 
 class BinanceKlineAnalyzer:
@@ -121,140 +132,20 @@ class BinanceKlineAnalyzer:
         if len(self.klines) < 10:
             return []
         
-        consolidation_zones = []
-        i = 0
-        
-        while i < len(self.klines) - min_duration:
-            # 寻找局部高点(可能的压力位)
-            if i < 2 or i >= len(self.klines) - 2:
-                i += 1
-                continue
-            
-            current = self.klines[i]
-            
-            # 判断是否为局部高点
-            is_local_high = (current['high'] >= self.klines[i-1]['high'] and 
-                            current['high'] >= self.klines[i-2]['high'] and
-                            current['high'] >= self.klines[i+1]['high'] and
-                            current['high'] >= self.klines[i+2]['high'] if i+2 < len(self.klines) else True)
-            
-            if is_local_high:
-                resistance = current['high']
-                resistance_touches = [i]  # 记录触碰压力位的位置
-                
-                # 向后查找支撑位和其他触碰（必须交替触碰）
-                j = i + 1
-                support = None
-                support_touches = []
-                touch_sequence = []  # 记录触碰顺序: ('resistance', index) 或 ('support', index)
-                
-                while j < len(self.klines) and j - i < max_klines_between * 3:
-                    k = self.klines[j]
-                    
-                    # 检查是否触碰压力位
-                    is_touch_resistance = abs(k['high'] - resistance) / resistance * 100 <= touch_threshold
-                    
-                    # 寻找支撑位(局部低点)
-                    is_local_low = False
-                    if j >= 2 and j < len(self.klines) - 2:
-                        is_local_low = (k['low'] <= self.klines[j-1]['low'] and 
-                                       k['low'] <= self.klines[j-2]['low'] and
-                                       k['low'] <= self.klines[j+1]['low'] and
-                                       k['low'] <= self.klines[j+2]['low'] if j+2 < len(self.klines) else True)
-                        
-                        if is_local_low and support is None:
-                            support = k['low']
-                    
-                    # 检查是否触碰支撑位
-                    is_touch_support = False
-                    if support is not None:
-                        is_touch_support = abs(k['low'] - support) / support * 100 <= touch_threshold
-                    
-                    # 记录触碰（必须与上一次触碰类型不同）
-                    if is_touch_resistance:
-                        if not touch_sequence or touch_sequence[-1][0] != 'resistance':
-                            resistance_touches.append(j)
-                            touch_sequence.append(('resistance', j))
-                    elif is_touch_support:
-                        if not touch_sequence or touch_sequence[-1][0] != 'support':
-                            support_touches.append(j)
-                            touch_sequence.append(('support', j))
-                    
-                    j += 1
-                
-                # 判断是否形成横盘区域
-                if (support is not None and 
-                    len(resistance_touches) >= min_touches and 
-                    len(support_touches) >= min_touches):
-                    
-                    # 检查压力位和支撑位的振幅是否足够（避免区间太小）
-                    amplitude_percent = ((resistance - support) / support) * 100
-                    if amplitude_percent < min_amplitude_percent:
-                        # 振幅太小，跳过这个区域
-                        i += 1
-                        continue
-                    
-                    # 确定横盘区域的起止位置
-                    all_touches = sorted(resistance_touches + support_touches)
-                    start_idx = all_touches[0]
-                    end_idx = all_touches[-1]
-                    
-                    duration = end_idx - start_idx + 1
-                    
-                    # 检查持续时间是否足够
-                    if duration >= min_duration:
-                        # 计算区域内的详细信息
-                        zone_klines = self.klines[start_idx:end_idx + 1]
-                        zone_high = max(k['high'] for k in zone_klines)
-                        zone_low = min(k['low'] for k in zone_klines)
-                        zone_center = (zone_high + zone_low) / 2
-                        zone_amplitude = zone_high - zone_low
-                        zone_amplitude_percent = (zone_amplitude / zone_center) * 100
-                        
-                        # 找到可以开始交易的时间点：前3次触碰完成后，第4次触碰就可以交易
-                        # 取前3次触碰中最晚的那个作为起点，这样第4次触碰时就能进行交易
-                        # 计算前3次触碰的索引
-                        touch_sequence_for_start = []
-                        if len(resistance_touches) >= 1:
-                            touch_sequence_for_start.append(('resistance', resistance_touches[0]))
-                        if len(support_touches) >= 1:
-                            touch_sequence_for_start.append(('support', support_touches[0]))
-                        if len(resistance_touches) >= 2:
-                            touch_sequence_for_start.append(('resistance', resistance_touches[1]))
-                        if len(support_touches) >= 2:
-                            touch_sequence_for_start.append(('support', support_touches[1]))
-                        
-                        # 按时间排序，取前3次中最晚的
-                        touch_sequence_for_start.sort(key=lambda x: x[1])
-                        trade_start_index = touch_sequence_for_start[2][1] if len(touch_sequence_for_start) >= 3 else start_idx
-                        
-                        consolidation_zones.append({
-                            'start_index': start_idx,
-                            'end_index': end_idx,
-                            'trade_start_index': trade_start_index,  # 新增：可以开始交易的索引
-                            'start_time': self.klines[start_idx]['datetime'],
-                            'end_time': self.klines[end_idx]['datetime'],
-                            'duration': duration,
-                            'resistance': round(resistance, 2),
-                            'support': round(support, 2),
-                            'resistance_touches': len(resistance_touches),
-                            'support_touches': len(support_touches),
-                            'resistance_touch_indices': resistance_touches,  # 新增：记录所有触碰位置
-                            'support_touch_indices': support_touches,  # 新增：记录所有触碰位置
-                            'high': round(zone_high, 2),
-                            'low': round(zone_low, 2),
-                            'center': round(zone_center, 2),
-                            'amplitude': round(zone_amplitude, 2),
-                            'amplitude_percent': round(zone_amplitude_percent, 2)
-                        })
-                        
-                        # 跳过已识别的区域
-                        i = end_idx + 1
-                        continue
-            
-            i += 1
-        
-        return consolidation_zones
+        # 局部高低点只计算一次，候选窗口按块向量化判断，再用线性状态机挑选区域
+        # (逐根扫描版本约 O(n·150)，5万根以上很慢；结果与逐根扫描完全一致)
+        detector = ConsolidationDetector(
+            [k['high'] for k in self.klines],
+            [k['low'] for k in self.klines]
+        )
+        return detector.find_zones(
+            touch_threshold=touch_threshold,
+            min_touches=min_touches,
+            max_klines_between=max_klines_between,
+            min_duration=min_duration,
+            min_amplitude_percent=min_amplitude_percent,
+            datetimes=[k['datetime'] for k in self.klines]
+        )
     
     def backtest_strategy(self, consolidation_zones, hold_periods=10, max_positions=5, touch_threshold=0.001):
         """
@@ -273,124 +164,164 @@ class BinanceKlineAnalyzer:
             touch_threshold: 触碰阈值(默认0.003即0.3%)
         """
         all_trades = []
-        active_positions = []  # 当前持仓列表: [(entry_index, exit_index, trade_data), ...]
-        
-        # 创建所有潜在交易机会的时间序列
-        potential_trades = []
-        
-        for zone in consolidation_zones:
-            resistance = zone['resistance']
-            support = zone['support']
-            start_idx = zone['start_index']
-            end_idx = zone['end_index']
-            trade_start_idx = zone['trade_start_index']  # 横盘确认后才能开始交易
-            
-            # 遍历该横盘区域内的K线（从trade_start_idx的下一根K线开始，这样第4次触碰就能交易）
-            for i in range(trade_start_idx + 1, end_idx + 1):
-                if i + hold_periods >= len(self.klines):
-                    break
-                
-                current_k = self.klines[i]
-                
-                # 检查是否触碰压力位 - 做空（使用实际触碰的高点作为入场价）
-                # 必须是从下往上触碰：前一根K线的收盘价低于压力位
-                if abs(current_k['high'] - resistance) / resistance <= touch_threshold:
-                    if i > 0 and self.klines[i-1]['close'] < resistance:
-                        potential_trades.append({
-                            'entry_index': i,
-                            'exit_index': i + hold_periods,
-                            'zone_id': consolidation_zones.index(zone) + 1,
-                            'type': 'SHORT',
-                            'entry_price': current_k['high'],  # 使用实际触碰的高点
-                            'resistance': resistance,
-                            'support': support
-                        })
-                
-                # 检查是否触碰支撑位 - 做多（使用实际触碰的低点作为入场价）
-                # 必须是从上往下触碰：前一根K线的收盘价高于支撑位
-                if abs(current_k['low'] - support) / support <= touch_threshold:
-                    if i > 0 and self.klines[i-1]['close'] > support:
-                        potential_trades.append({
-                            'entry_index': i,
-                            'exit_index': i + hold_periods,
-                            'zone_id': consolidation_zones.index(zone) + 1,
-                            'type': 'LONG',
-                            'entry_price': current_k['low'],  # 使用实际触碰的低点
-                            'resistance': resistance,
-                            'support': support
-                        })
-        
-        # 按入场时间排序
-        potential_trades.sort(key=lambda x: x['entry_index'])
-        
-        # 遍历所有潜在交易，应用持仓限制和交替买入限制
-        last_trade_type_per_zone = {}  # 记录每个区域的上一次交易类型 {zone_id: 'SHORT' or 'LONG'}
-        
-        for trade_opportunity in potential_trades:
-            entry_idx = trade_opportunity['entry_index']
-            exit_idx = trade_opportunity['exit_index']
-            zone_id = trade_opportunity['zone_id']
-            trade_type = trade_opportunity['type']
-            
-            # 清理已经平仓的持仓
-            active_positions = [pos for pos in active_positions if pos['exit_index'] > entry_idx]
+        if not consolidation_zones:
+            return all_trades
+        
+        # 区域区间与压力/支撑位转成数组，触碰判断向量化，交替方向与持仓限制一次线性扫描完成
+        engine = ZoneTradeEngine(
+            [k['high'] for k in self.klines],
+            [k['low'] for k in self.klines],
+            [k['close'] for k in self.klines]
+        )
+        trade_start, zone_end, resistance, support = zones_to_arrays(consolidation_zones)
+        result = engine.run(trade_start, zone_end, resistance, support,
+                            hold_periods=hold_periods, max_positions=max_positions, touch_threshold=touch_threshold)
+        
+        for n in range(len(result['entry_index'])):
+            entry_idx = int(result['entry_index'][n])
+            exit_idx = int(result['exit_index'][n])
+            zone_idx = int(result['zone'][n])
+            is_short = result['side'][n] == SHORT
             
-            # 检查交替买入限制：同一个区域内，不能连续两次做同样的交易
-            if zone_id in last_trade_type_per_zone:
-                if last_trade_type_per_zone[zone_id] == trade_type:
-                    # 跳过：上一次已经做过相同类型的交易，必须等待相反类型
-                    continue
+            if is_short:
+                reason = f"触碰压力位 {consolidation_zones[zone_idx]['resistance']}"
+            else:
+                reason = f"触碰支撑位 {consolidation_zones[zone_idx]['support']}"
             
-            # 检查是否可以开新仓
-            if len(active_positions) < max_positions:
-                # 可以开仓
-                entry_k = self.klines[entry_idx]
-                exit_k = self.klines[exit_idx]
-                
-                entry_price = trade_opportunity['entry_price']
-                entry_time = entry_k['datetime']
-                exit_price = exit_k['close']
-                exit_time = exit_k['datetime']
-                
-                if trade_type == 'SHORT':
-                    # 做空: 入场价格 > 出场价格 = 盈利
-                    profit = entry_price - exit_price
-                    profit_percent = (profit / entry_price) * 100
-                    is_win = profit > 0
-                    reason = f"触碰压力位 {trade_opportunity['resistance']}"
-                else:  # LONG
-                    # 做多: 出场价格 > 入场价格 = 盈利
-                    profit = exit_price - entry_price
-                    profit_percent = (profit / entry_price) * 100
-                    is_win = profit > 0
-                    reason = f"触碰支撑位 {trade_opportunity['support']}"
-                
-                trade_data = {
-                    'zone_id': zone_id,
-                    'type': trade_type,
-                    'entry_time': entry_time,
-                    'exit_time': exit_time,
-                    'entry_price': round(entry_price, 2),
-                    'exit_price': round(exit_price, 2),
-                    'profit': round(profit, 2),
-                    'profit_percent': round(profit_percent, 3),
-                    'is_win': is_win,
-                    'reason': reason,
-                    'entry_index': entry_idx,
-                    'exit_index': exit_idx
-                }
-                
-                all_trades.append(trade_data)
-                active_positions.append({
-                    'exit_index': exit_idx,
-                    'trade': trade_data
-                })
-                
-                # 更新该区域的上一次交易类型
-                last_trade_type_per_zone[zone_id] = trade_type
+            all_trades.append({
+                'zone_id': zone_idx + 1,
+                'type': 'SHORT' if is_short else 'LONG',
+                'entry_time': self.klines[entry_idx]['datetime'],
+                'exit_time': self.klines[exit_idx]['datetime'],
+                'entry_price': round(result['entry_price'][n].item(), 2),
+                'exit_price': round(result['exit_price'][n].item(), 2),
+                'profit': round(result['profit'][n].item(), 2),
+                'profit_percent': round(result['profit_percent'][n].item(), 3),
+                'is_win': bool(result['is_win'][n]),
+                'reason': reason,
+                'entry_index': entry_idx,
+                'exit_index': exit_idx
+            })
         
         return all_trades
     
+    def backtest_incremental(self, consolidation_zones, checkpoint=None, hold_periods=10, max_positions=5,
+                             touch_threshold=0.001, zone_params=None):
+        """
+        backtest_strategy 的增量版本：持仓队列和各区域上一笔方向存进检查点 (incremental_backtest)，
+        数据追加后只模拟新K线上的触碰；区域仍按全部K线重新识别 (向量化，很快)
+        zone_params 为识别 consolidation_zones 用的参数，记入检查点设置，参数变了就从头重跑；
+        不传时改用区域列表本身的指纹 (区域有任何变化，包括新数据上多出的区域，都会从头重跑)
+        返回从检查点建立以来的全部交易，格式与 backtest_strategy 相同
+        """
+        checkpoint = checkpoint or checkpoint_path(f'{self.symbol}_{self.interval}_zones')
+        zones = zones_to_arrays(consolidation_zones)
+        if zone_params is not None:
+            context = {'zone_params': dict(zone_params)}
+        else:
+            h = hashlib.sha1()
+            for values in zones:
+                h.update(np.ascontiguousarray(values).tobytes())
+            context = {'zones': h.hexdigest()[:16]}
+        bt = resume_or_start(
+            checkpoint,
+            functools.partial(zone_touch_candidates, zones=zones),
+            StreamingSimulator(hold_periods, max_positions, None, alternate=True),
+            {'hold_periods': hold_periods, 'touch_threshold': touch_threshold},
+            horizon=hold_periods, start=1, context=context,
+        )
+        resumed_from = bt.n
+        bt.update(self.klines)
+        bt.save(checkpoint)
+        print(f"增量回测: 检查点 {resumed_from} 根 + 新增 {bt.n - resumed_from} 根K线")
+
+        result = bt.trades()
+        all_trades = []
+        if not result:
+            return all_trades
+        # 检查点里的 zone 是当时区域列表的下标，按 zone_key (区域的 trade_start 下标) 对应到本次识别的区域
+        by_key = {}
+        for n, z in enumerate(consolidation_zones):
+            by_key.setdefault(z['trade_start_index'], (n, z))
+        for n in np.flatnonzero(result['accepted']).tolist():
+            entry_idx = int(result['index'][n])
+            exit_idx = entry_idx + hold_periods
+            is_short = result['side'][n] == SHORT
+            zone_idx, zone = by_key.get(int(result['zone_key'][n]), (None, None))
+            if zone is None:
+                reason = "触碰压力位" if is_short else "触碰支撑位"
+            elif is_short:
+                reason = f"触碰压力位 {zone['resistance']}"
+            else:
+                reason = f"触碰支撑位 {zone['support']}"
+
+            all_trades.append({
+                'zone_id': zone_idx + 1 if zone_idx is not None else None,
+                'type': 'SHORT' if is_short else 'LONG',
+                'entry_time': self.klines[entry_idx]['datetime'],
+                'exit_time': self.klines[exit_idx]['datetime'],
+                'entry_price': round(result['entry_price'][n].item(), 2),
+                'exit_price': round(result['exit_price'][n].item(), 2),
+                'profit': round(result['pnl'][n].item(), 2),
+                'profit_percent': round(result['profit_percent'][n].item(), 3),
+                'is_win': bool(result['is_win'][n]),
+                'reason': reason,
+                'entry_index': entry_idx,
+                'exit_index': exit_idx
+            })
+        return all_trades
+
+    def sweep_zone_parameters(self, touch_thresholds=(0.1,), min_touches_list=(2,), min_duration_list=(20,),
+                              min_amplitude_list=(0.5,), trade_thresholds=(0.0005,), max_klines_between=50,
+                              hold_periods=10, max_positions=5):
+        """
+        横盘识别参数 + 交易触碰阈值的网格扫描
+        
+        摆动点和逐根K线到压力/支撑位的距离只计算一次，整个网格共享；
+        每个识别参数组合得到的区域再用不同的交易触碰阈值回测
+        
+        返回按胜率从高到低排序的结果列表，并导出 {symbol}_{interval}_threshold_optimization.txt
+        """
+        detector = ConsolidationDetector(
+            [k['high'] for k in self.klines],
+            [k['low'] for k in self.klines]
+        )
+        engine = ZoneTradeEngine(detector.high, detector.low, [k['close'] for k in self.klines])
+        grid = ConsolidationSweep(detector, max_klines_between).run(
+            touch_thresholds, min_touches_list, min_duration_list, min_amplitude_list
+        )
+        
+        results = []
+        for (tt, mt, md, ma), zones in grid.items():
+            for trade_tt in trade_thresholds:
+                trades = engine.run(zones['trade_start'], zones['end'], zones['resistance'], zones['support'],
+                                    hold_periods=hold_periods, max_positions=max_positions, touch_threshold=trade_tt)
+                total = len(trades['is_win'])
+                results.append({
+                    'touch_threshold': tt,
+                    'min_touches': mt,
+                    'min_duration': md,
+                    'min_amplitude_percent': ma,
+                    'trade_threshold': trade_tt,
+                    'zones': len(zones['start']),
+                    'trades': total,
+                    'win_rate': round(trades['is_win'].mean().item() * 100, 2) if total else 0,
+                    'total_profit': round(trades['profit'].sum().item(), 2)
+                })
+        results.sort(key=lambda r: r['win_rate'], reverse=True)
+        
+        export_file = f'{self.symbol}_{self.interval}_threshold_optimization.txt'
+        with open(export_file, 'w', encoding='utf-8') as f:
+            f.write(f"横盘参数网格遍历结果 (持仓{hold_periods}根K线, 共 {len(results)} 组)\n")
+            f.write("-" * 45 + "\n")
+            for idx, r in enumerate(results):
+                mark = " <== 最优" if idx == 0 else ""
+                f.write(f"盘整容差={r['touch_threshold']}%  触碰={r['min_touches']}  持续={r['min_duration']}  "
+                        f"振幅={r['min_amplitude_percent']}%  threshold={r['trade_threshold']:.4f}  "
+                        f"胜率={r['win_rate']:.2f}%  交易数={r['trades']}{mark}\n")
+        print(f"✓ 参数遍历结果已导出到: {export_file}")
+        return results
+    
     def export_trades_to_file(self, trades, consolidation_zones):
         """导出详细交易记录到文件，便于复验"""
         export_file = f'{self.symbol}_{self.interval}_trades_detail.txt'
@@ -483,6 +414,27 @@ class BinanceKlineAnalyzer:
         except Exception as e:
             print(f"\n⚠ 导出交易记录失败: {e}")
     
+    def save_trades_to_store(self, trades, params, stats=None, store_path=DEFAULT_DB):
+        """把本次回测的交易写入结果库，返回 run_id；文字报告之后可按需用 ResultStore.write_report 渲染"""
+        with ResultStore(store_path) as store:
+            return store.add_run(
+                'zone_reversal',
+                dict(params, symbol=self.symbol, interval=self.interval),
+                data_fingerprint(KlineArrays.from_klines(self.klines)),
+                trades={
+                    'time': [t['entry_time'] for t in trades],
+                    'side': [t['type'] for t in trades],
+                    'price': [t['entry_price'] for t in trades],
+                    'result': ['WIN' if t['is_win'] else 'LOSS' for t in trades],
+                    'profit': [t['profit'] for t in trades],
+                    'exit_time': [t['exit_time'] for t in trades],
+                    'exit_price': [t['exit_price'] for t in trades],
+                    'extra': [json.dumps({'所属区域': t['zone_id'], '触发原因': t['reason'],
+                                          '盈亏比例': t['profit_percent']}, ensure_ascii=False) for t in trades],
+                },
+                metrics={key: stats[key] for key in ('total_trades', 'win_rate', 'total_profit')} if stats else None,
+            )
+
     def calculate_statistics(self, trades):
         """计算交易统计数据"""
         if not trades:
@@ -554,8 +506,12 @@ class BinanceKlineAnalyzer:
             'consecutive_losses': consecutive_losses
         }
     
-    def analyze(self):
-        """执行完整的分析流程"""
+    def analyze(self, export_text=False, store_path=DEFAULT_DB, checkpoint=None):
+        """
+        执行完整的分析流程
+        交易记录写入结果库 (result_store)；export_text=True 时才额外导出旧格式的文字明细
+        checkpoint 不为空时从检查点增量回测，只模拟新追加的K线 (见 backtest_incremental)
+        """
         print("="*60)
         print("币安K线数据与压力位支撑位横盘识别")
         print("="*60)
@@ -577,13 +533,14 @@ class BinanceKlineAnalyzer:
         print("  - 最小持续时间: 20 根K线")
         print("  - 最小振幅: 压力位和支撑位差距 ≥ 0.5%")
         
-        consolidation_zones = self.find_consolidation_by_support_resistance(
+        zone_params = dict(
             touch_threshold=0.1,      # 0.3%的触碰阈值
             min_touches=2,            # 至少触碰2次
             max_klines_between=50,    # 触碰间隔不超过50根K线
             min_duration=20,          # 至少持续20根K线
             min_amplitude_percent=0.5 # 最小振幅0.5%
         )
+        consolidation_zones = self.find_consolidation_by_support_resistance(**zone_params)
         
         print(f"\n识别到 {len(consolidation_zones)} 个横盘盘整区域")
         
@@ -601,7 +558,11 @@ class BinanceKlineAnalyzer:
         print("  ⑦ 做空盈利条件: 10根K线后价格 < 入场价")
         print("  ⑧ 做多盈利条件: 10根K线后价格 > 入场价")
         
-        trades = self.backtest_strategy(consolidation_zones, hold_periods=10, max_positions=5, touch_threshold=0.0005)
+        if checkpoint:
+            trades = self.backtest_incremental(consolidation_zones, checkpoint, hold_periods=10, max_positions=5,
+                                               touch_threshold=0.0005, zone_params=zone_params)
+        else:
+            trades = self.backtest_strategy(consolidation_zones, hold_periods=10, max_positions=5, touch_threshold=0.0005)
         stats = self.calculate_statistics(trades)
         
         if stats:
@@ -642,8 +603,13 @@ class BinanceKlineAnalyzer:
                 print(f"  出场价格: {trade['exit_price']}")
                 print(f"  盈亏: {trade['profit']} ({trade['profit_percent']}%)")
             
-            # 导出详细交易记录到文件
-            self.export_trades_to_file(trades, consolidation_zones)
+            # 交易记录写入结果库，文字明细按需导出
+            run_id = self.save_trades_to_store(
+                trades, dict(zone_params, hold_periods=10, max_positions=5, trade_touch_threshold=0.0005),
+                stats, store_path)
+            print(f"\n交易记录已写入结果库 {store_path} (run #{run_id})")
+            if export_text:
+                self.export_trades_to_file(trades, consolidation_zones)
         else:
             print("\n未产生任何交易")
         
@@ -1,7 +1,12 @@
 import json
 import os
+import sys
 import math
-from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, column
+from signal_table import build_signal_table, tiered_stake, summarize
 
 class TieredBacktest:
     def __init__(self, data_file='ETHUSDT_1m_klines.json'):
@@ -82,79 +87,23 @@ class TieredBacktest:
         print("\n🚀 开始分级策略回测 (09:00 - 20:00 UTC+8 - Plan B 精简版)...")
         print("配置: 1. 移除5U单  2. 巨型K线优化(>15U才过滤)  3. 仅限黄金时段")
         
-        for i in range(100, len(self.klines) - 10):
-            curr_k = self.klines[i]
-            prev_k = self.klines[i-1]
-            
-            # --- 时间检查 (09:00 - 20:00 UTC+8 -> UTC 1-12) ---
-            dt = datetime.strptime(curr_k['datetime'], '%Y-%m-%d %H:%M:%S')
-            if not (1 <= dt.hour < 12):
-                continue
-
-            # --- 数据完整性 ---
-            if prev_k.get('bb_lower') is None or prev_k.get('rsi') is None:
-                continue
-                
-            # --- 巨型K线检测 (优化版) ---
-            is_giant_candle = False
-            prev_amp = prev_k['high'] - prev_k['low']
-            avg_amp = prev_k.get('avg_amp', 0)
-            
-            # 只有当波动真的很大(>15U)且倍数高时才标记
-            if avg_amp > 0 and prev_amp > 3 * avg_amp and prev_amp > 15.0:
-                is_giant_candle = True
+        # --- 候选信号表 (UTC 1-12，RSI<25/>75，巨型K线需同时 >15U，布林带触碰价入场，i+10 中间价结算) ---
+        arr = KlineArrays.from_klines(self.klines)
+        table = build_signal_table(arr, column(self.klines, 'rsi'), column(self.klines, 'avg_amp'),
+                                   column(self.klines, 'bb_lower'), column(self.klines, 'bb_upper'),
+                                   hours=(1, 12), long_below=25, short_above=75, giant_floor=15.0,
+                                   entry='band', settle='mid')
 
-            # --- 信号检测与分级 ---
-            rsi = prev_k['rsi']
-            signal_type = None
-            entry_price = 0
-            bet_amount = 0
-            
-            # 逻辑复刻自 realtime_asian_sniper.py (Plan B)
-            if rsi < 25: # 阈值收紧
-                if not is_giant_candle:
-                    signal_type = 'LONG'
-                    entry_price = min(curr_k['open'], prev_k['bb_lower'])
-                    
-                    if rsi < 20:
-                        bet_amount = 15
-                    else:
-                        bet_amount = 10
-            
-            elif rsi > 75: # 阈值收紧
-                if not is_giant_candle:
-                    signal_type = 'SHORT'
-                    entry_price = max(curr_k['open'], prev_k['bb_upper'])
-                    
-                    if rsi > 80:
-                        bet_amount = 15
-                    else:
-                        bet_amount = 10
-            
-            # --- 结算 ---
-            if signal_type and bet_amount > 0:
-                settle_k = self.klines[i+10]
-                settle_price = (settle_k['open'] + settle_k['close']) / 2
-                
-                is_win = False
-                if signal_type == 'LONG':
-                    is_win = settle_price > entry_price
-                else:
-                    is_win = settle_price < entry_price
-                
-                # 计算盈亏
-                pnl = 0
-                if is_win:
-                    pnl = bet_amount * 0.8
-                    stats[f'{bet_amount}U']['wins'] += 1
-                    stats['total']['wins'] += 1
-                else:
-                    pnl = -bet_amount
-                    stats[f'{bet_amount}U']['losses'] += 1
-                    stats['total']['losses'] += 1
-                
-                stats[f'{bet_amount}U']['profit'] += pnl
-                stats['total']['profit'] += pnl
+        # --- 分级注码 (逻辑复刻自 realtime_asian_sniper.py Plan B) ---
+        summary = summarize(table, tiered_stake(table))
+        for amount, tier in summary['tiers'].items():
+            key = f'{int(amount)}U'
+            stats[key]['wins'] = tier['wins']
+            stats[key]['losses'] = tier['trades'] - tier['wins']
+            stats[key]['profit'] = tier['profit']
+        stats['total']['wins'] = summary['wins']
+        stats['total']['losses'] = summary['trades'] - summary['wins']
+        stats['total']['profit'] = summary['profit']
 
         # --- 输出结果 ---
         print("\n" + "="*60)
@@ -1,12 +1,19 @@
 import json
 import os
+import sys
 import math
-from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, column
+from signal_table import build_signal_table, take
+from outcome_cube import OutcomeCube, format_ranges
 
 class TimeWindowTester:
     def __init__(self, data_file='ETHUSDT_1m_klines.json'):
         self.data_file = data_file
         self.klines = []
+        self.cube = None
         
     def load_data(self):
         if os.path.exists(self.data_file):
@@ -71,96 +78,36 @@ class TimeWindowTester:
             avg_amp = sum([self.klines[j]['high'] - self.klines[j]['low'] for j in range(i-20, i)]) / 20
             self.klines[i]['avg_amp'] = avg_amp
 
+    def build_cube(self):
+        """
+        一次扫描生成候选信号表 (全天，RSI<25/>75 + 触碰布林带，巨型K线过滤，i+10 中间价结算)，
+        再按 (小时, 星期, 方向, 行情状态) 汇总成结果立方体，之后任意时段都不用重跑回测
+        """
+        arr = KlineArrays.from_klines(self.klines)
+        table = build_signal_table(arr, column(self.klines, 'rsi'), column(self.klines, 'avg_amp'),
+                                   column(self.klines, 'bb_lower'), column(self.klines, 'bb_upper'),
+                                   hours=(0, 24), long_below=25, short_above=75, giant_floor=0.0,
+                                   entry='band', settle='mid')
+        # [修正] 使用 (Open + Close) / 2 作为结算价，模拟随机秒数入场/出场
+        table = take(table, table['touch'])
+        self.cube = OutcomeCube.from_table(table, arr)
+        return self.cube
+
     def run_backtest(self, start_hour, end_hour, label):
         """
-        运行回测
+        运行回测 (从结果立方体中直接读取)
         start_hour: 开始小时 (包含)
-        end_hour: 结束小时 (不包含)
+        end_hour: 结束小时 (不包含)，start_hour >= end_hour 时跨午夜
         """
-        balance = 1000.0
+        if self.cube is None:
+            self.build_cube()
         bet_size = 10.0
-        win_payout = 0.8
-        loss_payout = -1.0
-        
-        total_trades = 0
-        wins = 0
-        
-        # 遍历数据
-        for i in range(100, len(self.klines) - 10):
-            curr_k = self.klines[i]
-            prev_k = self.klines[i-1]
-            
-            # --- 时间检查 ---
-            dt = datetime.strptime(curr_k['datetime'], '%Y-%m-%d %H:%M:%S')
-            
-            # 处理跨午夜的情况 (例如 22点 到 2点)
-            in_time_window = False
-            if start_hour < end_hour:
-                if start_hour <= dt.hour < end_hour:
-                    in_time_window = True
-            else: # 跨午夜
-                if dt.hour >= start_hour or dt.hour < end_hour:
-                    in_time_window = True
-            
-            if not in_time_window:
-                continue
-
-            # --- 数据完整性 ---
-            if prev_k.get('bb_lower') is None or prev_k.get('rsi') is None:
-                continue
-                
-            # --- 巨型K线过滤 ---
-            prev_amp = prev_k['high'] - prev_k['low']
-            avg_amp = prev_k.get('avg_amp', 0)
-            if avg_amp > 0 and prev_amp > 3 * avg_amp:
-                continue
-
-            # --- 信号检测 ---
-            signal = None
-            entry_price = 0
-            
-            if prev_k['rsi'] < 25:
-                if curr_k['low'] <= prev_k['bb_lower']:
-                    signal = 'LONG'
-                    entry_price = min(curr_k['open'], prev_k['bb_lower'])
-            
-            elif prev_k['rsi'] > 75:
-                if curr_k['high'] >= prev_k['bb_upper']:
-                    signal = 'SHORT'
-                    entry_price = max(curr_k['open'], prev_k['bb_upper'])
-            
-            # --- 结算 ---
-            if signal:
-                settle_k = self.klines[i+10]
-                
-                # [修正] 使用 (Open + Close) / 2 作为结算价，模拟随机秒数入场/出场
-                # 这样比单纯用 Open (9.5分钟) 或 Close (10.5分钟) 更接近 10分钟均值
-                settle_price = (settle_k['open'] + settle_k['close']) / 2
-                
-                # [压力测试] 模拟 0.01% 的滑点 (入场价变差)
-                # slippage = entry_price * 0.0001
-                # if signal == 'LONG': entry_price += slippage
-                # else: entry_price -= slippage
-                
-                is_win = False
-                if signal == 'LONG':
-                    is_win = settle_price > entry_price
-                else:
-                    is_win = settle_price < entry_price
-                
-                pnl = bet_size * win_payout if is_win else bet_size * loss_payout
-                balance += pnl
-                total_trades += 1
-                if is_win: wins += 1
-
-        win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-        net_profit = balance - 1000.0
-        
+        res = self.cube.query([(start_hour, end_hour)])
         return {
             "label": label,
-            "trades": total_trades,
-            "win_rate": win_rate,
-            "net_profit": net_profit
+            "trades": res['trades'],
+            "win_rate": res['win_rate'],
+            "net_profit": res['profit'] * bet_size
         }
 
 if __name__ == "__main__":
@@ -197,3 +144,10 @@ if __name__ == "__main__":
         for res in results:
             print(f"{res['label']:<20} | {res['trades']:<12} | {res['win_rate']:.2f}%   | {res['net_profit']:+.2f} U")
         print("="*65)
+
+        # 穷举所有连续时段和两段组合 (基于同一个结果立方体)
+        print("\n🔍 穷举时段组合 (单量 >= 100，按单笔EV排序):")
+        print("-" * 65)
+        for res in tester.cube.search(min_trades=100, segments=2, top=10):
+            print(f"{format_ranges(res['ranges']):<20} | {res['trades']:<12} | {res['win_rate']:.2f}%   | {res['profit'] * 10:+.2f} U")
+        print("="*65)
@@ -0,0 +1,197 @@
+import numpy as np
+
+
+def trading_day_ids(ts, start_hour=9):
+    """
+    交易日编号 (整数列)：交易日从 start_hour:00 开始，到次日 start_hour:00 结束
+    编号 = 交易日开始那天距 1970-01-01 的天数，小于 start_hour 的K线归入前一天
+    """
+    return (np.asarray(ts, dtype=np.int64) - start_hour * 3600) // 86400
+
+
+def day_labels(day_ids):
+    """交易日编号 -> 'YYYY-MM-DD'"""
+    return np.asarray(day_ids, dtype=np.int64).astype('datetime64[D]').astype(str)
+
+
+def month_labels(month_ids):
+    """月份编号 -> 'YYYY-MM'"""
+    return np.asarray(month_ids, dtype=np.int64).astype('datetime64[M]').astype(str)
+
+
+def limit_concurrent(entry_idx, hold_bars=10, max_active=5):
+    """
+    最大同时持仓限制：按时间顺序扫一遍候选信号，
+    第 i 根入场时若 (i-hold_bars, i) 内已接受的交易数 >= max_active 则丢弃
+    只遍历候选信号本身 (几千条)，而不是全部K线
+    返回与 entry_idx 等长的 bool 数组
+    """
+    accepted = np.zeros(len(entry_idx), dtype=bool)
+    active = []  # 已接受交易的到期索引 (单调递增)
+    head = 0
+    for n, i in enumerate(entry_idx.tolist()):
+        while head < len(active) and active[head] <= i:
+            head += 1
+        if len(active) - head >= max_active:
+            continue
+        accepted[n] = True
+        active.append(i + hold_bars)
+    return accepted
+
+
+def apply_daily_stop(trade_day, pnl, stop_loss_limit):
+    """
+    每日止损 (向量化)：对按时间排序的交易序列做分组累计和，
+    当日累计盈亏第一次 <= stop_loss_limit 的那笔交易仍然成交，其后的交易全部屏蔽
+
+    :param trade_day: 每笔交易的交易日编号 (非递减)
+    :param pnl: 每笔交易的盈亏
+    :param stop_loss_limit: 负数，例如 -45；None 表示不止损
+    :return: (keep, day_pnl, stop_hit)
+        keep: 该笔交易是否在止损前 (含触发止损那笔)
+        day_pnl: 当日截至该笔的累计盈亏
+        stop_hit: 该笔是否触发当日止损
+    """
+    trade_day = np.asarray(trade_day)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    n = len(pnl)
+    if n == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0, dtype=bool)
+
+    starts = np.flatnonzero(np.r_[True, trade_day[1:] != trade_day[:-1]])
+    group = np.cumsum(np.r_[True, trade_day[1:] != trade_day[:-1]]) - 1
+    csum = np.cumsum(pnl)
+    base = np.r_[0.0, csum][starts]
+    # 金额都是分级注码 * 赔率，四舍五入到 1e-9 消除分组相减带来的浮点尾差
+    day_pnl = np.round(csum - base[group], 9)
+
+    if stop_loss_limit is None:
+        return np.ones(n, dtype=bool), day_pnl, np.zeros(n, dtype=bool)
+
+    hit = day_pnl <= stop_loss_limit
+    first_hit = np.full(len(starts), n, dtype=np.int64)
+    hit_pos = np.flatnonzero(hit)
+    hit_groups, first = np.unique(group[hit_pos], return_index=True)
+    first_hit[hit_groups] = hit_pos[first]
+
+    pos = np.arange(n)
+    keep = pos <= first_hit[group]
+    stop_hit = pos == first_hit[group]
+    return keep, day_pnl, stop_hit
+
+
+def daily_stats(days, trade_day, pnl, is_win, stop_hit=None):
+    """
+    按交易日分组汇总 (bincount 归约)，days 为需要出现在报表中的全部交易日编号
+    (包括当天没有交易的日子)，trade_day/pnl/is_win 只传入实际计入的交易
+    返回 dict of arrays: day, profit, trades, wins, losses, stopped
+    """
+    days = np.unique(days)
+    g = np.searchsorted(days, trade_day)
+    size = len(days)
+    trades = np.bincount(g, minlength=size)
+    wins = np.bincount(g, weights=np.asarray(is_win, dtype=np.float64), minlength=size).astype(np.int64)
+    stopped = np.zeros(size, dtype=bool)
+    if stop_hit is not None and len(stop_hit):
+        stopped[g[np.asarray(stop_hit, dtype=bool)]] = True
+    return {
+        'day': days,
+        'profit': np.bincount(g, weights=pnl, minlength=size),
+        'trades': trades,
+        'wins': wins,
+        'losses': trades - wins,
+        'stopped': stopped,
+    }
+
+
+def monthly_stats(daily):
+    """把 daily_stats 的结果再按自然月归约：month, profit, days, trades, wins"""
+    month = daily['day'].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    months, g = np.unique(month, return_inverse=True)
+    size = len(months)
+    return {
+        'month': months,
+        'profit': np.bincount(g, weights=daily['profit'], minlength=size),
+        'days': np.bincount(g, minlength=size),
+        'trades': np.bincount(g, weights=daily['trades'], minlength=size).astype(np.int64),
+        'wins': np.bincount(g, weights=daily['wins'], minlength=size).astype(np.int64),
+    }
+
+
+def to_daily_dict(daily, **extra):
+    """
+    转回旧脚本使用的 { 'YYYY-MM-DD': {'profit':..., 'trades':..., ...} } 结构
+    extra 中的数组按天附加为额外字段
+    """
+    keys = ['profit', 'trades', 'wins', 'losses', 'stopped']
+    result = {}
+    for n, label in enumerate(day_labels(daily['day']).tolist()):
+        row = {key: daily[key][n].item() for key in keys}
+        for key, values in extra.items():
+            row[key] = values[n].item()
+        result[label] = row
+    return result
+
+
+def stop_loss_frontier(trade_day, pnl, stop_levels, is_win=None):
+    """
+    每日止损阈值的前沿曲线：一次算出一整组止损线下的结果，不用逐个阈值重跑回测
+
+    止损只和当日累计盈亏的"创新低"有关：当日第一次累计盈亏 <= L 的那笔就是止损点。
+    每天算一次累计盈亏的滚动最小值 (非递增)，对所有 L 同时 searchsorted 即得止损位置，
+    与 apply_daily_stop 的口径一致 (触发止损的那笔计入)
+
+    :param trade_day: 每笔交易的交易日编号 (非递减)
+    :param pnl: 每笔交易的盈亏
+    :param stop_levels: 止损阈值数组 (负数)，-np.inf 表示不止损
+    :param is_win: 可选，每笔是否获胜，用于统计胜场
+    :return: dict of arrays (与 stop_levels 等长)
+        stop, profit, trades, wins, stopped_days, max_drawdown
+    """
+    trade_day = np.asarray(trade_day)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    levels = np.asarray(stop_levels, dtype=np.float64)
+    n = len(pnl)
+    g = len(levels)
+    if n == 0:
+        zeros = np.zeros(g)
+        return {'stop': levels, 'profit': zeros, 'trades': zeros.astype(np.int64), 'wins': zeros.astype(np.int64),
+                'stopped_days': zeros.astype(np.int64), 'max_drawdown': zeros}
+
+    _, day_pnl, _ = apply_daily_stop(trade_day, pnl, None)
+    wins_col = np.zeros(n) if is_win is None else np.asarray(is_win, dtype=np.float64)
+    starts = np.flatnonzero(np.r_[True, trade_day[1:] != trade_day[:-1]])
+    ends = np.r_[starts[1:], n]
+
+    # last[g, d]: 阈值 g 下第 d 天最后一笔成交的全局位置
+    last = np.empty((g, len(starts)), dtype=np.int64)
+    stopped = np.zeros((g, len(starts)), dtype=bool)
+    for d, (s, e) in enumerate(zip(starts.tolist(), ends.tolist())):
+        running_min = np.minimum.accumulate(day_pnl[s:e])
+        hit = np.searchsorted(-running_min, -levels, side='left')
+        stopped[:, d] = hit < e - s
+        last[:, d] = s + np.minimum(hit, e - s - 1)
+
+    profit = day_pnl[last].sum(axis=1)
+    trades = (last - starts[None, :] + 1).sum(axis=1)
+    csum_wins = np.cumsum(wins_col)
+    base_wins = np.r_[0.0, csum_wins][starts]
+    wins = (csum_wins[last] - base_wins[None, :]).sum(axis=1).astype(np.int64)
+
+    # 资金曲线回撤：每个阈值保留每天止损前的交易
+    day_index = np.cumsum(np.r_[True, trade_day[1:] != trade_day[:-1]]) - 1
+    pos = np.arange(n)
+    max_drawdown = np.empty(g)
+    for row in range(g):
+        kept = np.where(pos <= last[row][day_index], pnl, 0.0)
+        equity = np.r_[0.0, np.cumsum(kept)]
+        max_drawdown[row] = (np.maximum.accumulate(equity) - equity).max()
+
+    return {
+        'stop': levels,
+        'profit': profit,
+        'trades': trades,
+        'wins': wins,
+        'stopped_days': stopped.sum(axis=1),
+        'max_drawdown': max_drawdown,
+    }
@@ -0,0 +1,160 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from trading_day import trading_day_ids
+from sweep_runner import SweepRunner
+from param_search import successive_halving
+
+# 可以跨折累加的结果字段，win_rate 按 trades 加权
+ADDITIVE_KEYS = ('profit', 'net_profit', 'trades', 'wins', 'stopped_days')
+
+
+def make_folds(ts, train_days=14, test_days=7, step_days=None, day_start_hour=9):
+    """
+    按交易日切分滚动窗口：[训练 train_days 天][测试 test_days 天]，每折向后移动 step_days 天 (默认 = test_days)
+    :return: [{'train': (start, end), 'test': (start, end)}]，均为K线下标的左闭右开区间
+    """
+    step_days = step_days or test_days
+    if train_days < 1 or test_days < 1 or step_days < 1:
+        raise ValueError(f"窗口天数必须 >= 1: train={train_days}, test={test_days}, step={step_days}")
+    day = trading_day_ids(np.asarray(ts), day_start_hour)
+    day_start = np.r_[0, np.flatnonzero(np.diff(day)) + 1, len(day)]
+    n_days = len(day_start) - 1
+
+    folds = []
+    first = 0
+    while first + train_days + test_days <= n_days:
+        mid = first + train_days
+        folds.append({
+            'train': (int(day_start[first]), int(day_start[mid])),
+            'test': (int(day_start[mid]), int(day_start[mid + test_days])),
+        })
+        first += step_days
+    return folds
+
+
+def slice_window(columns, start, end, warmup=100, tail=10):
+    """
+    取出 [start, end) 窗口的列视图 (不复制)，前面多带 warmup 根K线给指标预热，
+    后面多带 tail 根K线给最后的信号结算；评估函数从切片的第 warmup 根开始出信号，
+    所以出信号的K线正好是 [start, end)
+    """
+    lo = start - warmup
+    if lo < 0:
+        raise ValueError(f"窗口起点 {start} 之前不足 {warmup} 根预热K线")
+    hi = min(end + tail, len(columns['ts']))
+    return {key: values[lo:hi] for key, values in columns.items()}
+
+
+def combine_results(results):
+    """把多折的结果字典合并：可加字段求和，win_rate 按单量加权"""
+    out = {}
+    for key in ADDITIVE_KEYS:
+        if results and key in results[0]:
+            out[key] = sum(res[key] for res in results)
+    if results and 'win_rate' in results[0] and 'trades' in results[0]:
+        trades = sum(res['trades'] for res in results)
+        wins = sum(res['win_rate'] * res['trades'] / 100 for res in results)
+        out['win_rate'] = wins / trades * 100 if trades > 0 else 0
+    return out
+
+
+def _score(result, metric):
+    return metric(result) if callable(metric) else result[metric]
+
+
+def run_fold(columns, task):
+    """
+    单折：在训练窗口上搜索参数，取最优的一组在测试窗口上评估
+    模块级函数，供 SweepRunner 的子进程调用；columns 是整段历史的共享数组，折与折之间只有切片不同
+    """
+    fold, evaluate, candidates, metric, search, warmup, tail = task
+    train = slice_window(columns, *fold['train'], warmup, tail)
+    if search == 'grid':
+        ranked = sorted(((params, evaluate(train, params)) for params in candidates),
+                        key=lambda item: _score(item[1], metric), reverse=True)
+        best_params, train_result = ranked[0]
+    elif search == 'halving':
+        # 折本身已经在子进程里，逐轮减半在进程内运行
+        best_params, train_result = successive_halving(train, evaluate, candidates, metric, processes=1)['best']
+    else:
+        raise ValueError(f"未知的搜索方式: {search}")
+
+    test_result = evaluate(slice_window(columns, *fold['test'], warmup, tail), best_params)
+    return {
+        'train': fold['train'],
+        'test': fold['test'],
+        'params': best_params,
+        'train_result': train_result,
+        'test_result': test_result,
+    }
+
+
+def walk_forward(columns, evaluate, candidates, train_days=14, test_days=7, step_days=None, metric='profit',
+                 search='grid', warmup=100, tail=10, processes=None, day_start_hour=9):
+    """
+    滚动前推优化：每折在训练窗口上选参数，在紧随其后的测试窗口上做样本外评估，各折并行
+
+    指标 (RSI 等) 预先在整段历史上算好放进 columns，只在共享内存里存一份；
+    因为指标只依赖过去的K线，切片上的值与整段上的完全一致
+
+    :param evaluate: 模块级评估函数 evaluate(columns, params)，例如 optimize_rsi.evaluate_rsi_params
+    :param candidates: 候选参数列表
+    :param search: 'grid' 训练窗口上穷举 candidates，'halving' 逐轮减半
+    :return: dict
+        folds: 每折 {'train', 'test', 'params', 'train_result', 'test_result'}
+        oos: 全部测试窗口合并后的结果
+        in_sample: 全部训练窗口 (各自最优参数) 合并后的结果
+    """
+    candidates = list(candidates)
+    if not candidates:
+        raise ValueError("没有候选参数")
+    folds = make_folds(columns['ts'], train_days, test_days, step_days, day_start_hour)
+    # 第一折的训练窗口需要预热K线，不够就把起点往后挪
+    folds = [fold for fold in folds if fold['train'][0] >= warmup]
+    if not folds:
+        raise ValueError("数据不足以切出一折训练/测试窗口")
+
+    tasks = [(fold, evaluate, candidates, metric, search, warmup, tail) for fold in folds]
+    results = SweepRunner(columns, run_fold, processes).run_all(tasks)
+    return {
+        'folds': results,
+        'oos': combine_results([r['test_result'] for r in results]),
+        'in_sample': combine_results([r['train_result'] for r in results]),
+    }
+
+
+if __name__ == "__main__":
+    from kline_arrays import KlineArrays, calc_rsi
+    from optimize_rsi import evaluate_rsi_params
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    arr = KlineArrays.load(os.path.join(script_dir, 'ETHUSDT_1m_klines.json'))
+    if arr is None:
+        print("❌ 找不到数据文件 ETHUSDT_1m_klines.json")
+        sys.exit(1)
+
+    columns = {'ts': arr.ts, 'open': arr.open, 'high': arr.high, 'low': arr.low, 'rsi': calc_rsi(arr.close, 14)}
+    candidates = [(l, l - d, s, s + d) for l, s, d in itertools.product((20, 22, 25, 28, 30), (70, 72, 75, 78, 80), (3, 5))]
+
+    wf = walk_forward(columns, evaluate_rsi_params, candidates, train_days=14, test_days=7)
+    day_of = lambda i: np.datetime_as_string(np.datetime64(int(arr.ts[i]), 's'), unit='D')
+
+    print(f"\n{'='*100}")
+    print(f"Walk-Forward RSI (训练 14 天 / 测试 7 天, 候选 {len(candidates)} 组)")
+    print(f"{'测试窗口':<25} | {'最优参数':<16} | {'样本内利润':<10} | {'样本外利润':<10} | {'样本外胜率':<10} | {'单量'}")
+    print(f"{'-'*100}")
+    for f in wf['folds']:
+        window = f"{day_of(f['test'][0])} ~ {day_of(f['test'][1] - 1)}"
+        params = '/'.join(str(p) for p in f['params'])
+        test = f['test_result']
+        print(f"{window:<25} | {params:<16} | {f['train_result']['profit']:<+10.2f} | {test['profit']:<+10.2f} | {test['win_rate']:<9.2f}% | {test['trades']}")
+    print(f"{'-'*100}")
+    oos, ins = wf['oos'], wf['in_sample']
+    print(f"样本外合计: 利润 {oos['profit']:+.2f} | 胜率 {oos['win_rate']:.2f}% | 单量 {oos['trades']} | 止损天数 {oos['stopped_days']}")
+    print(f"样本内合计: 利润 {ins['profit']:+.2f} | 胜率 {ins['win_rate']:.2f}% | 单量 {ins['trades']} (训练 {len(wf['folds'])} 折)")
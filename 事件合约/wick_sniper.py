@@ -1,8 +1,16 @@
 import json
 import os
-from datetime import datetime
 import math
 import statistics
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kline_arrays import KlineArrays, parse_datetimes, column, asof_join
+from kline_resample import resample, to_kline_dicts
+from range_query import SparseTable
+from zone_detector import next_true_index
 
 class WickSniperStrategy:
     """
@@ -37,46 +45,13 @@ class WickSniperStrategy:
     def resample_to_10m(self):
         """将1m数据重采样为10m数据"""
         print("正在重采样生成10分钟K线...")
-        self.klines_10m = []
-        
-        current_10m_kline = None
-        
-        for k in self.klines_1m:
-            # 解析时间
-            dt = datetime.strptime(k['datetime'], '%Y-%m-%d %H:%M:%S')
-            # 找到所属的10分钟整点 (例如 08:03 -> 08:00)
-            minute_floor = (dt.minute // 10) * 10
-            k_10m_time = dt.replace(minute=minute_floor, second=0)
-            k_10m_time_str = k_10m_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            if current_10m_kline is None or current_10m_kline['datetime'] != k_10m_time_str:
-                # 保存上一个完成的10m K线
-                if current_10m_kline:
-                    self.klines_10m.append(current_10m_kline)
-                
-                # 开始新的10m K线
-                current_10m_kline = {
-                    'datetime': k_10m_time_str,
-                    'open': k['open'],
-                    'high': k['high'],
-                    'low': k['low'],
-                    'close': k['close'],
-                    'volume': k['volume'],
-                    'count': 1,
-                    'start_idx': self.klines_1m.index(k) # 记录对应1m数据的起始索引
-                }
-            else:
-                # 更新当前10m K线
-                current_10m_kline['high'] = max(current_10m_kline['high'], k['high'])
-                current_10m_kline['low'] = min(current_10m_kline['low'], k['low'])
-                current_10m_kline['close'] = k['close']
-                current_10m_kline['volume'] += k['volume']
-                current_10m_kline['count'] += 1
-        
-        # 添加最后一个
-        if current_10m_kline:
-            self.klines_10m.append(current_10m_kline)
-            
+        # 按 int64 时间戳分桶聚合 (kline_resample.py)，不再逐根解析 datetime 字符串
+        bars = resample(KlineArrays.from_klines(self.klines_1m), '10m')
+        self.klines_10m = to_kline_dicts(bars)
+        # 记录对应1m数据的起始索引
+        for k, start_idx in zip(self.klines_10m, bars['first'].tolist()):
+            k['start_idx'] = start_idx
+
         print(f"生成了 {len(self.klines_10m)} 条10分钟K线")
 
     def calculate_bollinger_bands(self, period=20, std_dev=2):
@@ -119,164 +94,99 @@ class WickSniperStrategy:
         amplitude_threshold: 10mK线振幅阈值
         stop_loss_pct: 止损百分比
         """
-        # print(f"开始回测: 实体阈值={flat_threshold*100}%, 振幅阈值={amplitude_threshold*100}%, 止损={stop_loss_pct*100}%")
-        
-        trades = []
-        active_trade = None
-        
-        # 预处理：标记每个10m K线是否为Flat
-        flat_status = [self.is_dead_fish(k, flat_threshold, amplitude_threshold) for k in self.klines_10m]
-        
-        # 建立时间映射
-        map_10m = {k['datetime']: idx for idx, k in enumerate(self.klines_10m)}
-        
-        for i in range(20, len(self.klines_1m)):
-            k1m = self.klines_1m[i]
-            dt = datetime.strptime(k1m['datetime'], '%Y-%m-%d %H:%M:%S')
-            
-            # 找到当前时间所属的10m区间的前一个区间索引
-            # 例如当前 08:05, 所属 08:00-08:10, 我们需要看 07:50-08:00 的状态
-            # 或者更严格：看最近N个10m是否都是Flat
-            
-            # 计算对应的10m索引
-            # 这是一个近似计算，假设数据连续
-            # 更准确的方法是二分查找时间，这里简化处理
-            # 我们用 k1m 的时间去匹配 klines_10m
-            
-            # 简单逻辑：找到当前时刻之前最近的一个已完成的10m K线
-            # 10m K线列表是按时间排序的
-            # 我们可以维护一个指针
-            
-            # 实际上，策略逻辑是：宏观确认(10m图是横盘)。
-            # 这意味着最近的一两个10m K线必须是Flat的。
-            
-            # 找到当前1m K线对应的10m K线索引
-            # 10m K线的时间戳是该区间的开始时间
-            minute_floor = (dt.minute // 10) * 10
-            current_10m_start_time = dt.replace(minute=minute_floor, second=0)
-            
-            # 在 klines_10m 中找到这个时间
-            # 为了效率，不每次都遍历。
-            # 可以在外部维护一个 map: 10m_start_time_str -> index
-            
-            # 这里先用简单方法，假设数据量不大或者我们只做演示
-            # 优化：预先建立映射
-            pass 
+        return self.backtest_grid(flat_threshold, amplitude_threshold, (stop_loss_pct,), take_profit_at_mean)[stop_loss_pct]
 
-        # 重新组织回测循环
-        # 建立时间映射
-        map_10m = {k['datetime']: idx for idx, k in enumerate(self.klines_10m)}
-        
-        for i in range(20, len(self.klines_1m)):
-            k1m = self.klines_1m[i]
-            
-            # 如果有持仓，先处理平仓逻辑
-            if active_trade:
-                # 止损检查
-                if active_trade['type'] == 'LONG':
-                    if k1m['low'] < active_trade['stop_loss']:
-                        # 止损触发
-                        profit = active_trade['stop_loss'] - active_trade['entry_price']
-                        active_trade['exit_price'] = active_trade['stop_loss']
-                        active_trade['exit_time'] = k1m['datetime']
-                        active_trade['profit'] = profit
-                        active_trade['profit_pct'] = profit / active_trade['entry_price']
-                        active_trade['reason'] = 'Stop Loss'
-                        trades.append(active_trade)
-                        active_trade = None
-                        continue
-                    # 止盈检查 (回归中轨)
-                    elif take_profit_at_mean and k1m['high'] >= k1m['bb_middle']:
-                        # 触碰中轨止盈
-                        exit_price = k1m['bb_middle']
-                        profit = exit_price - active_trade['entry_price']
-                        active_trade['exit_price'] = exit_price
-                        active_trade['exit_time'] = k1m['datetime']
-                        active_trade['profit'] = profit
-                        active_trade['profit_pct'] = profit / active_trade['entry_price']
-                        active_trade['reason'] = 'Take Profit (Mean)'
-                        trades.append(active_trade)
-                        active_trade = None
-                        continue
-                        
-                elif active_trade['type'] == 'SHORT':
-                    if k1m['high'] > active_trade['stop_loss']:
-                        # 止损触发
-                        profit = active_trade['entry_price'] - active_trade['stop_loss']
-                        active_trade['exit_price'] = active_trade['stop_loss']
-                        active_trade['exit_time'] = k1m['datetime']
-                        active_trade['profit'] = profit
-                        active_trade['profit_pct'] = profit / active_trade['entry_price']
-                        active_trade['reason'] = 'Stop Loss'
-                        trades.append(active_trade)
-                        active_trade = None
-                        continue
-                    # 止盈检查 (回归中轨)
-                    elif take_profit_at_mean and k1m['low'] <= k1m['bb_middle']:
-                        # 触碰中轨止盈
-                        exit_price = k1m['bb_middle']
-                        profit = active_trade['entry_price'] - exit_price
-                        active_trade['exit_price'] = exit_price
-                        active_trade['exit_time'] = k1m['datetime']
-                        active_trade['profit'] = profit
-                        active_trade['profit_pct'] = profit / active_trade['entry_price']
-                        active_trade['reason'] = 'Take Profit (Mean)'
-                        trades.append(active_trade)
-                        active_trade = None
-                        continue
-                
-                # 超时强制平仓 (例如持仓超过30分钟)
-                # 这里暂不实现，遵循"回归均值"逻辑
-            
-            # 开仓逻辑
-            if active_trade is None:
-                # 1. 检查宏观环境 (10m)
-                dt = datetime.strptime(k1m['datetime'], '%Y-%m-%d %H:%M:%S')
-                minute_floor = (dt.minute // 10) * 10
-                current_10m_start_time_str = dt.replace(minute=minute_floor, second=0).strftime('%Y-%m-%d %H:%M:%S')
-                
-                current_10m_idx = map_10m.get(current_10m_start_time_str)
-                
-                if current_10m_idx is not None and current_10m_idx > 0:
-                    # 检查前一个10m K线是否为Flat
-                    # 策略要求：看到"一字排开"，意味着至少前一个，或者前两个是Flat
-                    prev_10m_idx = current_10m_idx - 1
-                    
-                    # 严格模式：前两个10m都是Flat
-                    if prev_10m_idx >= 1:
-                        is_flat_1 = flat_status[prev_10m_idx]
-                        is_flat_2 = flat_status[prev_10m_idx - 1]
-                        
-                        if is_flat_1 and is_flat_2:
-                            # 宏观环境符合：死鱼盘
-                            
-                            # 2. 微观触发 (1m BB)
-                            bb_lower = k1m['bb_lower']
-                            bb_upper = k1m['bb_upper']
-                            
-                            if bb_lower is None: continue
-                            
-                            # 做多信号：触碰下轨
-                            if k1m['low'] <= bb_lower:
-                                active_trade = {
-                                    'type': 'LONG',
-                                    'entry_time': k1m['datetime'],
-                                    'entry_price': bb_lower, # 假设在下轨成交
-                                    'stop_loss': bb_lower * (1 - stop_loss_pct),
-                                    'bb_middle_at_entry': k1m['bb_middle']
-                                }
-                            
-                            # 做空信号：触碰上轨
-                            elif k1m['high'] >= bb_upper:
-                                active_trade = {
-                                    'type': 'SHORT',
-                                    'entry_time': k1m['datetime'],
-                                    'entry_price': bb_upper, # 假设在上轨成交
-                                    'stop_loss': bb_upper * (1 + stop_loss_pct),
-                                    'bb_middle_at_entry': k1m['bb_middle']
-                                }
+    def entry_signals(self, flat_threshold=0.0005, amplitude_threshold=0.002):
+        """
+        开仓信号 (向量化)：前两个已完成的10m K线都是死鱼盘，且当前1m K线触碰布林带
+        返回 (候选入场索引, 是否做多)，同一根K线同时触碰上下轨时做多优先
+        """
+        klines = self.klines_1m
+        flat_status = np.array([self.is_dead_fish(k, flat_threshold, amplitude_threshold) for k in self.klines_10m], dtype=bool)
+        if len(flat_status) < 3:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+        # 前两根已完成的10m K线的死鱼盘状态，按时间 as-of join 到每根1m K线上
+        ts = parse_datetimes([k['datetime'] for k in klines])
+        ts_10m = parse_datetimes([k['datetime'] for k in self.klines_10m])
+        flat_1 = asof_join(ts, ts_10m, {'flat': flat_status}, 600, lag=1)['flat']
+        flat_2 = asof_join(ts, ts_10m, {'flat': flat_status}, 600, lag=2)['flat']
+
+        macro_ok = flat_1 & flat_2
+        macro_ok[:20] = False
+
+        low = column(klines, 'low')
+        high = column(klines, 'high')
+        is_long = macro_ok & (low <= column(klines, 'bb_lower'))
+        is_short = macro_ok & ~is_long & (high >= column(klines, 'bb_upper'))
+        entry_idx = np.flatnonzero(is_long | is_short)
+        return entry_idx, is_long[entry_idx]
 
-        return trades
+    def backtest_grid(self, flat_threshold=0.0005, amplitude_threshold=0.002, stop_loss_pcts=(0.002,), take_profit_at_mean=True):
+        """
+        一次回测多个止损百分比，返回 {stop_loss_pct: trades}，每组结果与逐根K线模拟一致
+
+        1. 开仓信号与止损无关，只算一次
+        2. 止盈 (触碰中轨) 与入场价无关：预先算好每根K线之后第一次 high >= 中轨 / low <= 中轨 的位置
+        3. 止损是首达问题：用 low/high 的稀疏表一次性查出每个候选在入场后第一次跌破/突破止损价的K线
+        4. 出场 = 两者中较早的一根 (同一根K线先判断止损)，之后沿候选信号跳到出场K线之后的第一个信号
+        """
+        klines = self.klines_1m
+        n = len(klines)
+        entry_idx, side_long = self.entry_signals(flat_threshold, amplitude_threshold)
+
+        high = column(klines, 'high')
+        low = column(klines, 'low')
+        bb_middle = column(klines, 'bb_middle')
+        entry_price = np.where(side_long, column(klines, 'bb_lower')[entry_idx], column(klines, 'bb_upper')[entry_idx])
+        after = entry_idx + 1
+
+        if take_profit_at_mean:
+            tp_long = np.r_[next_true_index(high >= bb_middle), n]
+            tp_short = np.r_[next_true_index(low <= bb_middle), n]
+            tp_exit = np.where(side_long, tp_long[after], tp_short[after])
+        else:
+            tp_exit = np.full(len(entry_idx), n, dtype=np.int64)
+
+        low_table = SparseTable(low, 'min')
+        high_table = SparseTable(high, 'max')
+
+        results = {}
+        for stop_loss_pct in stop_loss_pcts:
+            stop_loss = np.where(side_long, entry_price * (1 - stop_loss_pct), entry_price * (1 + stop_loss_pct))
+            sl_exit = np.where(side_long,
+                               low_table.first_cross(after, stop_loss),
+                               high_table.first_cross(after, stop_loss))
+            by_stop = sl_exit <= tp_exit
+            exit_idx = np.minimum(sl_exit, tp_exit)
+            exit_price = np.where(by_stop, stop_loss, bb_middle[np.minimum(exit_idx, n - 1)])
+
+            trades = []
+            k = 0
+            while k < len(entry_idx):
+                e = int(exit_idx[k])
+                if e >= n:
+                    break  # 持仓到数据结束仍未平仓，不计入
+                i = int(entry_idx[k])
+                price = entry_price[k].item()
+                out = exit_price[k].item()
+                profit = out - price if side_long[k] else price - out
+                trades.append({
+                    'type': 'LONG' if side_long[k] else 'SHORT',
+                    'entry_time': klines[i]['datetime'],
+                    'entry_price': price,
+                    'stop_loss': stop_loss[k].item(),
+                    'bb_middle_at_entry': klines[i]['bb_middle'],
+                    'exit_price': out,
+                    'exit_time': klines[e]['datetime'],
+                    'profit': profit,
+                    'profit_pct': profit / price,
+                    'reason': 'Stop Loss' if by_stop[k] else 'Take Profit (Mean)',
+                })
+                # 出场K线上不再开仓
+                k = int(np.searchsorted(entry_idx, e, side='right'))
+            results[stop_loss_pct] = trades
+        return results
 
     def print_stats(self, trades):
         if not trades:
@@ -325,8 +235,10 @@ if __name__ == "__main__":
         results = []
         
         for amp in amp_thresholds:
+            # 同一振幅阈值下所有止损一次算完
+            trades_by_sl = strategy.backtest_grid(flat_threshold=0.0005, amplitude_threshold=amp, stop_loss_pcts=stop_losses)
             for sl in stop_losses:
-                trades = strategy.backtest(flat_threshold=0.0005, amplitude_threshold=amp, stop_loss_pct=sl)
+                trades = trades_by_sl[sl]
                 
                 if not trades:
                     continue
@@ -1,10 +1,20 @@
 import requests
 import json
 import os
+import sys
 import time
 from datetime import datetime, timedelta
 import math
 
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stage_profiler import timed
+from kline_arrays import KlineArrays
+from kline_resample import resample, to_kline_dicts
+from result_cache import ResultCache, columns_fingerprint
+
 class BinanceDataFetcher:
     def __init__(self, symbol='ETHUSDT', interval='1m', days=100):
         self.symbol = symbol
@@ -86,6 +96,7 @@ class WickSniperStrategyPro:
         self.klines_1m = []
         self.klines_10m = []
         
+    @timed()
     def load_data(self):
         if os.path.exists(self.data_file):
             with open(self.data_file, 'r', encoding='utf-8') as f:
@@ -94,40 +105,13 @@ class WickSniperStrategyPro:
             return True
         return False
 
+    @timed()
     def resample_to_10m(self):
-        self.klines_10m = []
-        current_10m = None
-        
-        for k in self.klines_1m:
-            dt = datetime.strptime(k['datetime'], '%Y-%m-%d %H:%M:%S')
-            minute_floor = (dt.minute // 10) * 10
-            k_10m_time = dt.replace(minute=minute_floor, second=0)
-            k_10m_time_str = k_10m_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            if current_10m is None or current_10m['datetime'] != k_10m_time_str:
-                if current_10m:
-                    self.klines_10m.append(current_10m)
-                
-                current_10m = {
-                    'datetime': k_10m_time_str,
-                    'open': k['open'],
-                    'high': k['high'],
-                    'low': k['low'],
-                    'close': k['close'],
-                    'volume': k['volume'],
-                    'count': 1
-                }
-            else:
-                current_10m['high'] = max(current_10m['high'], k['high'])
-                current_10m['low'] = min(current_10m['low'], k['low'])
-                current_10m['close'] = k['close']
-                current_10m['volume'] += k['volume']
-                current_10m['count'] += 1
-        
-        if current_10m:
-            self.klines_10m.append(current_10m)
+        # 按 int64 时间戳分桶聚合 (kline_resample.py)，count < 10 的是有缺口的不完整K线
+        self.klines_10m = to_kline_dicts(resample(KlineArrays.from_klines(self.klines_1m), '10m'))
         print(f"重采样生成 {len(self.klines_10m)} 条10分钟K线")
 
+    @timed()
     def calculate_bollinger_bands(self, period=20, std_dev=2):
         """
         计算布林带
@@ -154,6 +138,7 @@ class WickSniperStrategyPro:
             self.klines_1m[i]['bb_upper'] = ma + (std * std_dev)
             self.klines_1m[i]['bb_lower'] = ma - (std * std_dev)
 
+    @timed()
     def calculate_rsi(self, period=14):
         closes = [float(k['close']) for k in self.klines_1m]
         if len(closes) < period + 1: return
@@ -189,6 +174,7 @@ class WickSniperStrategyPro:
         for i, rsi in enumerate(rsis):
             self.klines_1m[i]['rsi'] = rsi
 
+    @timed()
     def calculate_ma(self, period=100):
         closes = [float(k['close']) for k in self.klines_1m]
         for i in range(len(closes)):
@@ -197,6 +183,7 @@ class WickSniperStrategyPro:
                 continue
             self.klines_1m[i]['ma'] = sum(closes[i-period+1:i+1]) / period
 
+    @timed()
     def calculate_ema(self, period=100):
         closes = [float(k['close']) for k in self.klines_1m]
         ema = [None] * len(closes)
@@ -214,6 +201,7 @@ class WickSniperStrategyPro:
         for i, val in enumerate(ema):
             self.klines_1m[i][f'ema_{period}'] = val
 
+    @timed()
     def backtest_complex(self, strategy_name, rsi_limits=(20, 80), time_ranges=None, bb_confirm=False, avoid_news=False):
         """
         复杂组合策略回测
@@ -314,10 +302,23 @@ if __name__ == "__main__":
         
         print("\n开始复杂组合策略回测 (固定10分钟结算)...")
         print("="*60)
+
+        # 同样的代码 + 参数 + 数据直接取缓存结果
+        cache = ResultCache()
+        fingerprint = columns_fingerprint({key: np.array([k[key] for k in strategy.klines_1m])
+                                           for key in ('datetime', 'open', 'high', 'low', 'close')})
+
+        def backtest_cached(strategy_name, **kwargs):
+            hits = cache.hits
+            trades = cache.call('backtest_complex', strategy.backtest_complex,
+                                dict(kwargs, strategy_name=strategy_name), fingerprint)
+            if cache.hits > hits:
+                print(f"\n>>> 正在回测: {strategy_name} (缓存)")
+            return trades
         
         # 场景 A: 亚盘狙击 (UTC 0-8点，震荡为主) + RSI极端 + BB确认
         # 逻辑：亚洲时间市场比较安静，适合做反转
-        trades = strategy.backtest_complex(
+        trades = backtest_cached(
             "亚盘狙击 (UTC 0-8) + RSI<25/>75 + BB确认", 
             rsi_limits=(25, 75), 
             time_ranges=[(0, 8)], 
@@ -332,7 +333,7 @@ if __name__ == "__main__":
             else: print("❌ 亏损")
 
         # 场景 B: 避开美股 (只做 UTC 0-13点) + RSI极端
-        trades = strategy.backtest_complex(
+        trades = backtest_cached(
             "避开美股 (UTC 0-13) + RSI<20/>80", 
             rsi_limits=(20, 80), 
             time_ranges=[(0, 13)], 
@@ -347,7 +348,7 @@ if __name__ == "__main__":
             else: print("❌ 亏损")
 
         # 场景 C: 全天候 + 极度恐慌 (RSI<15/>85) + 避开新闻
-        trades = strategy.backtest_complex(
+        trades = backtest_cached(
             "极度恐慌 (RSI<15/>85) + 避开新闻", 
             rsi_limits=(15, 85), 
             time_ranges=None, 
@@ -0,0 +1,104 @@
+import numpy as np
+
+SHORT = 0
+LONG = 1
+
+
+def zones_to_arrays(consolidation_zones):
+    """把横盘区域列表转换为数组：(trade_start_index, end_index, resistance, support)"""
+    return (
+        np.array([z['trade_start_index'] for z in consolidation_zones], dtype=np.int64),
+        np.array([z['end_index'] for z in consolidation_zones], dtype=np.int64),
+        np.array([z['resistance'] for z in consolidation_zones], dtype=np.float64),
+        np.array([z['support'] for z in consolidation_zones], dtype=np.float64),
+    )
+
+
+class ZoneTradeEngine:
+    """
+    横盘区域触碰交易的快速回测 (test.py 中 backtest_strategy 的数组版本)
+
+    1. 把所有区域的可交易区间 (trade_start_index, end_index] 展开成一列K线索引
+    2. 向量化判断触碰：
+       - 做空: |high - 压力位| / 压力位 <= 阈值 且 前一根收盘 < 压力位，入场价取 high
+       - 做多: |low - 支撑位| / 支撑位 <= 阈值 且 前一根收盘 > 支撑位，入场价取 low
+    3. 一次线性扫描应用 "同区域交替方向" 和 "最大同时持仓" 限制
+    4. 出场价为 entry + hold_periods 根K线的收盘价
+    """
+
+    def __init__(self, high, low, close):
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+
+    def touch_entries(self, trade_start, zone_end, resistance, support, hold_periods=10, touch_threshold=0.001):
+        """
+        生成全部潜在交易 (按入场时间、区域顺序排序；同一根K线先做空后做多，与原脚本一致)
+        返回 dict of arrays: entry_index, zone (从0开始), side, entry_price
+        """
+        n = len(self.high)
+        first = trade_start + 1
+        last = np.minimum(zone_end, n - hold_periods - 1)
+        lengths = np.maximum(last - first + 1, 0)
+
+        zone = np.repeat(np.arange(len(first)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        bar = first[zone] + offsets
+
+        r = resistance[zone]
+        s = support[zone]
+        prev_close = self.close[bar - 1]
+        short_hit = (np.abs(self.high[bar] - r) / r <= touch_threshold) & (prev_close < r)
+        long_hit = (np.abs(self.low[bar] - s) / s <= touch_threshold) & (prev_close > s)
+
+        entry_index = np.concatenate((bar[short_hit], bar[long_hit]))
+        zone = np.concatenate((zone[short_hit], zone[long_hit]))
+        side = np.concatenate((np.full(short_hit.sum(), SHORT), np.full(long_hit.sum(), LONG)))
+        order = np.lexsort((side, zone, entry_index))
+        return {
+            'entry_index': entry_index[order],
+            'zone': zone[order],
+            'side': side[order],
+            'entry_price': np.concatenate((self.high[bar[short_hit]], self.low[bar[long_hit]]))[order],
+        }
+
+    @staticmethod
+    def apply_constraints(entry_index, zone, side, hold_periods=10, max_positions=5):
+        """
+        线性扫描：同区域不能连续两次同方向；同时持仓数 < max_positions 才开仓
+        返回被接受的 bool 数组
+        """
+        accepted = np.zeros(len(entry_index), dtype=bool)
+        last_side = {}
+        exits = []  # 已接受交易的出场索引 (单调递增)
+        head = 0
+        for n, (i, z, s) in enumerate(zip(entry_index.tolist(), zone.tolist(), side.tolist())):
+            while head < len(exits) and exits[head] <= i:
+                head += 1
+            if last_side.get(z) == s:
+                continue
+            if len(exits) - head >= max_positions:
+                continue
+            accepted[n] = True
+            exits.append(i + hold_periods)
+            last_side[z] = s
+        return accepted
+
+    def run(self, trade_start, zone_end, resistance, support, hold_periods=10, max_positions=5, touch_threshold=0.001):
+        """完整回测，返回已成交交易的 dict of arrays"""
+        entries = self.touch_entries(trade_start, zone_end, resistance, support, hold_periods, touch_threshold)
+        keep = self.apply_constraints(entries['entry_index'], entries['zone'], entries['side'],
+                                      hold_periods, max_positions)
+        trades = {key: values[keep] for key, values in entries.items()}
+
+        exit_index = trades['entry_index'] + hold_periods
+        exit_price = self.close[exit_index]
+        entry_price = trades['entry_price']
+        profit = np.where(trades['side'] == SHORT, entry_price - exit_price, exit_price - entry_price)
+
+        trades['exit_index'] = exit_index
+        trades['exit_price'] = exit_price
+        trades['profit'] = profit
+        trades['profit_percent'] = (profit / entry_price) * 100
+        trades['is_win'] = profit > 0
+        return trades
@@ -0,0 +1,308 @@
+import numpy as np
+
+
+def swing_points(high, low):
+    """
+    预计算5根K线的局部极值 (向量化)
+    swing_high[i]: high[i] >= 前后各2根的 high
+    swing_low[i]:  low[i]  <= 前后各2根的 low
+    首尾各2根无法判断，记为 False
+    """
+    n = len(high)
+    swing_high = np.zeros(n, dtype=bool)
+    swing_low = np.zeros(n, dtype=bool)
+    if n < 5:
+        return swing_high, swing_low
+    h = high[2:-2]
+    l = low[2:-2]
+    swing_high[2:-2] = (h >= high[1:-3]) & (h >= high[:-4]) & (h >= high[3:-1]) & (h >= high[4:])
+    swing_low[2:-2] = (l <= low[1:-3]) & (l <= low[:-4]) & (l <= low[3:-1]) & (l <= low[4:])
+    return swing_high, swing_low
+
+
+def next_true_index(mask):
+    """nxt[j] = 最小的 k >= j 使 mask[k] 为 True，不存在则为 len(mask)"""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(idx[::-1])[::-1]
+
+
+class ConsolidationDetector:
+    """
+    压力位/支撑位横盘识别 (BinanceKlineAnalyzer.find_consolidation_by_support_resistance 的快速版本)
+
+    与原实现逐项一致：
+    1. 局部高点 (5根极值) 作为压力位候选
+    2. 候选之后 max_klines_between*3 根内的第一个局部低点作为支撑位
+    3. 触碰必须交替记录 (压力→支撑→压力)，同时触碰时压力位优先
+    4. 满足触碰次数、振幅、持续时间后形成区域，并从区域结束处继续寻找
+
+    做法：摆动点只算一次；每个候选的扫描窗口按块展开成矩阵一次性判断，
+    最后用一个线性状态机按时间顺序挑出不重叠的区域
+    """
+
+    def __init__(self, high, low):
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.swing_high, self.swing_low = swing_points(self.high, self.low)
+        self.next_swing_low = next_true_index(self.swing_low)
+
+    def __len__(self):
+        return len(self.high)
+
+    def candidates(self, min_duration):
+        """原循环会检查的局部高点：2 <= i < n-2 且 i < n - min_duration"""
+        n = len(self.high)
+        idx = np.flatnonzero(self.swing_high)
+        return idx[idx < n - min_duration]
+
+    def touch_events(self, cand, touch_threshold, window):
+        """
+        展开候选 cand 的扫描窗口 j = i+1 .. i+window，返回
+        (event, appended, support_idx, has_support)
+        event: 1=触碰压力位, 2=触碰支撑位, 0=无
+        appended: 与上一次触碰类型不同、会被记录下来的触碰
+        """
+        n = len(self.high)
+        offsets = np.arange(1, window + 1)
+        j = cand[:, None] + offsets
+        valid = j < n
+        jc = np.minimum(j, n - 1)
+
+        resistance = self.high[cand][:, None]
+        res_touch = valid & (np.abs(self.high[jc] - resistance) / resistance * 100 <= touch_threshold)
+
+        support_idx = self.next_swing_low[np.minimum(cand + 1, n - 1)]
+        has_support = support_idx <= cand + window
+        support = self.low[np.minimum(support_idx, n - 1)][:, None]
+        sup_touch = (valid & has_support[:, None] & (j >= support_idx[:, None]) & ~res_touch &
+                     (np.abs(self.low[jc] - support) / support * 100 <= touch_threshold))
+
+        event = res_touch.astype(np.int8) + 2 * sup_touch.astype(np.int8)
+        appended = self.alternating(event)
+        return event, appended, support_idx, has_support
+
+    @staticmethod
+    def alternating(event):
+        """
+        交替记录规则：触碰类型与上一次(非空)触碰类型不同才记录
+        上一次触碰类型 = 向前填充的最近一次事件
+        """
+        rows, cols = event.shape
+        pos = np.where(event > 0, np.arange(cols), -1)
+        last = np.maximum.accumulate(pos, axis=1)
+        prev = np.concatenate((np.full((rows, 1), -1), last[:, :-1]), axis=1)
+        prev_type = np.where(prev >= 0, np.take_along_axis(event, np.maximum(prev, 0), axis=1), 0)
+        return (event > 0) & (event != prev_type)
+
+    def find_zones(self, touch_threshold=0.3, min_touches=2, max_klines_between=50, min_duration=20,
+                   min_amplitude_percent=0.5, datetimes=None, chunk_cells=2_000_000):
+        """
+        参数含义与 find_consolidation_by_support_resistance 相同
+        datetimes: 可选的K线时间字符串列表，用于填充 start_time / end_time
+        """
+        n = len(self.high)
+        if n < 10:
+            return []
+        window = max_klines_between * 3 - 1
+        cand = self.candidates(min_duration)
+        chunk = max(1, chunk_cells // max(window, 1))
+
+        zones = []
+        next_free = 0  # 状态机：已识别区域之后的第一根K线
+        for c0 in range(0, len(cand), chunk):
+            block = cand[c0:c0 + chunk]
+            block = block[block >= next_free]
+            if len(block) == 0:
+                continue
+            event, appended, support_idx, has_support = self.touch_events(block, touch_threshold, window)
+
+            res_mark = appended & (event == 1)
+            sup_mark = appended & (event == 2)
+            res_count = 1 + res_mark.sum(axis=1)
+            sup_count = sup_mark.sum(axis=1)
+
+            resistance = self.high[block]
+            support = self.low[np.minimum(support_idx, n - 1)]
+            ok = has_support & (res_count >= min_touches) & (sup_count >= min_touches)
+            ok &= ~(((resistance - support) / support) * 100 < min_amplitude_percent)
+
+            any_touch = appended.any(axis=1)
+            last_k = window - 1 - np.argmax(appended[:, ::-1], axis=1)
+            end = np.where(any_touch, block + 1 + last_k, block)
+            ok &= (end - block + 1) >= min_duration
+
+            for row in np.flatnonzero(ok).tolist():
+                i = int(block[row])
+                if i < next_free:
+                    continue
+                res_touches = [i] + (i + 1 + np.flatnonzero(res_mark[row])).tolist()
+                sup_touches = (i + 1 + np.flatnonzero(sup_mark[row])).tolist()
+                zones.append(self.build_zone(res_touches, sup_touches, resistance[row].item(),
+                                             support[row].item(), datetimes))
+                next_free = int(end[row]) + 1
+        return zones
+
+    def build_zone(self, resistance_touches, support_touches, resistance, support, datetimes=None):
+        """按原脚本的字段格式组装横盘区域"""
+        all_touches = sorted(resistance_touches + support_touches)
+        start_idx = all_touches[0]
+        end_idx = all_touches[-1]
+
+        zone_high = self.high[start_idx:end_idx + 1].max().item()
+        zone_low = self.low[start_idx:end_idx + 1].min().item()
+        zone_center = (zone_high + zone_low) / 2
+        zone_amplitude = zone_high - zone_low
+        zone_amplitude_percent = (zone_amplitude / zone_center) * 100
+
+        # 前3次触碰中最晚的那个作为起点，第4次触碰即可交易
+        touch_sequence_for_start = sorted(resistance_touches[:2] + support_touches[:2])
+        trade_start_index = touch_sequence_for_start[2] if len(touch_sequence_for_start) >= 3 else start_idx
+
+        return {
+            'start_index': start_idx,
+            'end_index': end_idx,
+            'trade_start_index': trade_start_index,
+            'start_time': datetimes[start_idx] if datetimes is not None else None,
+            'end_time': datetimes[end_idx] if datetimes is not None else None,
+            'duration': end_idx - start_idx + 1,
+            'resistance': round(resistance, 2),
+            'support': round(support, 2),
+            'resistance_touches': len(resistance_touches),
+            'support_touches': len(support_touches),
+            'resistance_touch_indices': resistance_touches,
+            'support_touch_indices': support_touches,
+            'high': round(zone_high, 2),
+            'low': round(zone_low, 2),
+            'center': round(zone_center, 2),
+            'amplitude': round(zone_amplitude, 2),
+            'amplitude_percent': round(zone_amplitude_percent, 2)
+        }
+
+
+class ConsolidationSweep:
+    """
+    横盘识别参数网格扫描：touch_threshold × min_touches × min_duration × min_amplitude_percent
+
+    与阈值无关的部分只算一次并在整个网格中复用：
+    - 摆动高低点、每个候选的支撑位 (来自 ConsolidationDetector)
+    - 每个候选扫描窗口内逐根K线到压力位/支撑位的相对距离 (百分比)
+    每个 touch_threshold 只需对距离矩阵做一次比较得到触碰事件 (阈值越小触碰集合越小)，
+    min_touches / min_duration / min_amplitude_percent 只作用在候选级别的汇总量上，
+    最后每个参数组合跑一遍线性状态机
+    """
+
+    def __init__(self, detector, max_klines_between=50, chunk_cells=2_000_000):
+        self.detector = detector
+        self.window = max_klines_between * 3 - 1
+        self.chunk_cells = chunk_cells
+        self.cand = np.flatnonzero(detector.swing_high)
+
+        n = len(detector.high)
+        support_idx = detector.next_swing_low[np.minimum(self.cand + 1, n - 1)]
+        self.has_support = support_idx <= self.cand + self.window
+        self.resistance = detector.high[self.cand]
+        self.support = detector.low[np.minimum(support_idx, n - 1)]
+        self.support_idx = support_idx
+
+    def distance_blocks(self):
+        """按块生成 (切片, 压力位距离, 支撑位距离)，无效位置为 inf"""
+        high = self.detector.high
+        low = self.detector.low
+        n = len(high)
+        offsets = np.arange(1, self.window + 1)
+        chunk = max(1, self.chunk_cells // max(self.window, 1))
+        for c0 in range(0, len(self.cand), chunk):
+            sl = slice(c0, c0 + chunk)
+            cand = self.cand[sl]
+            j = cand[:, None] + offsets
+            valid = j < n
+            jc = np.minimum(j, n - 1)
+            resistance = self.resistance[sl][:, None]
+            support = self.support[sl][:, None]
+            dist_res = np.where(valid, np.abs(high[jc] - resistance) / resistance * 100, np.inf)
+            sup_valid = valid & self.has_support[sl][:, None] & (j >= self.support_idx[sl][:, None])
+            dist_sup = np.where(sup_valid, np.abs(low[jc] - support) / support * 100, np.inf)
+            yield sl, dist_res, dist_sup
+
+    def touch_summary(self, touch_thresholds):
+        """
+        每个 touch_threshold 下每个候选的汇总：
+        res_count, sup_count, end (最后一次触碰), trade_start (前3次触碰中最晚的)
+        """
+        size = len(self.cand)
+        summary = {tt: {key: np.zeros(size, dtype=np.int64)
+                        for key in ('res_count', 'sup_count', 'end', 'trade_start')}
+                   for tt in touch_thresholds}
+        big = np.iinfo(np.int64).max
+
+        for sl, dist_res, dist_sup in self.distance_blocks():
+            cand = self.cand[sl]
+            cols = np.arange(self.window)
+            for tt in touch_thresholds:
+                res_touch = dist_res <= tt
+                sup_touch = ~res_touch & (dist_sup <= tt)
+                event = res_touch.astype(np.int8) + 2 * sup_touch.astype(np.int8)
+                appended = ConsolidationDetector.alternating(event)
+                res_mark = appended & (event == 1)
+                sup_mark = appended & (event == 2)
+
+                any_touch = appended.any(axis=1)
+                last_k = self.window - 1 - np.argmax(appended[:, ::-1], axis=1)
+
+                # 第1次额外压力位触碰、前2次支撑位触碰的位置 (不存在记为 big)
+                r1 = np.where(res_mark.any(axis=1), cand + 1 + np.argmax(res_mark, axis=1), big)
+                sup_rank = np.cumsum(sup_mark, axis=1)
+                s1 = np.where(sup_rank[:, -1] >= 1, cand + 1 + np.argmax(sup_mark & (sup_rank == 1), axis=1), big)
+                s2 = np.where(sup_rank[:, -1] >= 2, cand + 1 + np.argmax(sup_mark & (sup_rank == 2), axis=1), big)
+                first4 = np.sort(np.stack((cand, r1, s1, s2), axis=1), axis=1)
+
+                out = summary[tt]
+                out['res_count'][sl] = 1 + res_mark.sum(axis=1)
+                out['sup_count'][sl] = sup_rank[:, -1]
+                out['end'][sl] = np.where(any_touch, cand + 1 + last_k, cand)
+                out['trade_start'][sl] = np.where(first4[:, 2] != big, first4[:, 2], cand)
+        return summary
+
+    def select_zones(self, stats, min_touches, min_duration, min_amplitude_percent):
+        """对一个参数组合跑线性状态机，返回区域数组 dict: start, end, trade_start, resistance, support"""
+        n = len(self.detector.high)
+        cand = self.cand
+        ok = self.has_support & (cand < n - min_duration)
+        ok &= (stats['res_count'] >= min_touches) & (stats['sup_count'] >= min_touches)
+        ok &= ~(((self.resistance - self.support) / self.support) * 100 < min_amplitude_percent)
+        ok &= (stats['end'] - cand + 1) >= min_duration
+
+        picked = []
+        next_free = 0
+        end = stats['end']
+        for row in np.flatnonzero(ok).tolist():
+            if cand[row] < next_free:
+                continue
+            picked.append(row)
+            next_free = end[row] + 1
+        picked = np.array(picked, dtype=np.int64)
+        return {
+            'start': cand[picked],
+            'end': end[picked],
+            'trade_start': stats['trade_start'][picked],
+            # 与原脚本一致，区域里的压力/支撑位保留两位小数
+            'resistance': np.array([round(x, 2) for x in self.resistance[picked].tolist()]),
+            'support': np.array([round(x, 2) for x in self.support[picked].tolist()]),
+        }
+
+    def run(self, touch_thresholds, min_touches_list=(2,), min_duration_list=(20,), min_amplitude_list=(0.5,)):
+        """
+        扫描整个网格，返回 {(touch_threshold, min_touches, min_duration, min_amplitude_percent): zones}
+        zones 为 select_zones 的数组 dict，可直接交给 ZoneTradeEngine.run
+        """
+        if len(self.detector.high) < 10:
+            return {}
+        summary = self.touch_summary(list(touch_thresholds))
+        results = {}
+        for tt, stats in summary.items():
+            for mt in min_touches_list:
+                for md in min_duration_list:
+                    for ma in min_amplitude_list:
+                        results[(tt, mt, md, ma)] = self.select_zones(stats, mt, md, ma)
+        return results